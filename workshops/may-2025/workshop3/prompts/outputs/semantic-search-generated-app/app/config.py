@@ -15,5 +15,44 @@ CHROMA_PATH = os.getenv("CHROMA_PATH", "./data/chroma")
 CHROMA_PATH = Path(CHROMA_PATH)
 CHROMA_PATH.mkdir(parents=True, exist_ok=True)
 
+# Vector store backend: "chroma", or "local" for the in-process engine of the semantic_search package
+# (pip install -e ../../../semantic-search), stored under CHROMA_PATH/local
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# Threads running blocking ChromaDB queries for the async API
+CHROMA_QUERY_WORKERS = int(os.getenv("CHROMA_QUERY_WORKERS", "8"))
+
+# Collections opened at startup, before the first request
+WARMUP_COLLECTIONS = [name.strip() for name in os.getenv("WARMUP_COLLECTIONS", "default").split(",") if name.strip()]
+
+# Search result cache: entries kept and their time to live (0 disables the cache)
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+
+# Reranking: backend ("local" blends lexical and embedding similarity, "llm" asks a chat model),
+# latency budget in seconds after which results keep their vector order (0 disables it),
+# and the weight of the lexical score in the local backend
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "local")
+RERANK_TIMEOUT_SECONDS = float(os.getenv("RERANK_TIMEOUT_SECONDS", "1.0"))
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.3"))
+LLM_RERANK_MODEL = os.getenv("LLM_RERANK_MODEL", "gpt-3.5-turbo")
+
+# Tracing: file that finished request traces are appended to as OTLP/JSON lines (unset disables export),
+# and the service.name they are exported under; per-step latency histograms are always kept for /metrics
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "semantic-search-api")
+
 # Model configuration
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002") 
\ No newline at end of file
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+
+# Embedding request batching, concurrency and rate limits
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "3000"))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "1000000"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+
+# Embedding cache configuration
+EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "1000000"))
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
\ No newline at end of file
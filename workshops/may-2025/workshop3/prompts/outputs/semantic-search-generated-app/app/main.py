@@ -1,9 +1,26 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse
+from app.config import WARMUP_COLLECTIONS
 from app.schemas import QueryRequest, SearchResponse, SearchResult
-from app.services.search_engine import semantic_search
+from app.services.collection_registry import registry
+from app.services.reranker import reranker
+from app.services.result_cache import result_cache
+from app.services.search_engine import semantic_search_async
+from app.utils.tracing import tracer
 
-app = FastAPI()
+# Status code reported (and logged) for requests abandoned by the client
+CLIENT_CLOSED_REQUEST = 499
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the shared ChromaDB client and collections once, before serving requests
+    registry.warm_up(WARMUP_COLLECTIONS)
+    yield
+    registry.close()
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -23,6 +40,7 @@ async def root():
             <div class="endpoint">
                 <h2>Available Endpoints:</h2>
                 <p><code>POST /search</code> - Perform semantic search</p>
+                <p><code>GET /metrics</code> - Search result cache, reranker and latency statistics</p>
                 <p><code>GET /docs</code> - API documentation (Swagger UI)</p>
                 <p><code>GET /redoc</code> - Alternative API documentation (ReDoc)</p>
             </div>
@@ -31,12 +49,52 @@ async def root():
     </html>
     """
 
+@app.get("/metrics")
+async def metrics():
+    # Hit ratio and latency saved by the search result cache, reranker budget overruns,
+    # and latency percentiles of every traced step of a search request
+    return {"result_cache": result_cache.stats(), "reranker": reranker.stats(), "latency": tracer.stats()}
+
+async def _wait_for_disconnect(request: Request):
+    """
+    Return once the client has disconnected.
+    """
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
 @app.post("/search", response_model=SearchResponse)
-def search(request: QueryRequest, rerank: bool = True):
+async def search(request: Request, query: QueryRequest, rerank: bool = True):
+    # The search task copies the current context, so its spans become children of the request span
+    with tracer.span("http.search") as span:
+        response = await _search(request, query, rerank)
+        span.set_attribute("status_code", getattr(response, "status_code", 200))
+        return response
+
+async def _search(request: Request, query: QueryRequest, rerank: bool):
+    # Run the search, cancelling its pending OpenAI and ChromaDB calls if the client goes away
+    search_task = asyncio.create_task(semantic_search_async(query.query, rerank_results=rerank, where=query.where))
+    disconnect_task = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({search_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        search_task.cancel()
+        raise
+    finally:
+        disconnect_task.cancel()
+    
+    if not search_task.done():
+        search_task.cancel()
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    
     try:
-        results = semantic_search(request.query, rerank_results=rerank)
+        results = search_task.result()
         # Convert to SearchResult models
         search_results = [SearchResult(**{k: v for k, v in doc.items() if k in SearchResult.model_fields}) for doc in results]
         return SearchResponse(results=search_results)
+    except ValueError as e:
+        # Empty queries and malformed metadata filters
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
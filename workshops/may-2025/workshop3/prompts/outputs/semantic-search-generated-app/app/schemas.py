@@ -1,8 +1,10 @@
 from pydantic import BaseModel
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
 
 class QueryRequest(BaseModel):
     query: str
+    # ChromaDB-style metadata filter, e.g. {"file_type": "txt", "modified": {"$gte": "2025-05-01"}}
+    where: Optional[Dict[str, Any]] = None
 
 class SearchResult(BaseModel):
     id: str
@@ -0,0 +1,115 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import chromadb
+from app.config import CHROMA_PATH, CHROMA_QUERY_WORKERS, VECTOR_BACKEND
+
+def open_client(path: Path, backend: str = VECTOR_BACKEND):
+    """
+    Open the vector store client of a backend.
+    
+    "chroma" is a ChromaDB PersistentClient. "local" is the in-process engine
+    of the semantic_search package (an optional dependency), which implements
+    the same collection API with exact search over memory-mapped vectors.
+    """
+    if backend == "chroma":
+        return chromadb.PersistentClient(path=str(path))
+    if backend == "local":
+        try:
+            from semantic_search.vector_index import LocalClient
+        except ImportError as e:
+            raise RuntimeError("VECTOR_BACKEND=local needs the semantic_search package installed") from e
+        return LocalClient(str(Path(path) / "local"))
+    raise ValueError(f"Unknown vector backend: {backend!r} (expected 'chroma' or 'local')")
+
+class CollectionRegistry:
+    """
+    Process-wide vector store client and collection handles, keyed by collection name.
+
+    The client is opened once (at application startup, or lazily on first use)
+    and shared by every request, so a search no longer reopens the on-disk store.
+    Blocking ChromaDB calls from async code run on a dedicated thread pool via run().
+    """
+
+    def __init__(self, path: Path = CHROMA_PATH, workers: int = CHROMA_QUERY_WORKERS, backend: str = VECTOR_BACKEND):
+        self.path = path
+        self.workers = workers
+        self.backend = backend
+        self._client: Optional[chromadb.ClientAPI] = None
+        self._collections: Dict[str, chromadb.Collection] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> chromadb.ClientAPI:
+        """
+        The shared client, opened on first use.
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = open_client(self.path, self.backend)
+        return self._client
+
+    def get(self, name: str = "default") -> chromadb.Collection:
+        """
+        Return the collection with the given name, creating it if needed.
+        
+        Args:
+            name (str): Name of the collection
+            
+        Returns:
+            chromadb.Collection: The shared collection handle
+        """
+        collection = self._collections.get(name)
+        if collection is None:
+            client = self.client
+            with self._lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    collection = client.get_or_create_collection(name=name)
+                    self._collections[name] = collection
+        return collection
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking ChromaDB call on the registry's thread pool and await its result.
+        """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="chroma")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def warm_up(self, names: Iterable[str]):
+        """
+        Open the client and the given collections ahead of the first request.
+        
+        Args:
+            names (Iterable[str]): Names of the collections to open
+        """
+        for name in names:
+            self.get(name).count()
+
+    def close(self):
+        """
+        Drop all collection handles, stop the thread pool and close the client.
+        """
+        with self._lock:
+            client, self._client = self._client, None
+            executor, self._executor = self._executor, None
+            self._collections.clear()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if client is not None:
+            close = getattr(client, "close", None)
+            if close is not None:
+                close()
+
+# Shared by every request in the process
+registry = CollectionRegistry()
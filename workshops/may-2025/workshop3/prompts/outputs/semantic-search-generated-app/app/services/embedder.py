@@ -1,9 +1,40 @@
+import asyncio
 from typing import List
 import openai
-from app.config import OPENAI_API_KEY, EMBEDDING_MODEL
+from app.config import OPENAI_API_KEY, EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_executor import EmbeddingExecutor
 
-# Configure OpenAI client
-openai.api_key = OPENAI_API_KEY
+# OpenAI clients for ingestion and for the request path of the API. Retries are handled by the
+# executor so that they respect the rate limits, rather than stacking the SDK's own on top of them
+client = openai.OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+async_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+
+def _embed_request(texts: List[str]) -> List[List[float]]:
+    """
+    Send a single multi-input embeddings request.
+    """
+    response = client.embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=texts
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+async def _embed_request_async(texts: List[str]) -> List[List[float]]:
+    """
+    Send a single multi-input embeddings request without blocking the event loop.
+    """
+    response = await async_client.embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=texts
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+# Shared executor so that concurrent callers respect the same rate limits
+executor = EmbeddingExecutor(_embed_request, _embed_request_async)
+
+# Shared cache so that texts embedded before are never sent to the API again
+cache = EmbeddingCache()
 
 def get_embedding(text: str) -> List[float]:
     """
@@ -20,11 +51,63 @@ def get_embedding(text: str) -> List[float]:
     if not text:
         raise ValueError("Text cannot be empty")
     
+    # Reuse a cached embedding if this text was embedded before
+    cached = cache.get_many(EMBEDDING_MODEL, [text])[0]
+    if cached is not None:
+        return cached
+    
     # Get embedding from OpenAI
-    response = openai.embeddings.create(
-        model=EMBEDDING_MODEL,
-        input=text
-    )
+    embedding = executor.run([text])[0]
+    cache.put_many(EMBEDDING_MODEL, [text], [embedding])
+    return embedding
+
+async def get_embedding_async(text: str) -> List[float]:
+    """
+    Get embedding vector for the given text without blocking the event loop.
+    
+    Args:
+        text (str): The text to embed
+        
+    Returns:
+        List[float]: The embedding vector
+    """
+    text = text.strip()
+    if not text:
+        raise ValueError("Text cannot be empty")
+    
+    # Reuse a cached embedding if this text was embedded before; the SQLite cache
+    # commits, which can wait on the disk, so it is used from a worker thread
+    cached = (await asyncio.to_thread(cache.get_many, EMBEDDING_MODEL, [text]))[0]
+    if cached is not None:
+        return cached
+    
+    embedding = (await executor.run_async([text]))[0]
+    await asyncio.to_thread(cache.put_many, EMBEDDING_MODEL, [text], [embedding])
+    return embedding
+
+def get_embeddings(texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[List[float]]:
+    """
+    Get embedding vectors for many texts using concurrent multi-input requests.
+    
+    Args:
+        texts (List[str]): The texts to embed
+        batch_size (int): Number of texts sent in one request
+        
+    Returns:
+        List[List[float]]: The embedding vectors, in the same order as texts
+    """
+    texts = [text.strip() for text in texts]
+    if not all(texts):
+        raise ValueError("Text cannot be empty")
+    
+    # Only texts missing from the cache are sent to the API
+    embeddings = cache.get_many(EMBEDDING_MODEL, texts)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
     
-    # Extract embedding vector
-    return response.data[0].embedding 
\ No newline at end of file
+    batches = ([texts[i] for i in missing[j:j + batch_size]] for j in range(0, len(missing), batch_size))
+    for offset, batch_embeddings in zip(range(0, len(missing), batch_size), executor.imap(batches)):
+        batch_indices = missing[offset:offset + batch_size]
+        cache.put_many(EMBEDDING_MODEL, [texts[i] for i in batch_indices], batch_embeddings)
+        for i, embedding in zip(batch_indices, batch_embeddings):
+            embeddings[i] = embedding
+    return embeddings
\ No newline at end of file
@@ -0,0 +1,131 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from app.config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_MEMORY_ENTRIES
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by hash(model, normalized text).
+
+    Vectors are stored as float32 blobs in SQLite behind an in-process LRU, with
+    least-recently-used eviction once the database holds more than max_entries.
+    """
+
+    def __init__(self, path: Path = EMBEDDING_CACHE_PATH,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 memory_entries: int = EMBEDDING_CACHE_MEMORY_ENTRIES):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        """
+        Content address of a text for a given model.
+        """
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up embeddings for texts; missing entries are returned as None.
+        """
+        keys = [self.key(model, text) for text in texts]
+        results = [None] * len(texts)
+        with self._lock:
+            disk_lookups = []
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[i] = self._memory[key]
+                else:
+                    disk_lookups.append(i)
+
+            if disk_lookups:
+                # Batched IN (...) lookups, kept under SQLite's limit on bound parameters
+                wanted = list({keys[i] for i in disk_lookups})
+                found = {}
+                for offset in range(0, len(wanted), 500):
+                    part = wanted[offset:offset + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                    ).fetchall()
+                    found.update((key, np.frombuffer(blob, dtype=np.float32).tolist()) for key, blob in rows)
+
+                # Only a disk hit writes (its last_used), so misses never open a write transaction
+                if found:
+                    now = time.time()
+                    self._db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                         [(now, key) for key in found])
+                    self._db.commit()
+                    for key, vector in found.items():
+                        self._remember(key, vector)
+
+                for i in disk_lookups:
+                    results[i] = found.get(keys[i])
+
+            found_count = sum(1 for vector in results if vector is not None)
+            self.hits += found_count
+            self.misses += len(texts) - found_count
+        return results
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """
+        Store embeddings for texts, evicting least recently used rows when full.
+        """
+        now = time.time()
+        rows = {self.key(model, text): embedding for text, embedding in zip(texts, embeddings)}
+        with self._lock:
+            cursor = self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in rows.items()]
+            )
+            self._size += max(cursor.rowcount, 0)
+            for key, vector in rows.items():
+                self._remember(key, list(vector))
+
+            if self._size > self.max_entries:
+                excess = self._size - int(self.max_entries * 0.9)
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self._size -= excess
+            self._db.commit()
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit/miss counters and current size.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": self._size,
+        }
@@ -0,0 +1,162 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Iterable, Iterator, List, Optional
+
+import openai
+from app.config import (
+    EMBEDDING_MAX_IN_FLIGHT,
+    EMBEDDING_REQUESTS_PER_MINUTE,
+    EMBEDDING_TOKENS_PER_MINUTE,
+    EMBEDDING_MAX_RETRIES
+)
+
+def estimate_tokens(texts: List[str]) -> int:
+    """
+    Roughly estimate the number of tokens in a request (about 4 characters per token).
+    """
+    return sum(len(text) // 4 + 1 for text in texts)
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Return True for rate-limit (429), server (5xx) and connection errors.
+    """
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+class RateLimiter:
+    """
+    Token-bucket limiter enforcing requests-per-minute and tokens-per-minute budgets.
+    A budget of 0 disables that limit.
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Take one request of the given token size from both budgets if it fits.
+        Returns 0 on success, otherwise the number of seconds to wait before trying again.
+        """
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self._last_refill = now - self._last_refill, now
+            self._request_allowance = min(self.requests_per_minute,
+                                          self._request_allowance + elapsed * self.requests_per_minute / 60)
+            self._token_allowance = min(self.tokens_per_minute,
+                                        self._token_allowance + elapsed * self.tokens_per_minute / 60)
+
+            wait = 0.0
+            if self.requests_per_minute and self._request_allowance < 1:
+                wait = (1 - self._request_allowance) * 60 / self.requests_per_minute
+            if self.tokens_per_minute and self._token_allowance < tokens:
+                wait = max(wait, (tokens - self._token_allowance) * 60 / self.tokens_per_minute)
+            if wait == 0:
+                self._request_allowance -= 1 if self.requests_per_minute else 0
+                self._token_allowance -= tokens if self.tokens_per_minute else 0
+            return wait
+
+    def acquire(self, tokens: int = 0):
+        """
+        Block until one request of the given token size fits in both budgets.
+        """
+        while (wait := self.reserve(tokens)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0):
+        """
+        Wait without blocking the event loop until one request of the given token size fits in both budgets.
+        """
+        while (wait := self.reserve(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+class EmbeddingExecutor:
+    """
+    Run embedding requests on a thread pool with a bounded number in flight.
+
+    Requests share one RateLimiter and are retried on 429/5xx responses with
+    jittered exponential backoff. imap() returns results in input order, and
+    run_async() sends a request from the event loop with the same limits.
+    """
+
+    def __init__(self, request_fn: Callable[[List[str]], Any],
+                 async_request_fn: Optional[Callable[[List[str]], Awaitable[Any]]] = None,
+                 max_in_flight: int = EMBEDDING_MAX_IN_FLIGHT,
+                 requests_per_minute: int = EMBEDDING_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = EMBEDDING_TOKENS_PER_MINUTE,
+                 max_retries: int = EMBEDDING_MAX_RETRIES,
+                 base_delay: float = 0.5,
+                 max_delay: float = 30.0):
+        self.request_fn = request_fn
+        self.async_request_fn = async_request_fn
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embedding")
+
+    def run(self, texts: List[str]) -> Any:
+        """
+        Send one request in the calling thread, with rate limiting and retries.
+        """
+        tokens = estimate_tokens(texts)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(tokens)
+            try:
+                return self.request_fn(texts)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def run_async(self, texts: List[str]) -> Any:
+        """
+        Send one request with async_request_fn, sharing the rate limits and retry policy of run().
+        """
+        tokens = estimate_tokens(texts)
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire_async(tokens)
+            try:
+                return await self.async_request_fn(texts)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    def imap(self, batches: Iterable[List[str]]) -> Iterator[Any]:
+        """
+        Run one request per batch concurrently and yield results in input order.
+        """
+        pending = deque()
+        batches = iter(batches)
+        try:
+            while True:
+                while len(pending) < self.max_in_flight * 2:
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    pending.append(self._pool.submit(self.run, batch))
+                if not pending:
+                    return
+                yield pending.popleft().result()
+        finally:
+            # After a failed batch, or a caller that stopped early, requests not yet
+            # started would only spend rate-limit budget; cancel them
+            for future in pending:
+                future.cancel()
@@ -1,40 +1,291 @@
-from typing import List, Dict, Any
+import asyncio
+import re
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import List, Dict, Any, Optional
+import numpy as np
 import openai
-from app.config import OPENAI_API_KEY
+from app.config import OPENAI_API_KEY, RERANKER_BACKEND, RERANK_TIMEOUT_SECONDS, RERANK_LEXICAL_WEIGHT, LLM_RERANK_MODEL
+from app.services.embedder import get_embedding, get_embedding_async
 
-openai.api_key = OPENAI_API_KEY
+# OpenAI clients for sync reranks and for the request path of the API. The SDK's retries would
+# run inside the latency budget and outlive its timeout, so a failed rerank falls back instead
+client = openai.OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+async_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
 
-def rerank(query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+# Threads running sync reranks, so that callers can stop waiting once the latency budget is spent
+_budget_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rerank")
+
+# Cancellation flag of the sync rerank running on the current pool thread, if any
+_budget = threading.local()
+
+class RerankCancelled(Exception):
     """
-    Use OpenAI GPT to rerank a list of documents based on their relevance to the query.
-    Returns the same docs reordered by relevance.
+    Raised inside a sync rerank once its caller has stopped waiting for it.
+    """
+
+def check_cancelled():
+    """
+    Stop the sync rerank running on this thread if its latency budget has run out.
+
+    A pool thread that has started cannot be cancelled from outside, so backends
+    call this between steps and candidates; otherwise an abandoned rerank would
+    hold one of the pool's workers until it finished. Outside the pool it does nothing.
+    """
+    cancelled = getattr(_budget, "cancelled", None)
+    if cancelled is not None and cancelled.is_set():
+        raise RerankCancelled()
+
+def _run_within_budget(rerank, query: str, docs: List[Dict[str, Any]],
+                       cancelled: threading.Event) -> List[Dict[str, Any]]:
+    """
+    Run a backend's sync rerank on a pool thread, stoppable through check_cancelled().
+    """
+    _budget.cancelled = cancelled
+    try:
+        return rerank(query, docs)
+    finally:
+        _budget.cancelled = None
+
+class Reranker(ABC):
+    """
+    Reorders search candidates by relevance to the query within a latency budget.
+
+    Backends implement _rerank() and _rerank_async(). If a backend does not finish
+    within `timeout` seconds, the candidates are returned in their vector order;
+    _rerank() should call check_cancelled() between steps so that it then stops too.
+    """
+
+    name = "reranker"
+
+    def __init__(self, timeout: float = RERANK_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.calls = 0
+        self.timeouts = 0
+
+    @abstractmethod
+    def _rerank(self, query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def _rerank_async(self, query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        ...
+
+    def rerank(self, query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Return the docs reordered by relevance, or in vector order if the budget runs out.
+        """
+        if not docs:
+            return []
+        self.calls += 1
+        if self.timeout <= 0:
+            return self._rerank(query, docs)
+        cancelled = threading.Event()
+        future = _budget_pool.submit(_run_within_budget, self._rerank, query, docs, cancelled)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # cancel() only drops a rerank still queued; a running one stops at its next check_cancelled()
+            cancelled.set()
+            future.cancel()
+            self.timeouts += 1
+            return list(docs)
+
+    async def rerank_async(self, query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Rerank like rerank(), without blocking the event loop.
+        """
+        if not docs:
+            return []
+        self.calls += 1
+        if self.timeout <= 0:
+            return await self._rerank_async(query, docs)
+        try:
+            return await asyncio.wait_for(self._rerank_async(query, docs), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return list(docs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "calls": self.calls, "timeouts": self.timeouts}
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens of a text.
+    """
+    return re.findall(r"\w+", text.lower())
+
+def bm25_scores(query: str, contents: List[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """
+    BM25 score of each candidate for the query, with IDF taken over the candidates.
     """
-    if not docs:
-        return []
-    
-    # Construct prompt for reranking
-    prompt = (
+    query_terms = sorted(set(tokenize(query)))
+    if not query_terms or not contents:
+        return np.zeros(len(contents))
+    documents = []
+    for content in contents:
+        check_cancelled()
+        documents.append(tokenize(content))
+
+    # Term frequency matrix of the query terms, one row per candidate
+    columns = {term: i for i, term in enumerate(query_terms)}
+    tf = np.zeros((len(documents), len(query_terms)))
+    for row, tokens in enumerate(documents):
+        for token in tokens:
+            column = columns.get(token)
+            if column is not None:
+                tf[row, column] += 1
+
+    lengths = np.array([len(tokens) for tokens in documents], dtype=np.float64)
+    avg_length = lengths.mean() or 1.0
+    df = (tf > 0).sum(axis=0)
+    idf = np.log((len(documents) - df + 0.5) / (df + 0.5) + 1)
+    norm = k1 * (1 - b + b * lengths / avg_length)
+    return (idf * tf * (k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+class LocalReranker(Reranker):
+    """
+    CPU-local reranker blending lexical and embedding similarity.
+
+    The semantic part is the cosine similarity between the query embedding
+    (served from the embedding cache, since the search just computed it) and
+    the candidates' stored vectors, passed in as doc["embedding"]. Candidates
+    without stored vectors fall back to their vector-search score. The lexical
+    part is BM25 over the candidates, scaled to [0, 1]. Scores are blended as
+    (1 - lexical_weight) * semantic + lexical_weight * lexical.
+    """
+
+    name = "local"
+
+    def __init__(self, lexical_weight: float = RERANK_LEXICAL_WEIGHT, timeout: float = RERANK_TIMEOUT_SECONDS):
+        super().__init__(timeout)
+        self.lexical_weight = lexical_weight
+
+    def score(self, query: str, docs: List[Dict[str, Any]],
+              query_embedding: Optional[List[float]] = None) -> np.ndarray:
+        """
+        Blended relevance score of each candidate.
+        """
+        semantic = np.array([doc.get("score", 0.0) for doc in docs], dtype=np.float64)
+        if query_embedding is not None and all(doc.get("embedding") is not None for doc in docs):
+            vectors = np.asarray([doc["embedding"] for doc in docs], dtype=np.float64)
+            query_vector = np.asarray(query_embedding, dtype=np.float64)
+            norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector)
+            semantic = vectors @ query_vector / np.where(norms == 0, 1.0, norms)
+
+        lexical = bm25_scores(query, [doc["content"] for doc in docs])
+        if lexical.max() > 0:
+            lexical = lexical / lexical.max()
+        return (1 - self.lexical_weight) * semantic + self.lexical_weight * lexical
+
+    def _order(self, query: str, docs: List[Dict[str, Any]],
+               query_embedding: Optional[List[float]]) -> List[Dict[str, Any]]:
+        scores = self.score(query, docs, query_embedding)
+        # Stable sort, so that ties keep their vector order
+        order = np.argsort(-scores, kind="stable")
+        return [{**docs[i], "rerank_score": float(scores[i])} for i in order]
+
+    def _has_embeddings(self, docs: List[Dict[str, Any]]) -> bool:
+        return all(doc.get("embedding") is not None for doc in docs)
+
+    def _rerank(self, query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        query_embedding = get_embedding(query) if self._has_embeddings(docs) else None
+        check_cancelled()
+        return self._order(query, docs, query_embedding)
+
+    async def _rerank_async(self, query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        query_embedding = await get_embedding_async(query) if self._has_embeddings(docs) else None
+        return self._order(query, docs, query_embedding)
+
+def _rerank_prompt(query: str, docs: List[Dict[str, Any]]) -> str:
+    """
+    Build the prompt asking the model to order the documents.
+    """
+    return (
         f"Query: {query}\n"
         "Documents:\n" +
         "\n".join([f"[{i}] {doc['content']}" for i, doc in enumerate(docs)]) +
         "\n\nRank the documents above from most to least relevant to the query. "
         "Return a comma-separated list of their indices in order."
     )
-    
-    response = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=20,
-        temperature=0.0
-    )
-    
-    # Parse the response to get the new order
-    content = response.choices[0].message.content.strip()
+
+def _max_tokens(docs: List[Dict[str, Any]]) -> int:
+    """
+    Room for every index in the answer (a few tokens each), so long lists are not truncated.
+    """
+    return 10 + 4 * len(docs)
+
+def _apply_ranking(content: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Reorder the documents by the comma-separated indices in the model's answer.
+
+    Documents the answer leaves out keep their vector order after the ranked ones.
+    """
+    indices = []
+    for i in content.strip().split(","):
+        i = i.strip().strip("[]")
+        if i.isdigit() and int(i) < len(docs) and int(i) not in indices:
+            indices.append(int(i))
+    indices += [i for i in range(len(docs)) if i not in indices]
+    return [docs[i] for i in indices]
+
+class LLMReranker(Reranker):
+    """
+    Reranker asking an OpenAI chat model to order the candidates.
+    """
+
+    name = "llm"
+
+    def __init__(self, model: str = LLM_RERANK_MODEL, timeout: float = RERANK_TIMEOUT_SECONDS):
+        super().__init__(timeout)
+        self.model = model
+
+    def _request(self, query: str, docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return dict(
+            model=self.model,
+            messages=[{"role": "user", "content": _rerank_prompt(query, docs)}],
+            max_tokens=_max_tokens(docs),
+            temperature=0.0,
+            # Do not let the abandoned request outlive the budget for long
+            **({"timeout": self.timeout} if self.timeout > 0 else {})
+        )
+
+    def _rerank(self, query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        check_cancelled()
+        response = client.chat.completions.create(**self._request(query, docs))
+        return _apply_ranking(response.choices[0].message.content, docs)
+
+    async def _rerank_async(self, query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        response = await async_client.chat.completions.create(**self._request(query, docs))
+        return _apply_ranking(response.choices[0].message.content, docs)
+
+RERANKERS = {
+    LocalReranker.name: LocalReranker,
+    LLMReranker.name: LLMReranker
+}
+
+def get_reranker(name: str = RERANKER_BACKEND) -> Reranker:
+    """
+    Create a reranker backend by name ("local" or "llm").
+    """
     try:
-        indices = [int(i) for i in content.split(",") if i.strip().isdigit()]
-    except Exception:
-        indices = list(range(len(docs)))  # fallback: original order
-    
-    # Reorder docs
-    reranked = [docs[i] for i in indices if i < len(docs)]
-    return reranked 
\ No newline at end of file
+        return RERANKERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown reranker backend: {name!r} (expected one of {', '.join(RERANKERS)})")
+
+# Backend used by the search engine, chosen by RERANKER_BACKEND
+reranker = get_reranker()
+
+def rerank(query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Rerank a list of documents by relevance to the query with the configured backend.
+    Returns the same docs reordered by relevance.
+    """
+    return reranker.rerank(query, docs)
+
+async def rerank_async(query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Rerank documents like rerank(), without blocking the event loop.
+    """
+    return await reranker.rerank_async(query, docs)
@@ -0,0 +1,102 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from app.config import RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS
+
+class ResultCache:
+    """
+    In-process cache of search results with TTL and LRU eviction.
+
+    Each collection has a version counter that writes bump through invalidate();
+    entries remember the version they were computed against, so a result cached
+    before a write is never served after it. Every entry also keeps the time it
+    took to compute, which is credited to saved_seconds whenever it is served.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, ttl: float = RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._entries = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def version(self, collection_name: str) -> int:
+        """
+        Current version of a collection; bumped by every write.
+        """
+        return self._versions.get(collection_name, 0)
+
+    def get(self, collection_name: str, key: Hashable) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return a copy of the cached results for key, or None if missing, expired or stale.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get((collection_name, key))
+            if entry is not None:
+                results, version, expires_at, elapsed = entry
+                if version == self.version(collection_name) and expires_at > time.monotonic():
+                    self._entries.move_to_end((collection_name, key))
+                    self.hits += 1
+                    self.saved_seconds += elapsed
+                    return copy.deepcopy(results)
+                del self._entries[(collection_name, key)]
+            self.misses += 1
+        return None
+
+    def put(self, collection_name: str, key: Hashable, results: List[Dict[str, Any]],
+            elapsed: float, version: int):
+        """
+        Store results computed in `elapsed` seconds against collection `version`.
+
+        Results computed against an older version than the current one are dropped.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if version != self.version(collection_name):
+                return
+            self._entries[(collection_name, key)] = (copy.deepcopy(results), version,
+                                                     time.monotonic() + self.ttl, elapsed)
+            self._entries.move_to_end((collection_name, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection_name: str):
+        """
+        Bump a collection's version, so that results cached before a write are not served.
+        """
+        with self._lock:
+            self._versions[collection_name] = self.version(collection_name) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit ratio and latency saved by the cache so far.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 6)
+            }
+
+# Shared by every request in the process
+result_cache = ResultCache()
@@ -1,33 +1,110 @@
-from typing import List, Dict, Any
+import json
+import time
+from typing import List, Dict, Any, Optional
 from app.services.embedder import get_embedding
-from app.services.vector_store import search_similar
+from app.services.vector_store import search_similar, search_similar_async
 from app.utils.text_cleaner import clean_text
-from app.services.reranker import rerank
+from app.services.reranker import rerank, rerank_async
+from app.services.result_cache import result_cache
+from app.utils.tracing import tracer
 
-def semantic_search(query: str, top_k: int = 3, collection_name: str = "default", rerank_results: bool = False) -> List[Dict[str, Any]]:
+def _cache_key(cleaned_query: str, top_k: int, rerank_results: bool, where: Optional[Dict[str, Any]]) -> tuple:
+    """
+    Result cache key of a search; filters are keyed by their canonical JSON.
+    """
+    return (cleaned_query, top_k, rerank_results, json.dumps(where, sort_keys=True) if where else None)
+
+def _without_embeddings(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop the stored vectors fetched for the reranker from the results.
+    """
+    return [{k: v for k, v in doc.items() if k != "embedding"} for doc in results]
+
+def semantic_search(query: str, top_k: int = 3, collection_name: str = "default", rerank_results: bool = False,
+                    where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """
     Perform semantic search on the vector store, with optional reranking.
     
+    Results are cached by (cleaned query, top_k, rerank flag, filter) per
+    collection until they expire or the collection is written to.
+    
     Args:
         query (str): The search query
         top_k (int): Number of results to return
         collection_name (str): Name of the collection to search in
-        rerank_results (bool): Whether to rerank results using LLM
+        rerank_results (bool): Whether to rerank results with the configured reranker
+        where (Optional[Dict[str, Any]]): Metadata filter applied before vector scoring
         
     Returns:
         List[Dict[str, Any]]: List of similar documents with their metadata and scores
     """
-    # Clean the query
-    cleaned_query = clean_text(query)
-    
-    # Search for similar documents
-    results = search_similar(
-        query=cleaned_query,
-        top_k=top_k,
-        collection_name=collection_name
-    )
-    
-    if rerank_results:
-        results = rerank(cleaned_query, results)
+    with tracer.span("search", top_k=top_k, rerank=rerank_results, filtered=bool(where)) as span:
+        # Clean the query
+        cleaned_query = clean_text(query)
+        
+        # Serve repeated queries from the result cache
+        key = _cache_key(cleaned_query, top_k, rerank_results, where)
+        cached = result_cache.get(collection_name, key)
+        span.set_attribute("cache_hit", cached is not None)
+        if cached is not None:
+            return cached
+        version = result_cache.version(collection_name)
+        started = time.perf_counter()
+        
+        # Search for similar documents
+        results = search_similar(
+            query=cleaned_query,
+            top_k=top_k,
+            collection_name=collection_name,
+            include_embeddings=rerank_results,
+            where=where
+        )
+        
+        if rerank_results:
+            with tracer.span("search.rerank", candidates=len(results)):
+                results = _without_embeddings(rerank(cleaned_query, results))
+        
+        result_cache.put(collection_name, key, results, time.perf_counter() - started, version)
+        return results
+
+async def semantic_search_async(query: str, top_k: int = 3, collection_name: str = "default",
+                                rerank_results: bool = False,
+                                where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Perform semantic search like semantic_search(), without blocking the event loop.
     
-    return results 
\ No newline at end of file
+    Args:
+        query (str): The search query
+        top_k (int): Number of results to return
+        collection_name (str): Name of the collection to search in
+        rerank_results (bool): Whether to rerank results with the configured reranker
+        where (Optional[Dict[str, Any]]): Metadata filter applied before vector scoring
+        
+    Returns:
+        List[Dict[str, Any]]: List of similar documents with their metadata and scores
+    """
+    with tracer.span("search", top_k=top_k, rerank=rerank_results, filtered=bool(where)) as span:
+        cleaned_query = clean_text(query)
+        
+        key = _cache_key(cleaned_query, top_k, rerank_results, where)
+        cached = result_cache.get(collection_name, key)
+        span.set_attribute("cache_hit", cached is not None)
+        if cached is not None:
+            return cached
+        version = result_cache.version(collection_name)
+        started = time.perf_counter()
+        
+        results = await search_similar_async(
+            query=cleaned_query,
+            top_k=top_k,
+            collection_name=collection_name,
+            include_embeddings=rerank_results,
+            where=where
+        )
+        
+        if rerank_results:
+            with tracer.span("search.rerank", candidates=len(results)):
+                results = _without_embeddings(await rerank_async(cleaned_query, results))
+        
+        result_cache.put(collection_name, key, results, time.perf_counter() - started, version)
+        return results
\ No newline at end of file
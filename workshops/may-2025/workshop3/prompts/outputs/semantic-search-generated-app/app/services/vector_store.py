@@ -1,15 +1,15 @@
-import chromadb
-from typing import Dict, Any, List
-from app.config import CHROMA_PATH
-from app.services.embedder import get_embedding
+from typing import Dict, Any, List, Optional
+from app.services.collection_registry import registry
+from app.services.embedder import get_embedding, get_embedding_async, get_embeddings
+from app.services.result_cache import result_cache
+from app.utils.filters import prepare_where
+from app.utils.tracing import tracer
 
 def get_or_create_collection(name: str = "default"):
     """
-    Initialize and return a ChromaDB collection with the given name.
+    Return the shared ChromaDB collection with the given name, creating it if needed.
     """
-    client = chromadb.PersistentClient(path=str(CHROMA_PATH))
-    collection = client.get_or_create_collection(name=name)
-    return collection
+    return registry.get(name)
 
 def add_document(id: str, content: str, metadata: Dict[str, Any], collection_name: str = "default"):
     """
@@ -34,30 +34,62 @@ def add_document(id: str, content: str, metadata: Dict[str, Any], collection_nam
         documents=[content],
         metadatas=[metadata]
     )
+    result_cache.invalidate(collection_name)
 
-def search_similar(query: str, top_k: int = 3, collection_name: str = "default") -> List[Dict[str, Any]]:
+def add_documents(ids: List[str], contents: List[str], metadatas: List[Dict[str, Any]],
+                  collection_name: str = "default"):
     """
-    Search for similar documents using vector similarity.
+    Add or update many documents in the vector store, embedding them with concurrent batched requests.
+    
+    Documents whose IDs already exist are replaced.
     
     Args:
-        query (str): The search query
-        top_k (int): Number of results to return
-        collection_name (str): Name of the collection to search in
-        
-    Returns:
-        List[Dict[str, Any]]: List of similar documents with their metadata and scores
+        ids (List[str]): Unique identifiers for the documents
+        contents (List[str]): The text contents to embed and store
+        metadatas (List[Dict[str, Any]]): Additional metadata for each document
+        collection_name (str): Name of the collection to add to
     """
-    # Get collection
+    if not ids:
+        return
+    
     collection = get_or_create_collection(collection_name)
+    embeddings = get_embeddings(contents)
+    collection.upsert(
+        ids=ids,
+        embeddings=embeddings,
+        documents=contents,
+        metadatas=metadatas
+    )
+    result_cache.invalidate(collection_name)
+
+def delete_documents(ids: List[str], collection_name: str = "default"):
+    """
+    Delete documents from the vector store.
     
-    # Generate embedding for the query
-    query_embedding = get_embedding(query)
+    Args:
+        ids (List[str]): Identifiers of the documents to delete
+        collection_name (str): Name of the collection to delete from
+    """
+    if not ids:
+        return
     
-    # Search for similar documents
+    collection = get_or_create_collection(collection_name)
+    collection.delete(ids=ids)
+    result_cache.invalidate(collection_name)
+
+def _query_collection(query_embedding: List[float], top_k: int, collection_name: str,
+                      include_embeddings: bool = False, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Query a collection with an embedding and format the results.
+    With include_embeddings, each result also carries its stored vector as "embedding".
+    With where, only documents whose metadata matches the filter are searched.
+    """
+    collection = get_or_create_collection(collection_name)
     results = collection.query(
         query_embeddings=[query_embedding],
         n_results=top_k,
-        include=["documents", "metadatas", "distances"]
+        where=prepare_where(where),
+        include=["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
     )
     
     # Format results
@@ -69,5 +101,58 @@ def search_similar(query: str, top_k: int = 3, collection_name: str = "default")
             "metadata": results["metadatas"][0][i],
             "score": 1 - results["distances"][0][i]  # Convert distance to similarity score
         })
+        if include_embeddings:
+            similar_docs[-1]["embedding"] = results["embeddings"][0][i]
+    
+    return similar_docs
+
+def search_similar(query: str, top_k: int = 3, collection_name: str = "default",
+                   include_embeddings: bool = False, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Search for similar documents using vector similarity.
+    
+    Matching documents are selected by the vector store before similarity is
+    computed, so a selective filter still returns up to top_k results.
     
-    return similar_docs 
\ No newline at end of file
+    Args:
+        query (str): The search query
+        top_k (int): Number of results to return
+        collection_name (str): Name of the collection to search in
+        include_embeddings (bool): Whether to return the stored vectors as "embedding"
+        where (Optional[Dict[str, Any]]): Metadata filter (see app.utils.filters.prepare_where)
+        
+    Returns:
+        List[Dict[str, Any]]: List of similar documents with their metadata and scores
+    """
+    # Generate embedding for the query
+    with tracer.span("search.embed"):
+        query_embedding = get_embedding(query)
+    
+    # Search for similar documents
+    with tracer.span("search.vector_query", top_k=top_k, filtered=bool(where)):
+        return _query_collection(query_embedding, top_k, collection_name, include_embeddings, where)
+
+async def search_similar_async(query: str, top_k: int = 3, collection_name: str = "default",
+                               include_embeddings: bool = False,
+                               where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Search for similar documents without blocking the event loop.
+    
+    The query is embedded with the async OpenAI client and the ChromaDB query
+    runs on the collection registry's thread pool.
+    
+    Args:
+        query (str): The search query
+        top_k (int): Number of results to return
+        collection_name (str): Name of the collection to search in
+        include_embeddings (bool): Whether to return the stored vectors as "embedding"
+        where (Optional[Dict[str, Any]]): Metadata filter (see app.utils.filters.prepare_where)
+        
+    Returns:
+        List[Dict[str, Any]]: List of similar documents with their metadata and scores
+    """
+    with tracer.span("search.embed"):
+        query_embedding = await get_embedding_async(query)
+    with tracer.span("search.vector_query", top_k=top_k, filtered=bool(where)):
+        return await registry.run(_query_collection, query_embedding, top_k, collection_name, include_embeddings,
+                                  where)
\ No newline at end of file
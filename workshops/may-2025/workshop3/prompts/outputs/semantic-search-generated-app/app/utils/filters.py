@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+def _epoch(value: Any) -> Any:
+    """
+    Seconds since the epoch of an ISO 8601 date string (UTC unless it has an offset); other values unchanged.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def prepare_where(where: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Prepare a ChromaDB where filter from a search request.
+
+    Filters use ChromaDB's syntax: {"field": value} or {"field": {"$op": value}}
+    with $eq, $ne, $gt, $gte, $lt, $lte, $in or $nin, combined with $and / $or.
+    A dict of several fields becomes their $and, and range bounds given as
+    ISO 8601 dates become epoch seconds, which is how ingested files record
+    their `modified` time. ChromaDB validates the rest.
+
+    Args:
+        where (Optional[Dict[str, Any]]): The filter of the request, if any
+
+    Returns:
+        Optional[Dict[str, Any]]: The filter to pass to the collection, or None for no filter
+    """
+    if not where:
+        return None
+    if len(where) > 1:
+        return {"$and": [prepare_where({field: condition}) for field, condition in where.items()]}
+    (field, condition), = where.items()
+    if field in ("$and", "$or") and isinstance(condition, list):
+        return {field: [prepare_where(clause) for clause in condition]}
+    if isinstance(condition, dict):
+        return {field: {operator: _epoch(value) if operator in RANGE_OPERATORS else value
+                        for operator, value in condition.items()}}
+    return where
\ No newline at end of file
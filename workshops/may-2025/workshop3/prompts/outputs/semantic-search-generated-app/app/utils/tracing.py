@@ -0,0 +1,206 @@
+import bisect
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from app.config import TRACE_EXPORT_PATH, TRACE_SERVICE_NAME
+
+# Histogram bucket upper bounds in seconds: 10 µs to ~100 s, four buckets per doubling (~19% apart)
+BUCKET_BOUNDS = [1e-5 * 2 ** (i / 4) for i in range(94)]
+
+# Number of recently exported trace IDs remembered to recognise spans that end after their root
+EXPORTED_TRACES_KEPT = 1024
+
+class Histogram:
+    """
+    Latency distribution in fixed exponential buckets, with percentiles exact to within a bucket.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Upper bound of the bucket holding a percentile of the observations, capped by the largest one.
+
+        Args:
+            percentile (float): Percentile between 0 and 100
+
+        Returns:
+            float: Latency in seconds
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[bucket] if bucket < len(BUCKET_BOUNDS) else self.max, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p90_ms": self.percentile(90) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+class Span:
+    """
+    A timed, named step of a request; its parent is the span that was open when it started.
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "duration_ns", "error")
+
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.duration_ns = 0
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """
+        The span in OTLP/JSON form (opentelemetry.proto.trace.v1.Span).
+        """
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.start_ns + self.duration_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": 2, "message": self.error}  # STATUS_CODE_ERROR
+        return span
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+# The innermost open span of the current task or thread
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+class Tracer:
+    """
+    Records request spans into per-name latency histograms, reported by GET /metrics.
+
+    Spans nest through a context variable, so tasks created inside a span
+    (asyncio copies the context) become its children. With an export path,
+    every finished trace is appended to that file as one OTLP/JSON
+    ExportTraceServiceRequest per line, which the OpenTelemetry Collector's
+    otlpjsonfile receiver reads.
+    """
+
+    def __init__(self, export_path: Optional[str] = None, service_name: str = TRACE_SERVICE_NAME):
+        self.export_path = export_path
+        self.service_name = service_name
+        self.histograms: Dict[str, Histogram] = {}
+        self._pending: Dict[str, List[Span]] = {}
+        self._exported: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """
+        Time the enclosed block as a span.
+
+        Args:
+            name (str): Name of the step, which names its histogram
+            **attributes: Attributes of the span, exported with it
+
+        Yields:
+            Span: The open span, for attributes known only inside the block
+        """
+        parent = _current_span.get()
+        span = Span(name, parent.trace_id if parent else os.urandom(16).hex(), os.urandom(8).hex(),
+                    parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        started = time.perf_counter_ns()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ns = time.perf_counter_ns() - started
+            _current_span.reset(token)
+            self._record(span)
+
+    def _record(self, span: Span):
+        with self._lock:
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = Histogram()
+            histogram.observe(span.duration_ns / 1e9)
+            if not self.export_path:
+                return
+            # Spans wait for the root of their trace, then the whole trace is written at once; spans that
+            # end after their root (a search cancelled when the client went away) are written on their own
+            if span.trace_id in self._exported:
+                spans = [span]
+            else:
+                spans = self._pending.setdefault(span.trace_id, [])
+                spans.append(span)
+                if span.parent_id is not None:
+                    return
+                del self._pending[span.trace_id]
+                self._exported[span.trace_id] = None
+                if len(self._exported) > EXPORTED_TRACES_KEPT:
+                    self._exported.popitem(last=False)
+            request = {"resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": "app"}, "spans": [s.to_otlp() for s in spans]}],
+            }]}
+            with open(self.export_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(request) + "\n")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Latency summary of every span name.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Count, mean, p50, p90, p99 and max in milliseconds per span name
+        """
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+
+# Tracer of the search API
+tracer = Tracer(TRACE_EXPORT_PATH)
\ No newline at end of file
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import httpx
+import numpy as np
+from fastapi import FastAPI, Request
+
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "0.05"))
+STUB_DIMENSIONS = int(os.getenv("STUB_DIMENSIONS", "256"))
+
+def fake_embedding(text: str, dimensions: int = STUB_DIMENSIONS) -> np.ndarray:
+    """Deterministic unit vector for a text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).normal(size=dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+# Stubbed OpenAI backend: answers embeddings and chat completions after STUB_LATENCY seconds
+stub_app = FastAPI()
+stub_calls = Counter()
+
+@stub_app.get("/calls")
+async def stub_call_counts():
+    return stub_calls
+
+@stub_app.post("/v1/embeddings")
+async def stub_embeddings(request: Request):
+    body = await request.json()
+    stub_calls["embeddings"] += 1
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(STUB_LATENCY)
+    data = []
+    for i, text in enumerate(inputs):
+        vector = fake_embedding(text)
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+        else:
+            embedding = vector.tolist()
+        data.append({"object": "embedding", "index": i, "embedding": embedding})
+    return {"object": "list", "data": data, "model": body["model"],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+@stub_app.post("/v1/chat/completions")
+async def stub_chat_completions(request: Request):
+    body = await request.json()
+    stub_calls["chat"] += 1
+    await asyncio.sleep(STUB_LATENCY)
+    return {
+        "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": "2, 1, 0"}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+def create_sync_app() -> FastAPI:
+    """
+    The previous /search endpoint: a sync handler blocking a threadpool worker on every call.
+    """
+    from app.main import lifespan
+    from app.schemas import QueryRequest, SearchResponse, SearchResult
+    from app.services.search_engine import semantic_search
+
+    sync_app = FastAPI(lifespan=lifespan)
+
+    @sync_app.post("/search", response_model=SearchResponse)
+    def search(request: QueryRequest, rerank: bool = True):
+        results = semantic_search(request.query, rerank_results=rerank)
+        return SearchResponse(results=[SearchResult(**{k: v for k, v in doc.items() if k in SearchResult.model_fields})
+                                       for doc in results])
+
+    return sync_app
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(target: str, port: int, env: dict) -> subprocess.Popen:
+    """
+    Start a single-worker uvicorn server and wait until it accepts connections.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--workers", "1",
+         "--log-level", "warning", *(["--factory"] if target.endswith("create_sync_app") else [])],
+        env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"{target} did not start")
+
+def percentile(latencies: List[float], p: float) -> float:
+    if not latencies:
+        return float("nan")
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+async def run_load(url: str, requests: int, concurrency: int, rerank: bool,
+                   prefix: str = "benchmark") -> Tuple[List[float], Counter]:
+    """
+    Send /search requests from `concurrency` concurrent clients.
+    Queries start with `prefix`, so that runs do not hit each other's cached embeddings.
+    Returns the latencies of successful requests in seconds and a count of failures by kind.
+    """
+    latencies = []
+    errors = Counter()
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        async def worker():
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/search", params={"rerank": str(rerank).lower()},
+                                                 json={"query": f"{prefix} query {i}"})
+                    response.raise_for_status()
+                except httpx.HTTPStatusError as e:
+                    errors[f"HTTP {e.response.status_code}"] += 1
+                    continue
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test POST /search, sync vs async, against stubbed OpenAI")
+    parser.add_argument("--documents", type=int, default=2000, help="Documents loaded into the collection")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200], help="Concurrent clients")
+    parser.add_argument("--latency", type=float, default=0.25, help="Stubbed OpenAI latency per call in seconds")
+    parser.add_argument("--no-rerank", action="store_true", help="Skip the rerank call")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="async-search-benchmark-")
+    stub_port = free_port()
+    env = dict(os.environ,
+               CHROMA_PATH=os.path.join(workdir, "chroma"),
+               EMBEDDING_CACHE_PATH=os.path.join(workdir, "embedding_cache.sqlite3"),
+               OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "benchmark"),
+               OPENAI_BASE_URL=f"http://127.0.0.1:{stub_port}/v1",
+               STUB_LATENCY=str(args.latency),
+               EMBEDDING_REQUESTS_PER_MINUTE="0",
+               EMBEDDING_TOKENS_PER_MINUTE="0",
+               # Rerank through the stubbed chat model, without a latency budget or result cache
+               RERANKER_BACKEND="llm",
+               RERANK_TIMEOUT_SECONDS="0",
+               RESULT_CACHE_MAX_ENTRIES="0")
+
+    # Seed the collection with documents embedded like the stub embeds queries
+    import chromadb
+    collection = chromadb.PersistentClient(path=env["CHROMA_PATH"]).get_or_create_collection("default")
+    for start in range(0, args.documents, 500):
+        ids = [f"doc_{i}" for i in range(start, min(start + 500, args.documents))]
+        collection.add(ids=ids, documents=[f"Document {i}" for i in ids],
+                       embeddings=[fake_embedding(i).tolist() for i in ids],
+                       metadatas=[{"source": "benchmark"} for _ in ids])
+
+    stub = start_server("scripts.benchmark_async_search:stub_app", stub_port, env)
+    try:
+        print(f"{args.documents} documents, {args.requests} requests, stub latency {args.latency * 1000:.0f} ms, "
+              f"rerank {'off' if args.no_rerank else 'on'}")
+        for label, target in [("sync handler", "scripts.benchmark_async_search:create_sync_app"),
+                              ("async handler", "app.main:app")]:
+            port = free_port()
+            server = start_server(target, port, env)
+            try:
+                url = f"http://127.0.0.1:{port}"
+                asyncio.run(run_load(url, 20, 10, not args.no_rerank, f"{label} warm-up"))
+                for concurrency in args.concurrency:
+                    started = time.perf_counter()
+                    latencies, errors = asyncio.run(run_load(url, args.requests, concurrency, not args.no_rerank,
+                                                             f"{label} {concurrency}"))
+                    elapsed = time.perf_counter() - started
+                    failures = ", ".join(f"{count} {kind}" for kind, count in errors.items()) or "none"
+                    print(f"{label:<14} {concurrency:>4} concurrent  p50 {percentile(latencies, 50) * 1000:8.1f} ms  "
+                          f"p99 {percentile(latencies, 99) * 1000:8.1f} ms  {len(latencies) / elapsed:8.1f} requests/s  "
+                          f"failures: {failures}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+
+def fake_embedding(text: str, dimensions: int) -> List[float]:
+    """Deterministic unit vector for a text, so the benchmark measures the app rather than the OpenAI API."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).normal(size=dimensions)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def percentile(latencies: List[float], p: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+def run_load(client, requests: int, concurrency: int) -> List[float]:
+    """
+    Send /search requests from `concurrency` threads and return per-request latencies in seconds.
+    """
+    def one(i: int) -> float:
+        started = time.perf_counter()
+        response = client.post("/search", params={"rerank": "false"}, json={"query": f"benchmark query {i % 50}"})
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(requests)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test POST /search with and without the pooled ChromaDB client")
+    parser.add_argument("--documents", type=int, default=2000, help="Documents loaded into the collection")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding size")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per run")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    args = parser.parse_args()
+
+    # Point the app at a scratch store before it reads its configuration
+    workdir = tempfile.mkdtemp(prefix="search-benchmark-")
+    os.environ["CHROMA_PATH"] = os.path.join(workdir, "chroma")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite3")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    import chromadb
+    from fastapi.testclient import TestClient
+    from app.config import CHROMA_PATH
+    from app.main import app
+    from app.services import vector_store
+    from app.services.collection_registry import registry
+
+    vector_store.get_embedding = lambda text: fake_embedding(text, args.dimensions)
+
+    collection = registry.get("default")
+    for start in range(0, args.documents, 500):
+        ids = [f"doc_{i}" for i in range(start, min(start + 500, args.documents))]
+        collection.add(ids=ids, documents=[f"Document {i}" for i in ids],
+                       embeddings=[fake_embedding(i, args.dimensions) for i in ids],
+                       metadatas=[{"source": "benchmark"} for _ in ids])
+    registry.close()
+
+    pooled_get_or_create_collection = vector_store.get_or_create_collection
+
+    def unpooled_get_or_create_collection(name: str = "default"):
+        # What every request did before the registry: open a new client on the store
+        return chromadb.PersistentClient(path=str(CHROMA_PATH)).get_or_create_collection(name=name)
+
+    print(f"{args.documents} documents, {args.requests} requests, {args.concurrency} concurrent clients")
+    for label, get_collection in [("client per request", unpooled_get_or_create_collection),
+                                  ("pooled registry", pooled_get_or_create_collection)]:
+        vector_store.get_or_create_collection = get_collection
+        with TestClient(app) as client:
+            run_load(client, min(20, args.requests), args.concurrency)  # Warm up
+            started = time.perf_counter()
+            latencies = run_load(client, args.requests, args.concurrency)
+            elapsed = time.perf_counter() - started
+        print(f"{label:<20} p50 {percentile(latencies, 50) * 1000:7.2f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:7.2f} ms  {args.requests / elapsed:8.1f} requests/s")
+
+if __name__ == "__main__":
+    main()
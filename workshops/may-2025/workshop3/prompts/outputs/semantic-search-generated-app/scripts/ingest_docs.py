@@ -1,9 +1,12 @@
 import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 import json
+from app.config import CHROMA_PATH
 from app.utils.text_cleaner import clean_text
-from app.services.vector_store import add_document
+from app.services.vector_store import add_documents, delete_documents
 
 def load_text_file(file_path: Path) -> str:
     """Load and return the contents of a text file."""
@@ -11,47 +14,127 @@ def load_text_file(file_path: Path) -> str:
         return f.read()
 
 def extract_metadata(file_path: Path) -> Dict[str, Any]:
-    """Extract metadata from file path and name."""
+    """Extract metadata from file path and name, with the file's modification time in epoch seconds."""
     return {
         "filename": file_path.name,
         "file_type": file_path.suffix[1:],  # Remove the dot
-        "source": "raw_files"
+        "source": "raw_files",
+        "modified": int(file_path.stat().st_mtime)
     }
 
-def ingest_documents(raw_dir: str = "data/raw", collection_name: str = "default"):
+def file_fingerprint(file_path: Path) -> Dict[str, Any]:
+    """Return the mtime, size and SHA-256 of a file."""
+    stat = file_path.stat()
+    return {
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "sha256": hashlib.sha256(file_path.read_bytes()).hexdigest()
+    }
+
+def manifest_path(collection_name: str) -> Path:
+    """Location of the ingestion manifest for a collection."""
+    return CHROMA_PATH / f"manifest_{collection_name}.json"
+
+def load_manifest(collection_name: str) -> Dict[str, Dict[str, Any]]:
+    """Load the fingerprints of previously ingested files, keyed by document ID."""
+    path = manifest_path(collection_name)
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(collection_name: str, manifest: Dict[str, Dict[str, Any]]):
+    """Write the manifest atomically."""
+    path = manifest_path(collection_name)
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+def load_document(file_path: Path) -> Tuple[Dict[str, Any], str, Dict[str, Any]]:
     """
-    Ingest all text files from the raw directory into the vector store.
+    Fingerprint, load and clean one file. Runs in a worker process.
+    
+    Returns:
+        Tuple[Dict[str, Any], str, Dict[str, Any]]: The file's fingerprint, cleaned content and metadata
+    """
+    return file_fingerprint(file_path), clean_text(load_text_file(file_path)), extract_metadata(file_path)
+
+def ingest_documents(raw_dir: str = "data/raw", collection_name: str = "default",
+                     pattern: str = "*.txt", workers: int = os.cpu_count() or 1):
+    """
+    Ingest all matching files under the raw directory into the vector store.
+    
+    Files are loaded and cleaned in a process pool; their embeddings are then
+    requested in concurrent batches and written to the collection together.
     
     Args:
         raw_dir (str): Path to directory containing raw text files
         collection_name (str): Name of the collection to store documents in
+        pattern (str): File name pattern, searched recursively
+        workers (int): Number of processes loading and cleaning files
     """
     raw_path = Path(raw_dir)
     if not raw_path.exists():
         raise ValueError(f"Raw directory not found: {raw_dir}")
     
-    # Process each text file
-    for file_path in raw_path.glob("*.txt"):
-        try:
-            # Load and clean text
-            content = load_text_file(file_path)
-            cleaned_content = clean_text(content)
-            
-            # Extract metadata
-            metadata = extract_metadata(file_path)
-            
-            # Add to vector store
-            doc_id = f"doc_{file_path.stem}"
-            add_document(
-                id=doc_id,
-                content=cleaned_content,
-                metadata=metadata,
-                collection_name=collection_name
-            )
-            print(f"Successfully ingested: {file_path.name}")
-            
-        except Exception as e:
-            print(f"Error processing {file_path.name}: {str(e)}")
+    manifest = load_manifest(collection_name)
+    seen = set()
+    candidates = []
+    skipped = 0
+    
+    # Skip files whose mtime and size match the manifest without reading them
+    for file_path in sorted(raw_path.rglob(pattern)):
+        doc_id = f"doc_{file_path.relative_to(raw_path).with_suffix('').as_posix()}"
+        seen.add(doc_id)
+        previous = manifest.get(doc_id)
+        stat = file_path.stat()
+        if previous and previous["mtime"] == stat.st_mtime and previous["size"] == stat.st_size:
+            skipped += 1
+        else:
+            candidates.append((doc_id, file_path))
+    
+    # Load and clean the remaining files in parallel; files whose content did not change are skipped
+    ids, contents, metadatas, fingerprints = [], [], [], []
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [(doc_id, file_path, pool.submit(load_document, file_path)) for doc_id, file_path in candidates]
+        for doc_id, file_path, future in futures:
+            try:
+                fingerprint, content, metadata = future.result()
+            except Exception as e:
+                print(f"Error processing {file_path.name}: {str(e)}")
+                continue
+            previous = manifest.get(doc_id)
+            if previous and previous["sha256"] == fingerprint["sha256"]:
+                manifest[doc_id] = fingerprint
+                skipped += 1
+                continue
+            ids.append(doc_id)
+            contents.append(content)
+            metadatas.append(metadata)
+            fingerprints.append(fingerprint)
+    
+    # Documents whose files were removed since the last run
+    removed = [doc_id for doc_id in manifest if doc_id not in seen]
+    
+    # Embed the new and changed documents with concurrent batched requests and upsert them
+    try:
+        add_documents(
+            ids=ids,
+            contents=contents,
+            metadatas=metadatas,
+            collection_name=collection_name
+        )
+        manifest.update(zip(ids, fingerprints))
+        delete_documents(removed, collection_name=collection_name)
+        for doc_id in removed:
+            del manifest[doc_id]
+        print(f"Successfully ingested {len(ids)} documents "
+              f"({skipped} unchanged, {len(removed)} removed)")
+    except Exception as e:
+        print(f"Error ingesting documents: {str(e)}")
+    finally:
+        save_manifest(collection_name, manifest)
 
 if __name__ == "__main__":
     # Create some test documents if raw directory is empty
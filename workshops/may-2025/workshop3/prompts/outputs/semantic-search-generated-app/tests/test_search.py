@@ -1,6 +1,18 @@
+import asyncio
+import json
+import math
+import threading
+import time
+from pathlib import Path
 import pytest
-from app.services.search_engine import semantic_search
-from app.services.reranker import rerank
+from app.services import embedder, reranker as reranker_module
+from app.services.search_engine import semantic_search, semantic_search_async, _cache_key
+from app.utils.filters import prepare_where
+from app.services.reranker import rerank, LocalReranker, Reranker, _apply_ranking
+from app.services.result_cache import ResultCache
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_executor import EmbeddingExecutor
+from app.utils.tracing import Tracer
 
 def test_semantic_search():
     # Test basic search functionality
@@ -16,6 +28,153 @@ def test_semantic_search_with_reranking():
     assert all(isinstance(r, dict) for r in results)
     assert all("id" in r and "content" in r and "score" in r for r in results)
 
+def test_semantic_search_async():
+    # The async path returns the same shape as the sync one
+    results = asyncio.run(semantic_search_async("fox", top_k=2, rerank_results=True))
+    assert len(results) > 0
+    assert all("id" in r and "content" in r and "score" in r for r in results)
+
+def test_result_cache_invalidation():
+    # Writes to a collection invalidate its cached results, and only its own
+    cache = ResultCache(max_entries=10, ttl=60)
+    results = [{"id": "1", "content": "the quick brown fox", "score": 0.9}]
+    cache.put("default", ("fox", 2, False), results, 0.5, cache.version("default"))
+    cache.put("other", ("fox", 2, False), results, 0.5, cache.version("other"))
+    assert cache.get("default", ("fox", 2, False)) == results
+    
+    cache.invalidate("default")
+    assert cache.get("default", ("fox", 2, False)) is None
+    assert cache.get("other", ("fox", 2, False)) == results
+    
+    # Results computed before a write are not stored after it
+    version = cache.version("default")
+    cache.invalidate("default")
+    cache.put("default", ("fox", 2, False), results, 0.5, version)
+    assert cache.get("default", ("fox", 2, False)) is None
+    
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 2
+    assert stats["saved_seconds"] == pytest.approx(1.0)
+
+def test_result_cache_ttl_and_lru():
+    cache = ResultCache(max_entries=2, ttl=60)
+    for query in ["a", "b"]:
+        cache.put("default", query, [{"id": query}], 0.1, 0)
+    cache.get("default", "a")
+    cache.put("default", "c", [{"id": "c"}], 0.1, 0)
+    assert cache.get("default", "b") is None  # Least recently used
+    assert cache.get("default", "a") == [{"id": "a"}]
+    
+    expired = ResultCache(max_entries=2, ttl=1e-9)
+    expired.put("default", "a", [{"id": "a"}], 0.1, 0)
+    assert expired.get("default", "a") is None
+
+def test_embedding_cache_reads_write_only_on_disk_hits(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", memory_entries=0)
+    cache.put_many("model", ["a", "b"], [[0.5, 1.0], [2.0, 0.25]])
+    statements = []
+    cache._db.set_trace_callback(statements.append)
+    
+    # Misses are one SELECT and no write
+    assert cache.get_many("model", ["c", "d"]) == [None, None]
+    assert [statement.split()[0] for statement in statements] == ["SELECT"]
+    
+    # Disk hits come back in input order, duplicates included, from one batched SELECT
+    statements.clear()
+    assert cache.get_many("model", ["b", "c", "a", "b"]) == [[2.0, 0.25], None, [0.5, 1.0], [2.0, 0.25]]
+    assert [statement.split()[0] for statement in statements].count("SELECT") == 1
+    assert cache.stats()["hits"] == 3
+
+def test_async_embedding_uses_the_cache_off_the_event_loop(monkeypatch):
+    threads = []
+    
+    class RecordingCache:
+        def get_many(self, model, texts):
+            threads.append(threading.current_thread())
+            return [None]
+        
+        def put_many(self, model, texts, embeddings):
+            threads.append(threading.current_thread())
+    
+    async def run_async(texts):
+        return [[1.0, 0.0]]
+    
+    monkeypatch.setattr(embedder, "cache", RecordingCache())
+    monkeypatch.setattr(embedder.executor, "run_async", run_async)
+    
+    assert asyncio.run(embedder.get_embedding_async("fox")) == [1.0, 0.0]
+    assert len(threads) == 2 and threading.main_thread() not in threads
+
+def test_embedding_executor_cancels_pending_batches_after_a_failure():
+    sent = []
+    release = threading.Event()
+    
+    def request(texts):
+        sent.append(texts[0])
+        if texts[0] == "bad":
+            raise ValueError("not retryable")
+        release.wait(5)
+        return texts
+    
+    # Two workers and a window of four batches: "bad" fails while "text 0" is running,
+    # so at least "text 2" is still queued when the error reaches the caller
+    executor = EmbeddingExecutor(request, max_in_flight=2, max_retries=0)
+    with pytest.raises(ValueError):
+        list(executor.imap([["bad"]] + [[f"text {i}"] for i in range(10)]))
+    release.set()
+    executor._pool.shutdown(wait=True)
+    
+    assert "text 2" not in sent
+
+def test_openai_clients_do_not_retry():
+    # SDK retries would multiply the embedding executor's attempts, bypass its rate limiter
+    # and keep abandoned reranks running past their latency budget
+    assert embedder.client.max_retries == 0
+    assert embedder.async_client.max_retries == 0
+    assert reranker_module.client.max_retries == 0
+    assert reranker_module.async_client.max_retries == 0
+
+def test_prepare_where():
+    # Several fields become an $and, and ISO date bounds become epoch seconds
+    assert prepare_where(None) is None
+    assert prepare_where({"file_type": "txt"}) == {"file_type": "txt"}
+    assert prepare_where({"file_type": {"$in": ["txt", "md"]}, "modified": {"$gte": "1970-01-02"}}) == {
+        "$and": [{"file_type": {"$in": ["txt", "md"]}}, {"modified": {"$gte": 86400.0}}]}
+    assert prepare_where({"$or": [{"source": "raw_files"}, {"modified": {"$lt": "1970-01-01T00:01:00Z"}}]}) == {
+        "$or": [{"source": "raw_files"}, {"modified": {"$lt": 60.0}}]}
+    assert _cache_key("fox", 2, False, {"b": 1, "a": 2}) == _cache_key("fox", 2, False, {"a": 2, "b": 1})
+    assert _cache_key("fox", 2, False, {"a": 2}) != _cache_key("fox", 2, False, None)
+
+def test_tracer_latency_and_export(tmp_path):
+    # Spans of a task nest under the span it was created in; each trace is exported once its root ends
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(str(path), service_name="test")
+    
+    async def request():
+        with tracer.span("http.search"):
+            await asyncio.create_task(step())
+    
+    async def step():
+        with tracer.span("search", top_k=3):
+            await asyncio.sleep(0.01)
+    
+    asyncio.run(request())
+    with pytest.raises(ValueError):
+        with tracer.span("search"):
+            raise ValueError("Empty query")
+    
+    stats = tracer.stats()
+    assert stats["http.search"]["count"] == 1 and stats["search"]["count"] == 2
+    assert 10 <= stats["http.search"]["p50_ms"] and stats["search"]["max_ms"] <= stats["http.search"]["max_ms"]
+    
+    traces = [json.loads(line)["resourceSpans"][0] for line in path.read_text().splitlines()]
+    assert len(traces) == 2
+    assert traces[0]["resource"]["attributes"][0]["value"] == {"stringValue": "test"}
+    spans = {span["name"]: span for span in traces[0]["scopeSpans"][0]["spans"]}
+    assert spans["search"]["parentSpanId"] == spans["http.search"]["spanId"]
+    assert spans["search"]["attributes"] == [{"key": "top_k", "value": {"intValue": "3"}}]
+    assert traces[1]["scopeSpans"][0]["spans"][0]["status"] == {"code": 2, "message": "ValueError: Empty query"}
+
 def test_reranker():
     # Test reranker with sample documents
     docs = [
@@ -34,6 +193,75 @@ def test_reranker():
     reranked_ids = [doc["id"] for doc in reranked]
     assert original_ids != reranked_ids  # Order should be different
 
+def _ndcg(docs, k=3):
+    # Normalized discounted cumulative gain of an ordering of graded candidates
+    gains = [doc["relevance"] for doc in docs]
+    dcg = sum(g / math.log2(i + 2) for i, g in enumerate(gains[:k]))
+    ideal = sum(g / math.log2(i + 2) for i, g in enumerate(sorted(gains, reverse=True)[:k]))
+    return dcg / ideal if ideal else 1.0
+
+def test_local_reranker_relevance_parity():
+    # On graded fixtures, the local reranker orders candidates at least as well as vector order
+    fixtures = json.loads((Path(__file__).parent / "fixtures" / "rerank_fixtures.json").read_text())
+    reranker = LocalReranker(timeout=0)
+    vector_ndcg = [_ndcg(case["candidates"]) for case in fixtures]
+    local_ndcg = [_ndcg(reranker.rerank(case["query"], case["candidates"])) for case in fixtures]
+    assert sum(local_ndcg) / len(fixtures) >= sum(vector_ndcg) / len(fixtures)
+    assert sum(local_ndcg) / len(fixtures) >= 0.9
+
+def test_local_reranker_uses_stored_embeddings():
+    # Stored vectors take precedence over the vector-search score
+    docs = [
+        {"id": "1", "content": "a lazy dog", "score": 0.9, "embedding": [0.0, 1.0]},
+        {"id": "2", "content": "a sleepy cat", "score": 0.1, "embedding": [1.0, 0.0]}
+    ]
+    scores = LocalReranker(lexical_weight=0.0).score("cat", docs, query_embedding=[1.0, 0.1])
+    assert scores[1] > scores[0]
+
+def test_reranker_latency_budget():
+    # A backend that overruns its budget leaves the results in vector order
+    class SlowReranker(Reranker):
+        def _rerank(self, query, docs):
+            time.sleep(0.5)
+            return list(reversed(docs))
+        
+        async def _rerank_async(self, query, docs):
+            await asyncio.sleep(0.5)
+            return list(reversed(docs))
+    
+    docs = [{"id": "1", "content": "a"}, {"id": "2", "content": "b"}]
+    slow = SlowReranker(timeout=0.05)
+    assert slow.rerank("q", docs) == docs
+    assert asyncio.run(slow.rerank_async("q", docs)) == docs
+    assert slow.stats()["timeouts"] == 2
+
+def test_timed_out_reranks_release_the_pool(monkeypatch):
+    # Abandoned reranks stop at their next candidate, so they cannot use up the pool
+    tokenize = reranker_module.tokenize
+    def slow_tokenize(text):
+        if "slow" in text:
+            time.sleep(0.01)
+        return tokenize(text)
+    monkeypatch.setattr(reranker_module, "tokenize", slow_tokenize)
+    
+    slow_docs = [{"id": str(i), "content": f"slow document {i} about a fox", "score": 1 - i / 100} for i in range(100)]
+    local = LocalReranker(timeout=0.05)
+    for _ in range(8):  # Twice the pool's workers, each rerank needing ~1 s
+        assert local.rerank("fox", slow_docs) == slow_docs
+    
+    docs = [{"id": "1", "content": "a lazy dog", "score": 0.9}, {"id": "2", "content": "a quick fox", "score": 0.8}]
+    started = time.perf_counter()
+    reranked = local.rerank("fox", docs)
+    assert time.perf_counter() - started < local.timeout
+    assert all("rerank_score" in doc for doc in reranked)
+    assert local.stats()["timeouts"] == 8
+
+def test_apply_ranking_keeps_missing_documents():
+    # A truncated LLM answer keeps the unranked documents in vector order
+    docs = [{"id": str(i)} for i in range(12)]
+    ranked = _apply_ranking("11, 3, 7, 1", docs)
+    assert [doc["id"] for doc in ranked] == ["11", "3", "7", "1", "0", "2", "4", "5", "6", "8", "9", "10"]
+
 def test_empty_search():
     # Compare top scores for relevant and unrelated queries
     relevant_results = semantic_search("fox", top_k=2)
@@ -0,0 +1,73 @@
+# Benchmark the local engine's IVF-PQ index: recall@k against exact search at several nprobe settings
+import argparse
+import tempfile
+import time
+
+from semantic_search.vector_index import LocalCollection
+from benchmarks.vector_backends import exact_neighbours, make_vectors, percentile
+
+def measure(collection: LocalCollection, queries, truth, k: int, **options):
+    """Query latencies and recall@k of a collection against the ground truth."""
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=["distances"], **options)
+        latencies.append(time.perf_counter() - started)
+        hits += len(set(map(int, result['ids'][0])) & set(expected.tolist()))
+    return latencies, hits / (k * len(queries))
+
+def main():
+    parser = argparse.ArgumentParser(description='IVF-PQ recall versus latency benchmark')
+    parser.add_argument('--vectors', type=int, default=100000)
+    parser.add_argument('--dimensions', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--results', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=10000, help='Vectors added per write')
+    parser.add_argument('--trained-fraction', type=float, default=0.5,
+                        help='Share of the vectors added before the index is trained; the rest is added incrementally')
+    parser.add_argument('--nlist', type=int, help='IVF lists (default: 4 * sqrt(vectors))')
+    parser.add_argument('--subspaces', type=int, help='PQ bytes per vector (default: dimensions / 8)')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--rescore-factor', type=int, nargs='+', default=[10, 50],
+                        help='Candidates rescored exactly per requested result')
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dimensions)
+    queries = make_vectors(args.queries, args.dimensions, seed=1)
+    truth = exact_neighbours(vectors, queries, args.results)
+    ids = [str(i) for i in range(args.vectors)]
+    trained_rows = int(args.vectors * args.trained_fraction)
+    print(f"{args.vectors} vectors of {args.dimensions} dimensions, {args.queries} queries, top {args.results}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        collection = LocalCollection(directory, "benchmark", metric="cosine")
+        for start in range(0, trained_rows, args.batch_size):
+            end = min(start + args.batch_size, trained_rows)
+            collection.add(ids=ids[start:end], embeddings=vectors[start:end])
+
+        started = time.perf_counter()
+        settings = collection.build_ann_index(nlist=args.nlist, subspaces=args.subspaces)
+        print(f"Trained and encoded {trained_rows} vectors in {time.perf_counter() - started:.1f}s: "
+              f"{settings['nlist']} lists, {settings['subspaces']} bytes per vector "
+              f"(vs {4 * args.dimensions} as float32)")
+
+        started = time.perf_counter()
+        for start in range(trained_rows, args.vectors, args.batch_size):
+            end = min(start + args.batch_size, args.vectors)
+            collection.add(ids=ids[start:end], embeddings=vectors[start:end])
+        print(f"Added and encoded the other {args.vectors - trained_rows} vectors in "
+              f"{time.perf_counter() - started:.1f}s without retraining")
+
+        latencies, recall = measure(collection, queries, truth, args.results, exact=True)
+        print(f"exact                   p50 {percentile(latencies, 50) * 1000:7.2f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:7.2f} ms  recall@{args.results} {recall:.3f}")
+        for rescore_factor in args.rescore_factor:
+            collection.rescore_factor = rescore_factor
+            for nprobe in args.nprobe:
+                latencies, recall = measure(collection, queries, truth, args.results, nprobe=nprobe)
+                print(f"nprobe {nprobe:<4} rescore x{rescore_factor:<3} p50 {percentile(latencies, 50) * 1000:7.2f} ms  "
+                      f"p99 {percentile(latencies, 99) * 1000:7.2f} ms  recall@{args.results} {recall:.3f}")
+        collection.close()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,61 @@
+# Benchmark chunk_text's window scan and boundary index on large inputs
+import argparse
+import io
+import random
+import time
+from functools import partial
+
+from semantic_search.utils import (chunk_text, iter_chunks, _BoundaryIndex, _find_chunk_end,
+                                   _next_chunk_start)
+
+def forced_chunk_text(text: str, chunk_size: int, chunk_overlap: int, indexed: bool):
+    """chunk_text with the boundary search fixed to the window scan or the boundary index."""
+    text = ' '.join(text.split())
+    chunk_end = _BoundaryIndex(text).chunk_end if indexed else partial(_find_chunk_end, text)
+    chunks = []
+    start = 0
+    while True:
+        end = chunk_end(start, chunk_size) if start + chunk_size < len(text) else len(text)
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            return chunks
+        start = _next_chunk_start(start, end, chunk_overlap)
+
+def make_text(size: int, sentence_rate: float, seed: int = 0) -> str:
+    """Generate `size` characters of words; sentence_rate is the chance a word ends a sentence."""
+    rng = random.Random(seed)
+    words = ["vector", "search", "embedding", "similarity", "index", "query", "semantic", "meaning"]
+    block = []
+    for _ in range(20000):
+        block.append(rng.choice(words))
+        block.append(rng.choice(['. ', '? ', '! ']) if rng.random() < sentence_rate else ' ')
+    block = ''.join(block)
+    return (block * (size // len(block) + 1))[:size]
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Chunking benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100], help='Input sizes in MB')
+    parser.add_argument('--chunk-size', type=int, default=200)
+    parser.add_argument('--chunk-overlap', type=int, default=50)
+    args = parser.parse_args()
+
+    for label, sentence_rate in [("prose", 0.08), ("unpunctuated", 0.0)]:
+        for size_mb in args.sizes:
+            text = make_text(size_mb * 1024 * 1024, sentence_rate)
+            scan_time, scanned = timed(forced_chunk_text, text, args.chunk_size, args.chunk_overlap, False)
+            indexed_time, indexed = timed(forced_chunk_text, text, args.chunk_size, args.chunk_overlap, True)
+            chunked_time, chunked = timed(chunk_text, text, args.chunk_size, args.chunk_overlap)
+            streamed_time, streamed = timed(
+                lambda: sum(1 for _ in iter_chunks(io.StringIO(text), args.chunk_size, args.chunk_overlap)))
+            assert indexed == scanned == chunked and streamed == len(chunked)
+            print(f"{label:<13} {size_mb:>4} MB  {len(chunked):>9} chunks  "
+                  f"window scan {scan_time:7.2f}s  boundary index {indexed_time:7.2f}s  "
+                  f"chunk_text {chunked_time:7.2f}s  streaming {streamed_time:7.2f}s")
+
+if __name__ == "__main__":
+    main()
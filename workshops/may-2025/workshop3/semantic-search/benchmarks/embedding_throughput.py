@@ -0,0 +1,36 @@
+# Benchmark embedding ingestion throughput against a local stub endpoint with injected latency
+import argparse
+
+from semantic_search.embedding import EmbeddingGenerator, EmbeddingStats
+from semantic_search.stub_server import StubEmbeddingServer
+
+def run(chunks: int, latency: float, max_inputs: int, in_flight: int) -> EmbeddingStats:
+    """Embed `chunks` synthetic chunks and return the throughput statistics."""
+    texts = [f"Synthetic chunk {i} about vector search and embeddings." for i in range(chunks)]
+    with StubEmbeddingServer(dimensions=64, latency=latency) as server:
+        with EmbeddingGenerator(api_key="bench", base_url=server.base_url,
+                                max_in_flight=in_flight, use_cache=False) as generator:
+            stats = EmbeddingStats()
+            generator.embed_documents(texts, max_inputs=max_inputs, stats=stats)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Embedding ingestion throughput benchmark')
+    parser.add_argument('--chunks', type=int, default=2000, help='Number of chunks to embed')
+    parser.add_argument('--latency', type=float, default=0.1, help='Injected per-request latency in seconds')
+    args = parser.parse_args()
+
+    print(f"{args.chunks} chunks, {args.latency * 1000:.0f} ms per request")
+    for max_inputs, in_flight in [(1, 1), (64, 1), (64, 4), (64, 8), (16, 16)]:
+        if max_inputs == 1 and args.chunks > 200:
+            # One request per chunk is too slow to run in full; extrapolate from a sample
+            stats = run(200, args.latency, max_inputs, in_flight)
+            label = "(200-chunk sample)"
+        else:
+            stats = run(args.chunks, args.latency, max_inputs, in_flight)
+            label = ""
+        print(f"max_inputs={max_inputs:<3} in_flight={in_flight:<3} "
+              f"{stats.chunks_per_second:>9.1f} chunks/s {stats.requests_per_second:>6.1f} requests/s {label}")
+
+if __name__ == "__main__":
+    main()
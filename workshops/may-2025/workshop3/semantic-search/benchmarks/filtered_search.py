@@ -0,0 +1,75 @@
+# Benchmark metadata-filtered search in the local engine: latency and recall of pre- versus post-filtering by selectivity
+import argparse
+import math
+import tempfile
+import time
+
+import numpy as np
+
+from semantic_search.vector_index import LocalCollection
+from benchmarks.vector_backends import exact_neighbours, make_vectors, percentile
+
+BUCKETS = 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Filtered search benchmark: pre-filtering vs post-filtering')
+    parser.add_argument('--vectors', type=int, default=100000)
+    parser.add_argument('--dimensions', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--results', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=10000, help='Vectors added per write')
+    parser.add_argument('--selectivity', type=float, nargs='+', default=[0.001, 0.01, 0.05, 0.2, 0.5, 1.0],
+                        help='Shares of the collection matched by the filter')
+    parser.add_argument('--ann', action='store_true', help='Also search through an IVF-PQ index')
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dimensions)
+    queries = make_vectors(args.queries, args.dimensions, seed=1)
+    # Buckets are independent of the vectors, so a filter keeps a random share of every cluster
+    buckets = np.random.default_rng(2).integers(0, BUCKETS, args.vectors)
+    ids = [str(i) for i in range(args.vectors)]
+    metadatas = [{"bucket": int(bucket)} for bucket in buckets]
+    print(f"{args.vectors} vectors of {args.dimensions} dimensions, {args.queries} queries, top {args.results}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        collection = LocalCollection(directory, "benchmark", metric="cosine")
+        for start in range(0, args.vectors, args.batch_size):
+            collection.add(ids=ids[start:start + args.batch_size], embeddings=vectors[start:start + args.batch_size],
+                           metadatas=metadatas[start:start + args.batch_size])
+        modes = [('exact', {'exact': True})]
+        if args.ann:
+            collection.build_ann_index()
+            modes.append(('ivf-pq', {}))
+
+        for selectivity in args.selectivity:
+            limit = max(1, round(selectivity * BUCKETS))
+            where = {"bucket": {"$lt": limit}}
+            matching = np.flatnonzero(buckets < limit)
+            truth = [set(matching[top].tolist())
+                     for top in exact_neighbours(vectors[matching], queries, min(args.results, len(matching)))]
+            # Post-filtering asks for enough neighbours that k of them should match on average
+            fetched = min(args.vectors, math.ceil(args.results * BUCKETS / limit))
+            for name, options in modes:
+                for strategy in ('pre-filter', 'post-filter'):
+                    latencies, hits = [], 0
+                    for query, expected in zip(queries, truth):
+                        started = time.perf_counter()
+                        if strategy == 'pre-filter':
+                            result = collection.query(query_embeddings=[query], n_results=args.results, where=where,
+                                                      include=["distances"], **options)
+                            found = result['ids'][0]
+                        else:
+                            result = collection.query(query_embeddings=[query], n_results=fetched,
+                                                      include=["metadatas"], **options)
+                            found = [doc_id for doc_id, metadata in zip(result['ids'][0], result['metadatas'][0])
+                                     if metadata["bucket"] < limit][:args.results]
+                        latencies.append(time.perf_counter() - started)
+                        hits += len(set(map(int, found)) & expected)
+                    recall = hits / sum(len(expected) for expected in truth)
+                    print(f"selectivity {selectivity:<6} {name:<7} {strategy:<12} "
+                          f"p50 {percentile(latencies, 50) * 1000:8.2f} ms  p99 {percentile(latencies, 99) * 1000:8.2f} ms  "
+                          f"recall@{args.results} {recall:.3f}")
+        collection.close()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
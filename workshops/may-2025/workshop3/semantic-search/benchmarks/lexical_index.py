@@ -0,0 +1,63 @@
+# Benchmark building and querying the persistent lexical index at collection scale
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from semantic_search.lexical_index import InvertedIndex
+
+def make_corpus(num_documents: int, words_per_document: int, vocabulary_size: int, seed: int = 0):
+    """Chunks of Zipf-distributed words, like natural text: a few very common terms and a long tail."""
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.2, size=(num_documents, words_per_document)), vocabulary_size) - 1
+    vocabulary = np.array([f"w{i}" for i in range(vocabulary_size)])
+    return [" ".join(words) for words in vocabulary[ranks]]
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def main():
+    parser = argparse.ArgumentParser(description='Lexical index build and query benchmark')
+    parser.add_argument('--documents', type=int, default=1000000, help='Chunks in the corpus')
+    parser.add_argument('--words', type=int, default=40, help='Words per chunk')
+    parser.add_argument('--vocabulary', type=int, default=200000, help='Distinct words')
+    parser.add_argument('--batch-size', type=int, default=50000, help='Chunks added per index batch (segment)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--results', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = InvertedIndex(directory)
+        build_seconds = 0.0
+        for start in range(0, args.documents, args.batch_size):
+            batch = make_corpus(min(args.batch_size, args.documents - start), args.words, args.vocabulary, seed=start)
+            started = time.perf_counter()
+            index.add([f"chunk_{i}" for i in range(start, start + len(batch))], batch)
+            build_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        index.save()
+        save_seconds = time.perf_counter() - started
+        print(f"{args.documents} chunks: indexed in {build_seconds:.1f}s, saved (and merged) in {save_seconds:.1f}s, "
+              f"{directory_size(directory) / 2**20:.0f} MiB on disk, {len(index.segments)} segments")
+
+        # Query the reopened (memory-mapped) index with mixes of common and rare terms
+        started = time.perf_counter()
+        index = InvertedIndex(directory)
+        print(f"Opened in {(time.perf_counter() - started) * 1000:.0f} ms")
+        rng = np.random.default_rng(1)
+        for label, low, high in [("common terms", 0, 100), ("mid-frequency terms", 100, 5000),
+                                 ("rare terms", 5000, args.vocabulary)]:
+            latencies = []
+            for _ in range(args.queries):
+                query = " ".join(f"w{i}" for i in rng.integers(low, high, size=rng.integers(2, 5)))
+                started = time.perf_counter()
+                index.search(query, args.results)
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            print(f"{label:<20} p50 {latencies[len(latencies) // 2] * 1000:7.2f} ms  "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.2f} ms")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,71 @@
+# Benchmark two-stage search: a first pass on truncated (Matryoshka) vectors, rescored with full vectors
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from semantic_search.search import truncate_embeddings, two_stage_query
+from semantic_search.vector_index import LocalCollection
+from benchmarks.vector_backends import exact_neighbours, make_vectors, percentile
+
+def make_matryoshka_vectors(num_vectors: int, dimensions: int, num_queries: int, seed: int = 0):
+    """
+    Clustered unit vectors whose variance decays along the dimensions, like
+    Matryoshka-trained embeddings, and queries that are noisy copies of some of them.
+    """
+    rng = np.random.default_rng(seed)
+    profile = (np.arange(dimensions, dtype=np.float32) + 1) ** -0.5
+    vectors = make_vectors(num_vectors, dimensions, seed) * profile
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(num_vectors, num_queries, replace=False)]
+    queries = queries + rng.normal(size=queries.shape).astype(np.float32) * profile / np.linalg.norm(profile)
+    return vectors, queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Two-stage (truncated then full vector) search benchmark')
+    parser.add_argument('--vectors', type=int, default=50000)
+    parser.add_argument('--dimensions', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--results', type=int, default=10)
+    parser.add_argument('--short-dimensions', type=int, nargs='+', default=[64, 128, 256, 512])
+    parser.add_argument('--candidates-per-result', type=int, nargs='+', default=[5, 10, 20],
+                        help='Short-vector candidates rescored per requested result')
+    args = parser.parse_args()
+
+    vectors, queries = make_matryoshka_vectors(args.vectors, args.dimensions, args.queries)
+    truth = exact_neighbours(vectors, queries, args.results)
+    ids = [str(i) for i in range(args.vectors)]
+    print(f"{args.vectors} vectors of {args.dimensions} dimensions, {args.queries} queries, top {args.results}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        collection = LocalCollection(f"{directory}/full", "full", metric="cosine")
+        collection.add(ids=ids, embeddings=vectors)
+
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            collection.query(query_embeddings=[query.tolist()], n_results=args.results, include=["distances"])
+            latencies.append(time.perf_counter() - started)
+        print(f"full {args.dimensions:<5} one stage            p50 {percentile(latencies, 50) * 1000:7.2f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:7.2f} ms  recall@{args.results} 1.000")
+
+        for dimensions in args.short_dimensions:
+            short = LocalCollection(f"{directory}/short_{dimensions}", "short", metric="cosine")
+            short.add(ids=ids, embeddings=truncate_embeddings(vectors, dimensions))
+            for per_result in args.candidates_per_result:
+                latencies, hits = [], 0
+                for query, expected in zip(queries, truth):
+                    started = time.perf_counter()
+                    result = two_stage_query(short, collection, [query.tolist()], args.results, dimensions,
+                                             args.results * per_result, ["distances"])
+                    latencies.append(time.perf_counter() - started)
+                    hits += len(set(map(int, result['ids'][0])) & set(expected.tolist()))
+                print(f"short {dimensions:<4} {args.results * per_result:>4} candidates  "
+                      f"p50 {percentile(latencies, 50) * 1000:7.2f} ms  p99 {percentile(latencies, 99) * 1000:7.2f} ms  "
+                      f"recall@{args.results} {hits / (args.results * args.queries):.3f}")
+            short.close()
+        collection.close()
+
+if __name__ == '__main__':
+    main()
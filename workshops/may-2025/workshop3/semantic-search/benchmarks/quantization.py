@@ -0,0 +1,51 @@
+# Benchmark quantized vector storage in the local engine: disk and scanned bytes, query latency and recall
+import argparse
+import os
+import tempfile
+import time
+
+from semantic_search.vector_index import LocalCollection
+from benchmarks.ann import measure
+from benchmarks.vector_backends import exact_neighbours, make_vectors, percentile
+
+def vector_bytes(collection: LocalCollection, names=('vectors.npy', 'scales.npy')) -> int:
+    """Size of some vector arrays of every segment; by default those a query scans."""
+    return sum(os.path.getsize(os.path.join(segment.path, name)) for segment in collection.segments
+               for name in names if os.path.exists(os.path.join(segment.path, name)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantized (int8) vector storage benchmark')
+    parser.add_argument('--vectors', type=int, default=50000)
+    parser.add_argument('--dimensions', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--results', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=10000, help='Vectors added per write')
+    parser.add_argument('--rescore-factor', type=int, nargs='+', default=[4],
+                        help='Candidates rescored from the float32 copy per requested result')
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dimensions)
+    queries = make_vectors(args.queries, args.dimensions, seed=1)
+    truth = exact_neighbours(vectors, queries, args.results)
+    ids = [str(i) for i in range(args.vectors)]
+    print(f"{args.vectors} vectors of {args.dimensions} dimensions, {args.queries} queries, top {args.results}")
+
+    for dtype, rescore_copy in [('float32', False), ('int8', False), ('int8', True)]:
+        with tempfile.TemporaryDirectory() as directory:
+            collection = LocalCollection(directory, "benchmark", metric="cosine", dtype=dtype, rescore_copy=rescore_copy)
+            for start in range(0, args.vectors, args.batch_size):
+                collection.add(ids=ids[start:start + args.batch_size], embeddings=vectors[start:start + args.batch_size])
+            scanned = vector_bytes(collection) / 2**20
+            disk = vector_bytes(collection, ('vectors.npy', 'scales.npy', 'full_vectors.npy')) / 2**20
+            for rescore_factor in (args.rescore_factor if rescore_copy else [1]):
+                collection.quantized_rescore_factor = rescore_factor
+                measure(collection, queries[:5], truth[:5], args.results)  # Warm the page cache
+                latencies, recall = measure(collection, queries, truth, args.results)
+                label = f"{dtype} + copy x{rescore_factor}" if rescore_copy else dtype
+                print(f"{label:<16} disk {disk:7.1f} MiB  scanned {scanned:7.1f} MiB  "
+                      f"p50 {percentile(latencies, 50) * 1000:7.2f} ms  p99 {percentile(latencies, 99) * 1000:7.2f} ms  "
+                      f"recall@{args.results} {recall:.3f}")
+            collection.close()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
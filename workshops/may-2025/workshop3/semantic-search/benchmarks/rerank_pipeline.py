@@ -0,0 +1,58 @@
+# Benchmark multi-stage re-ranking: the columnar pipeline versus chaining result dicts
+import argparse
+
+import numpy as np
+
+from semantic_search.reranker import ReRanker, RerankPipeline, parse_stages
+from semantic_search.results import ResultSet
+from benchmarks.reranking import make_results, timed
+
+def chain_dicts(reranker: ReRanker, query: str, results, stages, user_profile):
+    """Baseline: every stage takes and returns a result dict, rebuilding its nested lists in between."""
+    for stage in stages:
+        if stage == 'bm25':
+            results = reranker.bm25_rerank(query, results)
+        elif stage == 'diversity':
+            results = reranker.diversity_rerank(results)
+        elif stage == 'recency':
+            results = reranker.recency_rerank(results)
+        else:
+            results = reranker.personalized_rerank(results, user_profile)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-stage re-ranking benchmark')
+    parser.add_argument('--candidates', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--words', type=int, default=40, help='Words per candidate document')
+    parser.add_argument('--query', default="semantic vector search with embedding index")
+    parser.add_argument('--dimensions', type=int, default=1536, help='Embedding size for diversity re-ranking')
+    parser.add_argument('--stages', type=parse_stages, nargs='+',
+                        default=[parse_stages('bm25,recency'), parse_stages('bm25,recency,personalized,diversity')],
+                        help="Pipelines to run, e.g. 'bm25,recency,diversity'")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    user_profile = {f"term{i}": float(weight) for i, weight in enumerate(rng.random(200))}
+    for num_documents in args.candidates:
+        results = make_results(num_documents, args.words)
+        results['ids'] = [[f"doc_{i}" for i in range(num_documents)]]
+        for metadata, timestamp in zip(results['metadatas'][0], rng.integers(0, 10 ** 9, num_documents)):
+            metadata['timestamp'] = int(timestamp)
+        results['embeddings'] = [rng.normal(size=(num_documents, args.dimensions)).astype(np.float32)]
+
+        for stages in args.stages:
+            # The BM25 index of the candidates is built once and reused by every run, as within a pipeline
+            reranker = ReRanker()
+            pipeline = RerankPipeline(stages, user_profile=user_profile, reranker=reranker)
+            chained = timed(chain_dicts, reranker, args.query, results, stages, user_profile)
+            columnar = timed(lambda: pipeline.rerank(args.query, results))
+            result_set = ResultSet.from_results(results)
+            per_stage = []
+            for stage in stages:
+                single = RerankPipeline([stage], user_profile=user_profile, reranker=reranker)
+                per_stage.append(f"{stage} {timed(single.run, args.query, result_set):.2f}")
+            print(f"{num_documents:>6} candidates  {' -> '.join(stages):<40} chained dicts {chained:8.2f} ms  "
+                  f"pipeline {columnar:8.2f} ms  (stages, ms: {'  '.join(per_stage)})")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,124 @@
+# Benchmark BM25, diversity (MMR) and personalized re-ranking of large candidate sets
+import argparse
+import random
+import time
+from statistics import mean
+
+import numpy as np
+
+from semantic_search.keywords import KeywordMatcher
+from semantic_search.reranker import ReRanker
+
+def loop_bm25_scores(query: str, documents, k1: float = 1.5, b: float = 0.75):
+    """Baseline: per-term substring counting, as bm25_rerank did before the vectorized index."""
+    query_terms = query.lower().split()
+    doc_lengths = [len(doc.split()) for doc in documents]
+    avg_doc_length = mean(doc_lengths)
+    term_doc_counts = {term: sum(1 for doc in documents if term.lower() in doc.lower()) for term in query_terms}
+    scores = []
+    for i, doc in enumerate(documents):
+        score = 0
+        for term in query_terms:
+            if term_doc_counts[term] == 0:
+                continue
+            tf = doc.lower().count(term.lower())
+            idf = np.log((len(documents) - term_doc_counts[term] + 0.5) / (term_doc_counts[term] + 0.5) + 1)
+            score += idf * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_lengths[i] / avg_doc_length))
+        scores.append(score)
+    return [score / max(scores) for score in scores] if max(scores) > 0 else scores
+
+def pairwise_mmr_order(relevance, vectors, diversity_factor: float = 0.5):
+    """Baseline: per-pair Python cosine similarities at every step, as diversity_rerank did before."""
+    def cosine(a, b):
+        dot = sum(x * y for x, y in zip(a, b))
+        na, nb = np.sqrt(sum(x * x for x in a)), np.sqrt(sum(y * y for y in b))
+        return 0 if na == 0 or nb == 0 else dot / (na * nb)
+
+    selected = [max(range(len(relevance)), key=lambda i: relevance[i])]
+    remaining = [i for i in range(len(relevance)) if i != selected[0]]
+    while remaining:
+        best_idx = max(remaining, key=lambda i: (1 - diversity_factor) * relevance[i]
+                       - diversity_factor * max(cosine(vectors[i], vectors[j]) for j in selected))
+        selected.append(best_idx)
+        remaining.remove(best_idx)
+    return selected
+
+def loop_profile_scores(documents, user_profile):
+    """Baseline: one str.count per keyword and document, as personalized_rerank did before the keyword matcher."""
+    scores = []
+    for doc in documents:
+        doc_lower = doc.lower()
+        scores.append(sum(doc_lower.count(keyword.lower()) * weight for keyword, weight in user_profile.items()))
+    return scores
+
+def make_results(num_documents: int, words_per_document: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(2000)] + ["vector", "search", "embedding", "semantic", "index"]
+    documents = [" ".join(rng.choice(vocabulary) for _ in range(words_per_document)) for _ in range(num_documents)]
+    return {
+        'documents': [documents],
+        'metadatas': [[{"chunk_id": i} for i in range(num_documents)]],
+        'distances': [[rng.random() for _ in range(num_documents)]],
+    }
+
+def timed(fn, *args, repeat: int = 5) -> float:
+    """Best wall time of `repeat` runs in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='BM25 re-ranking benchmark')
+    parser.add_argument('--candidates', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--words', type=int, default=40, help='Words per candidate document')
+    parser.add_argument('--query', default="semantic vector search with embedding index")
+    parser.add_argument('--dimensions', type=int, default=1536, help='Embedding size for diversity re-ranking')
+    parser.add_argument('--profile-terms', type=int, nargs='+', default=[10, 1000, 5000],
+                        help='Keywords in the user profile for personalized re-ranking')
+    parser.add_argument('--baseline-limit', type=int, default=50,
+                        help='Largest candidate set the pure-Python MMR baseline is run on')
+    args = parser.parse_args()
+
+    for num_documents in args.candidates:
+        results = make_results(num_documents, args.words)
+        documents = results['documents'][0]
+        baseline = timed(loop_bm25_scores, args.query, documents, repeat=1)
+        cold = timed(lambda: ReRanker().bm25_rerank(args.query, results))
+        reranker = ReRanker()
+        reranker.bm25_rerank(args.query, results)
+        warm = timed(reranker.bm25_rerank, args.query, results)
+        print(f"{num_documents:>6} candidates  per-term loop {baseline:9.2f} ms  "
+              f"vectorized {cold:7.2f} ms  (index reused {warm:6.2f} ms)")
+
+    rng = np.random.default_rng(0)
+    for num_documents in args.candidates:
+        results = make_results(num_documents, args.words)
+        results['embeddings'] = [rng.normal(size=(num_documents, args.dimensions)).astype(np.float32)]
+        mmr = timed(ReRanker().diversity_rerank, results)
+        if num_documents <= args.baseline_limit:
+            relevance = [1 - d for d in results['distances'][0]]
+            vectors = results['embeddings'][0].tolist()
+            baseline = f"{timed(pairwise_mmr_order, relevance, vectors, repeat=1):9.2f} ms"
+        else:
+            baseline = "  skipped"
+        print(f"{num_documents:>6} candidates  MMR pairwise Python {baseline}  "
+              f"embedding matrix {mmr:7.2f} ms  ({args.dimensions} dims)")
+
+    rng = random.Random(0)
+    for num_terms in args.profile_terms:
+        user_profile = {f"term{i}": rng.random() for i in rng.sample(range(2000), min(num_terms, 2000))}
+        user_profile.update({f"phrase {i} term{i}": rng.random() for i in range(max(0, num_terms - 2000))})
+        for num_documents in args.candidates:
+            results = make_results(num_documents, args.words)
+            baseline = timed(loop_profile_scores, results['documents'][0], user_profile, repeat=1)
+            KeywordMatcher._cache.clear()
+            cold = timed(lambda: ReRanker().personalized_rerank(results, user_profile), repeat=1)
+            warm = timed(ReRanker().personalized_rerank, results, user_profile)
+            print(f"{num_documents:>6} candidates  {len(user_profile):>5} profile terms  str.count loop {baseline:9.2f} ms  "
+                  f"Aho-Corasick {cold:8.2f} ms  (matcher cached {warm:7.2f} ms)")
+
+if __name__ == "__main__":
+    main()
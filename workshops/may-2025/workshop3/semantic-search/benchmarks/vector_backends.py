@@ -0,0 +1,72 @@
+# Benchmark the local vector engine against ChromaDB: build time, query latency and recall
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from semantic_search.backends import open_client
+
+def make_vectors(num_vectors: int, dimensions: int, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, num_vectors // 500), dimensions)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), num_vectors)] + 0.5 * rng.normal(
+        size=(num_vectors, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Ground truth by cosine similarity over the whole matrix."""
+    neighbours = []
+    for query in queries:
+        similarities = vectors @ query
+        top = np.argpartition(-similarities, k - 1)[:k]
+        neighbours.append(top[np.argsort(-similarities[top])])
+    return np.array(neighbours)
+
+def percentile(latencies, p: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Local vector engine vs ChromaDB benchmark')
+    parser.add_argument('--vectors', type=int, default=50000)
+    parser.add_argument('--dimensions', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--results', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=5000, help='Vectors added per write')
+    parser.add_argument('--backends', nargs='+', default=['local', 'chroma'])
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dimensions)
+    queries = make_vectors(args.queries, args.dimensions, seed=1)
+    truth = exact_neighbours(vectors, queries, args.results)
+    ids = [str(i) for i in range(args.vectors)]
+    print(f"{args.vectors} vectors of {args.dimensions} dimensions, {args.queries} queries, top {args.results}")
+
+    for backend in args.backends:
+        with tempfile.TemporaryDirectory() as directory:
+            client = open_client(directory, backend)
+            collection = client.get_or_create_collection("benchmark", metadata={"hnsw:space": "cosine"})
+            started = time.perf_counter()
+            for start in range(0, args.vectors, args.batch_size):
+                end = min(start + args.batch_size, args.vectors)
+                collection.add(ids=ids[start:end], embeddings=vectors[start:end])
+            build_seconds = time.perf_counter() - started
+
+            latencies, hits = [], 0
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                result = collection.query(query_embeddings=[query.tolist()], n_results=args.results,
+                                          include=["distances"])
+                latencies.append(time.perf_counter() - started)
+                hits += len(set(map(int, result['ids'][0])) & set(expected.tolist()))
+            print(f"{backend:<7} build {build_seconds:7.1f}s  query p50 {percentile(latencies, 50) * 1000:7.2f} ms  "
+                  f"p99 {percentile(latencies, 99) * 1000:7.2f} ms  "
+                  f"recall@{args.results} {hits / (args.results * args.queries):.3f}")
+            close = getattr(client, 'close', None)
+            if close is not None:
+                close()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,43 @@
+# Vector store backends behind SemanticSearch
+import os
+from typing import Any, Dict, Protocol, Sequence
+
+from semantic_search.config import VECTOR_BACKEND, LOCAL_VECTOR_DTYPE
+
+BACKENDS = ('chroma', 'local')
+
+class VectorCollection(Protocol):
+    """The part of ChromaDB's Collection API that SemanticSearch relies on."""
+
+    def count(self) -> int: ...
+
+    def add(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]], documents: Sequence[str] = None,
+            metadatas: Sequence[Dict[str, Any]] = None): ...
+
+    def upsert(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]], documents: Sequence[str] = None,
+               metadatas: Sequence[Dict[str, Any]] = None): ...
+
+    def delete(self, ids: Sequence[str] = None): ...
+
+    def get(self, ids: Sequence[str] = None, limit: int = None, offset: int = None,
+            include: Sequence[str] = ...) -> Dict[str, Any]: ...
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10,
+              include: Sequence[str] = ...) -> Dict[str, Any]: ...
+
+def open_client(persist_directory: str, backend: str = VECTOR_BACKEND):
+    """
+    Open the vector store client of a backend.
+
+    'chroma' is a ChromaDB PersistentClient on `persist_directory`; 'local' is the
+    in-process engine of semantic_search.vector_index, stored in its 'local'
+    subdirectory. Both hand out collections through get_or_create_collection().
+    """
+    if backend == 'chroma':
+        import chromadb
+        from chromadb.config import Settings
+        return chromadb.PersistentClient(path=persist_directory, settings=Settings(persist_directory=persist_directory))
+    if backend == 'local':
+        from semantic_search.vector_index import LocalClient
+        return LocalClient(os.path.join(persist_directory, 'local'), dtype=LOCAL_VECTOR_DTYPE)
+    raise ValueError(f"Unknown vector backend {backend!r} (expected one of {', '.join(BACKENDS)})")
\ No newline at end of file
@@ -0,0 +1,92 @@
+# Vectorized BM25 scoring over a tokenized candidate set
+import string
+from itertools import chain
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# ASCII punctuation (except '_') separates tokens like whitespace does
+_PUNCTUATION = str.maketrans({c: ' ' for c in string.punctuation if c != '_'})
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens of a text."""
+    return text.lower().translate(_PUNCTUATION).split()
+
+class BM25Index:
+    """
+    Tokenized representation of a set of documents for BM25 scoring.
+
+    Each document is tokenized once. Term frequencies are kept as a sparse
+    term-major (CSC) matrix: for term t, postings[indptr[t]:indptr[t + 1]] are
+    the documents containing it and counts[...] how often. Scoring a query
+    gathers the postings of its terms and sums their contributions per document
+    with NumPy, so the same index can score any number of queries.
+    """
+
+    def __init__(self, documents: Sequence[str]):
+        """
+        Tokenize the documents and build the term-frequency matrix.
+
+        Args:
+            documents: Texts to index
+        """
+        self.num_documents = len(documents)
+
+        tokenized = [tokenize(document) for document in documents]
+        lengths = np.fromiter(map(len, tokenized), dtype=np.int64, count=self.num_documents)
+        tokens = list(chain.from_iterable(tokenized))
+        self.vocabulary: Dict[str, int] = {term: i for i, term in enumerate(dict.fromkeys(tokens))}
+        self.terms = list(self.vocabulary)
+        terms = np.fromiter(map(self.vocabulary.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+        docs = np.repeat(np.arange(self.num_documents, dtype=np.int64), lengths)
+
+        # Count (term, document) pairs; unique keys come out sorted term-major
+        keys, counts = np.unique(terms * max(self.num_documents, 1) + docs, return_counts=True)
+        self.postings = keys % max(self.num_documents, 1)
+        self.counts = counts.astype(np.float64)
+        self.indptr = np.searchsorted(keys // max(self.num_documents, 1),
+                                      np.arange(len(self.vocabulary) + 1))
+        self.document_frequency = np.diff(self.indptr)
+        self.doc_lengths = lengths.astype(np.float64)
+        self.avg_doc_length = self.doc_lengths.mean() if self.num_documents else 0.0
+
+    def idf(self, term_ids: np.ndarray) -> np.ndarray:
+        """Inverse document frequency of terms within this document set."""
+        df = self.document_frequency[term_ids]
+        return np.log((self.num_documents - df + 0.5) / (df + 0.5) + 1)
+
+    def score(self, query: str, k1: float = 1.5, b: float = 0.75,
+              idf: Optional[Callable[[List[str]], np.ndarray]] = None,
+              avg_doc_length: Optional[float] = None) -> np.ndarray:
+        """
+        BM25 score of every document for a query.
+
+        Repeated query terms count once per occurrence. Term weights and the
+        average document length come from this document set unless `idf` (a
+        function of a list of terms) and `avg_doc_length` give corpus-level ones.
+
+        Returns:
+            Array with one score per document
+        """
+        scores = np.zeros(self.num_documents, dtype=np.float64)
+        term_ids = [self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary]
+        avg_doc_length = avg_doc_length or self.avg_doc_length
+        if not term_ids or avg_doc_length == 0:
+            return scores
+
+        unique_ids, multiplicity = np.unique(np.array(term_ids, dtype=np.int64), return_counts=True)
+        if idf is None:
+            weights = self.idf(unique_ids) * multiplicity
+        else:
+            weights = np.asarray(idf([self.terms[i] for i in unique_ids]), dtype=np.float64) * multiplicity
+
+        # Gather the postings of all query terms into flat arrays
+        starts, ends = self.indptr[unique_ids], self.indptr[unique_ids + 1]
+        sizes = ends - starts
+        offsets = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+        docs = self.postings[offsets]
+        tf = self.counts[offsets]
+
+        norm = k1 * (1 - b + b * self.doc_lengths / avg_doc_length)
+        contributions = np.repeat(weights, sizes) * tf * (k1 + 1) / (tf + norm[docs])
+        return np.bincount(docs, weights=contributions, minlength=self.num_documents)
\ No newline at end of file
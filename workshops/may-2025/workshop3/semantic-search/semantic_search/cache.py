@@ -0,0 +1,172 @@
+# Persistent content-addressed embedding cache
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from semantic_search.config import (
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_MEMORY_ENTRIES
+)
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by hash(model, normalized text).
+
+    Vectors are stored as float32 blobs in SQLite behind an in-process LRU. When
+    the database grows past max_entries, the least recently used rows are evicted.
+    The file format is shared with the generated app's cache, so both can point
+    at the same database.
+    """
+
+    _shared: Dict[str, 'EmbeddingCache'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 memory_entries: int = EMBEDDING_CACHE_MEMORY_ENTRIES):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: SQLite database file
+            max_entries: Maximum number of vectors kept on disk
+            memory_entries: Maximum number of vectors kept in the in-process LRU
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @classmethod
+    def shared(cls, path: str = EMBEDDING_CACHE_PATH) -> 'EmbeddingCache':
+        """Return the process-wide cache instance for a database file."""
+        with cls._shared_lock:
+            if path not in cls._shared:
+                cls._shared[path] = cls(path)
+            return cls._shared[path]
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        """Content address of a text for a given model."""
+        normalized = ' '.join(text.split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode('utf-8')).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings for texts; missing entries are returned as None."""
+        keys = [self.key(model, text) for text in texts]
+        results = [None] * len(texts)
+
+        with self._lock:
+            disk_lookups = []
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[i] = self._memory[key]
+                else:
+                    disk_lookups.append(i)
+
+            if disk_lookups:
+                wanted = list({keys[i] for i in disk_lookups})
+                found = {}
+                for offset in range(0, len(wanted), 500):
+                    part = wanted[offset:offset + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                    ).fetchall()
+                    found.update((key, np.frombuffer(blob, dtype=np.float32).tolist()) for key, blob in rows)
+
+                if found:
+                    now = time.time()
+                    self._db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                         [(now, key) for key in found])
+                    self._db.commit()
+                    for key, vector in found.items():
+                        self._remember(key, vector)
+
+                for i in disk_lookups:
+                    results[i] = found.get(keys[i])
+
+            found_count = sum(1 for result in results if result is not None)
+            self.hits += found_count
+            self.misses += len(texts) - found_count
+
+        return results
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Look up the embedding of a single text."""
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings for texts, evicting least recently used rows if the cache is full."""
+        now = time.time()
+        rows = {}
+        for text, embedding in zip(texts, embeddings):
+            rows[self.key(model, text)] = embedding
+
+        with self._lock:
+            # Keys are content addresses, so an existing row already holds the same vector
+            cursor = self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(embedding, dtype=np.float32).tobytes(), now) for key, embedding in rows.items()]
+            )
+            self._size += max(cursor.rowcount, 0)
+            for key, embedding in rows.items():
+                self._remember(key, list(embedding))
+
+            if self._size > self.max_entries:
+                # Evict down to 90% of the limit so eviction does not run on every insert
+                excess = self._size - int(self.max_entries * 0.9)
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self._size -= excess
+                self.evictions += excess
+            self._db.commit()
+
+    def _remember(self, key: str, vector: List[float]):
+        """Insert into the in-process LRU, dropping the oldest entry when full."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": self._size,
+            "memory_entries": len(self._memory)
+        }
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._db.close()
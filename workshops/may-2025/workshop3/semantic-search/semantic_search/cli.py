@@ -1,15 +1,26 @@
 # Command Line Interface for the semantic search application
 import argparse
+import json
 import sys
 import os
-import gc
-import time
+from collections import deque
 from typing import List, Dict
 
-from semantic_search.search import SemanticSearch
-from semantic_search.utils import process_file, chunk_text, create_metadata, format_search_results
-from semantic_search.config import DEFAULT_COLLECTION_NAME, DEFAULT_SEARCH_RESULTS
-from semantic_search.reranker import ReRanker
+from semantic_search.search import SemanticSearch, SearchStats
+from semantic_search.ingestion import IngestionSession, collect_files
+from semantic_search.utils import process_file, chunk_text, iter_chunks, create_metadata, format_search_results
+from semantic_search.config import (
+    DEFAULT_COLLECTION_NAME,
+    DEFAULT_SEARCH_RESULTS,
+    SEARCH_BATCH_SIZE,
+    INGEST_BATCH_SIZE,
+    INGEST_WORKERS,
+    INGEST_FILE_PATTERN,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP
+)
+from semantic_search.reranker import RERANK_STAGES, RerankPipeline, parse_stages
+from semantic_search.tracing import tracer
 
 def parse_args():
     """Parse command line arguments."""
@@ -20,19 +31,73 @@ def parse_args():
     add_parser = subparsers.add_parser('add', help='Add documents to the vector database')
     add_parser.add_argument('file', help='Text file to process')
     add_parser.add_argument('--collection', default=DEFAULT_COLLECTION_NAME, help='Collection name')
+    add_parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE,
+                            help='Number of chunks embedded and committed together')
+    
+    # Ingest directories command
+    ingest_parser = subparsers.add_parser('ingest', help='Add many files (directories or globs) in parallel')
+    ingest_parser.add_argument('paths', nargs='+', help='Files, directories or glob patterns to ingest')
+    ingest_parser.add_argument('--collection', default=DEFAULT_COLLECTION_NAME, help='Collection name')
+    ingest_parser.add_argument('--pattern', default=INGEST_FILE_PATTERN,
+                               help='File name pattern matched inside directories')
+    ingest_parser.add_argument('--workers', type=int, default=INGEST_WORKERS,
+                               help='Processes reading and chunking files')
+    ingest_parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE,
+                               help='Number of chunks embedded and committed together')
     
     # Search command
     search_parser = subparsers.add_parser('search', help='Search for documents')
     search_parser.add_argument('query', help='Search query')
     search_parser.add_argument('--collection', default=DEFAULT_COLLECTION_NAME, help='Collection name')
     search_parser.add_argument('--results', type=int, default=DEFAULT_SEARCH_RESULTS, help='Number of results to return')
-    search_parser.add_argument('--rerank', choices=['bm25', 'diversity', 'recency', 'personalized'], 
-                              help='Re-ranking method to apply')
+    search_parser.add_argument('--mode', choices=['vector', 'lexical', 'hybrid'], default='vector',
+                              help='Retrieval: vector similarity, BM25 over the lexical index, or both fused')
+    search_parser.add_argument('--rerank', type=rerank_stages, metavar='STAGES',
+                              help=f"Re-ranking stages to apply in turn, e.g. bm25 or 'bm25,recency,diversity' "
+                                   f"(stages: {', '.join(RERANK_STAGES)})")
     search_parser.add_argument('--diversity', type=float, default=0.5, 
                               help='Diversity factor for diversity re-ranking (0-1)')
     search_parser.add_argument('--recency', type=float, default=0.3, 
                               help='Recency weight for recency re-ranking (0-1)')
     search_parser.add_argument('--profile', help='Path to user profile JSON file for personalized re-ranking')
+    search_parser.add_argument('--nprobe', type=int,
+                               help='IVF lists scanned per query on local collections with an ANN index')
+    search_parser.add_argument('--where', type=json.loads,
+                               help='Metadata filter as JSON, e.g. \'{"file_ext": ".md", "modified": {"$gte": "2025-05-01"}}\'')
+    search_parser.add_argument('--profile-timing', action='store_true',
+                               help='Report the time spent in each stage (embedding, query, re-ranking, formatting)')
+    
+    # Batch search command
+    batch_parser = subparsers.add_parser('search-batch', help='Search for many queries read from a JSONL file')
+    batch_parser.add_argument('queries', help='JSONL file with one {"query": ..., "id": ...} object (or string) per line')
+    batch_parser.add_argument('--output', help='JSONL file to write results to (default: stdout)')
+    batch_parser.add_argument('--collection', default=DEFAULT_COLLECTION_NAME, help='Collection name')
+    batch_parser.add_argument('--results', type=int, default=DEFAULT_SEARCH_RESULTS, help='Number of results per query')
+    batch_parser.add_argument('--batch-size', type=int, default=SEARCH_BATCH_SIZE,
+                              help='Queries embedded and sent to ChromaDB together')
+    batch_parser.add_argument('--where', type=json.loads, help='Metadata filter as JSON, applied to every query')
+    batch_parser.add_argument('--profile-timing', action='store_true',
+                              help='Report the latency distribution of each stage at the end')
+    
+    # Lexical index command
+    index_parser = subparsers.add_parser('index-lexical', help='Rebuild the lexical index from the collection')
+    index_parser.add_argument('--collection', default=DEFAULT_COLLECTION_NAME, help='Collection name')
+    
+    # Corpus statistics command
+    stats_parser = subparsers.add_parser('index-stats',
+                                         help='Recompute the corpus statistics used by re-ranking from the collection')
+    stats_parser.add_argument('--collection', default=DEFAULT_COLLECTION_NAME, help='Collection name')
+    
+    # Short vectors command
+    short_parser = subparsers.add_parser('index-short',
+                                         help='Rebuild the truncated vectors used by two-stage search from the collection')
+    short_parser.add_argument('--collection', default=DEFAULT_COLLECTION_NAME, help='Collection name')
+    
+    # ANN index command
+    ann_parser = subparsers.add_parser('index-ann', help='Train an IVF-PQ index for a local-backend collection')
+    ann_parser.add_argument('--collection', default=DEFAULT_COLLECTION_NAME, help='Collection name')
+    ann_parser.add_argument('--nlist', type=int, help='Number of IVF lists (default: 4 * sqrt(documents))')
+    ann_parser.add_argument('--subspaces', type=int, help='PQ code bytes per vector (default: dimensions / 8)')
     
     # Info command
     info_parser = subparsers.add_parser('info', help='Get information about collections')
@@ -40,8 +105,9 @@ def parse_args():
     
     return parser.parse_args()
 
-def add_document(file_path, collection_name, chunk_size):
-    """Process a document in tiny chunks to minimize memory usage."""
+def add_document(file_path, collection_name, chunk_size=CHUNK_SIZE, batch_size=INGEST_BATCH_SIZE,
+                 chunk_overlap=CHUNK_OVERLAP):
+    """Stream a document into the collection through a single ingestion session."""
     try:
         # Check if file exists
         if not os.path.exists(file_path):
@@ -50,159 +116,336 @@ def add_document(file_path, collection_name, chunk_size):
         
         file_size = os.path.getsize(file_path)
         print(f"Processing file: {file_path} ({file_size} bytes)")
-        print(f"Using chunk size: {chunk_size} characters")
-        
-        # Initialize counters
-        chunks_added = 0
-        current_position = 0
-        file_base = os.path.basename(file_path)
-        
-        # Process the file in small chunks
-        with open(file_path, 'r', encoding='utf-8') as file:
-            while True:
-                # Read a small chunk of text
-                text_chunk = file.read(chunk_size)
-                
-                # Exit loop if we've reached the end of the file
-                if not text_chunk:
-                    break
-                
-                # Create a unique ID for this chunk
-                chunk_id = f"{file_base}_{chunks_added}"
-                
-                # Process this chunk
-                success = add_chunk_to_database(text_chunk, chunk_id, file_path, chunks_added, collection_name)
-                
-                if success:
-                    chunks_added += 1
-                
-                # Update position
-                current_position += len(text_chunk)
-                
-                # Print progress
-                progress = (current_position / file_size) * 100
-                print(f"Progress: {progress:.1f}% - Added {chunks_added} chunks so far")
-                
-                # Force memory cleanup
-                text_chunk = None
-                gc.collect()
-                
-                # Small delay to allow memory to be fully released
-                time.sleep(0.1)
+        print(f"Using chunk size: {chunk_size} characters (overlap {chunk_overlap}), "
+              f"committing every {batch_size} chunks")
+        
+        # Open the client and collection once and stream sentence-aware chunks through it.
+        # Unchanged files and chunks are skipped using the collection's manifest.
+        with IngestionSession(collection_name, batch_size=batch_size) as session, \
+                open(file_path, 'r', encoding='utf-8') as file:
+            pruned = session.prune_missing_files()
+            if pruned:
+                print(f"Removed {pruned} chunks of files that no longer exist")
+            
+            def chunks_with_progress():
+                for chunk_index, text_chunk in enumerate(iter_chunks(file, chunk_size, chunk_overlap), 1):
+                    yield text_chunk
+                    # Print progress whenever a batch worth of chunks has been read
+                    if chunk_index % batch_size == 0:
+                        progress = min(100.0, (file.buffer.tell() / max(file_size, 1)) * 100)
+                        print(f"Progress: {progress:.1f}% - Added {session.chunks_added} chunks so far")
+            
+            summary = session.add_file(file_path, chunks_with_progress())
         
-        print(f"\nCompleted processing {file_path}")
-        print(f"Added {chunks_added} chunks to collection '{collection_name}'")
+        if summary["status"] == "unchanged":
+            print(f"\n{file_path} is unchanged since the last ingestion, nothing to do")
+            return 0
+        print(f"\nCompleted processing {file_path} ({summary['status']}): "
+              f"{summary['embedded']} chunks embedded, {summary['skipped']} unchanged, "
+              f"{summary['deleted']} removed")
+        print(f"Added {session.chunks_added} chunks to collection '{collection_name}': {session.stats}")
         return 0
         
     except Exception as e:
         print(f"Error processing document: {e}")
         return 1
 
-def add_chunk_to_database(text, chunk_id, source_file, chunk_index, collection_name):
-    """Add a single text chunk to the database."""
+def ingest_paths(paths, collection_name, pattern=INGEST_FILE_PATTERN, workers=INGEST_WORKERS,
+                 batch_size=INGEST_BATCH_SIZE, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Ingest many files, chunking them in a process pool and embedding them through one shared session."""
     try:
-        # Import here to minimize memory usage
-        from semantic_search.search import SemanticSearch
-        from semantic_search.utils import create_metadata
-        
-        # Create metadata
-        metadata = create_metadata(source_file, chunk_index, 0)
-        
-        # Initialize searcher
-        searcher = SemanticSearch(collection_name=collection_name)
+        files = collect_files(paths, pattern)
+        if not files:
+            print(f"No files matching '{pattern}' found.")
+            return 1
         
-        # Add the single chunk
-        searcher.add_documents([text], ids=[chunk_id], metadatas=[metadata])
+        print(f"Ingesting {len(files)} files with {workers} workers, committing every {batch_size} chunks")
         
-        # Explicitly delete objects to free memory
-        del searcher
+        counts = {"new": 0, "changed": 0, "unchanged": 0, "error": 0}
+        report_every = max(1, len(files) // 20)
+        with IngestionSession(collection_name, batch_size=batch_size) as session:
+            pruned = session.prune_missing_files()
+            if pruned:
+                print(f"Removed {pruned} chunks of files that no longer exist")
+            
+            for done, (file_path, summary) in enumerate(
+                    session.add_files(files, chunk_size, chunk_overlap, workers), 1):
+                counts[summary["status"]] += 1
+                if summary["status"] == "error":
+                    print(f"Error processing {file_path}: {summary['error']}")
+                if done % report_every == 0 or done == len(files):
+                    print(f"Progress: {done}/{len(files)} files - {session.chunks_added} chunks added, "
+                          f"{session.stats.chunks_per_second:.1f} chunks/s")
         
-        return True
+        print(f"\nCompleted: {counts['new']} new, {counts['changed']} changed, "
+              f"{counts['unchanged']} unchanged, {counts['error']} failed")
+        print(f"Added {session.chunks_added} chunks to collection '{collection_name}': {session.stats}")
+        return 0 if counts["error"] == 0 else 1
         
     except Exception as e:
-        print(f"Error adding chunk {chunk_id}: {e}")
-        return False
-    finally:
-        # Force garbage collection
-        gc.collect()
+        print(f"Error ingesting documents: {e}")
+        return 1
+
+# Parsed user profiles by path, with the modification time they were read at
+_profiles = {}
 
-def apply_reranking(results, query, rerank_method, diversity_factor=0.5, recency_weight=0.3, profile_path=None):
-    """Apply the specified re-ranking method to the search results."""
-    reranker = ReRanker()
+def load_profile(profile_path: str) -> Dict[str, float]:
+    """Read a user profile JSON file, reusing the parsed profile until the file changes."""
+    path = os.path.abspath(profile_path)
+    modified = os.stat(path).st_mtime_ns
+    cached = _profiles.get(path)
+    if cached is None or cached[0] != modified:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = _profiles[path] = (modified, json.load(f))
+    return cached[1]
+
+def apply_reranking(results, query, rerank_stages, diversity_factor=0.5, recency_weight=0.3, profile_path=None,
+                    stats=None):
+    """
+    Apply a chain of re-ranking stages to the search results, normalized by the collection's statistics.
     
-    if rerank_method == 'bm25':
-        print("Applying BM25 re-ranking...")
-        return reranker.bm25_rerank(query, results)
-        
-    elif rerank_method == 'diversity':
-        print(f"Applying diversity re-ranking (factor: {diversity_factor})...")
-        return reranker.diversity_rerank(results, diversity_factor)
-        
-    elif rerank_method == 'recency':
-        print(f"Applying recency re-ranking (weight: {recency_weight})...")
-        return reranker.recency_rerank(results, recency_weight)
-        
-    elif rerank_method == 'personalized':
-        if not profile_path:
-            print("Warning: Personalized re-ranking requires a profile file. Skipping re-ranking.")
-            return results
-            
+    `rerank_stages` is a list of stage names or a spec such as 'bm25,recency,diversity'.
+    """
+    stages = parse_stages(rerank_stages) if isinstance(rerank_stages, str) else list(rerank_stages)
+    user_profile = None
+    if 'personalized' in stages:
         try:
-            import json
-            with open(profile_path, 'r') as f:
-                user_profile = json.load(f)
-                
-            print(f"Applying personalized re-ranking with profile from {profile_path}...")
-            return reranker.personalized_rerank(results, user_profile)
+            if not profile_path:
+                raise ValueError("Personalized re-ranking requires a profile file")
+            user_profile = load_profile(profile_path)
+            print(f"Using the profile from {profile_path} for personalized re-ranking")
         except Exception as e:
-            print(f"Error loading user profile: {e}")
-            return results
+            print(f"Warning: Skipping personalized re-ranking: {e}")
+            stages = [stage for stage in stages if stage != 'personalized']
+    if not stages:
+        return results
     
-    return results
+    descriptions = {
+        'bm25': "BM25",
+        'diversity': f"diversity (factor: {diversity_factor})",
+        'recency': f"recency (weight: {recency_weight})",
+        'personalized': "personalized",
+    }
+    print(f"Applying {' -> '.join(descriptions[stage] for stage in stages)} re-ranking...")
+    pipeline = RerankPipeline(stages, diversity_factor, recency_weight, user_profile, stats)
+    return pipeline.rerank(query, results)
 
-def search_documents(query: str, collection_name: str, n_results: int, rerank_method=None, 
-                     diversity_factor=0.5, recency_weight=0.3, profile_path=None):
-    """Search for documents matching the query."""
+def rerank_stages(spec: str):
+    """argparse type of --rerank: a chain of stage names."""
     try:
-        searcher = SemanticSearch(collection_name=collection_name)
+        return parse_stages(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def search_documents(query: str, collection_name: str, n_results: int, rerank_stages=None, 
+                     diversity_factor=0.5, recency_weight=0.3, profile_path=None, mode='vector', nprobe=None,
+                     where=None, profile_timing=False):
+    """Search for documents matching the query; with profile_timing, report the latency of every stage."""
+    searcher = None
+    try:
+        if isinstance(rerank_stages, str):
+            rerank_stages = parse_stages(rerank_stages)
+        with tracer.span('cli.search', mode=mode, rerank=','.join(rerank_stages or [])):
+            with tracer.span('cli.open_collection'):
+                searcher = SemanticSearch(collection_name=collection_name)
+            if nprobe and searcher.backend == 'local':
+                searcher.collection.nprobe = nprobe
+            
+            # Check if collection has documents
+            count = searcher.get_collection_count()
+            if count == 0:
+                print(f"Collection '{collection_name}' is empty. Add documents before searching.")
+                return 1
+            
+            # Perform search
+            if mode == 'hybrid':
+                results = searcher.hybrid_search(query, n_results=n_results, where=where)
+            elif mode == 'lexical':
+                results = searcher.lexical_search(query, n_results=n_results, where=where)
+            else:
+                results = searcher.search(query, n_results=n_results,
+                                          include_embeddings='diversity' in (rerank_stages or ()), where=where)
+            
+            # Apply re-ranking if specified
+            if rerank_stages:
+                results = apply_reranking(
+                    results, query, rerank_stages, 
+                    diversity_factor, recency_weight, profile_path, searcher.corpus_stats
+                )
+            
+            # Format and display results
+            with tracer.span('cli.format'):
+                formatted_results = format_search_results(results, query)
+                print(formatted_results)
+            
+            return 0
         
-        # Check if collection has documents
-        count = searcher.get_collection_count()
-        if count == 0:
+    except Exception as e:
+        print(f"Error searching documents: {e}")
+        return 1
+    
+    finally:
+        if searcher is not None:
+            searcher.close()
+        if profile_timing:
+            print(f"\nTiming:\n{tracer.report()}", file=sys.stderr)
+
+def read_queries(file_path: str):
+    """Yield (id, query) pairs from a JSONL file of {"query": ..., "id": ...} objects or plain strings."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                yield line_number, record
+            else:
+                yield record.get('id', line_number), record['query']
+
+def search_batch(queries_path: str, collection_name: str, n_results: int, batch_size: int = SEARCH_BATCH_SIZE,
+                 output_path: str = None, where=None, profile_timing=False):
+    """
+    Search for every query in a JSONL file and write one JSON result per line, in input order.
+    
+    With profile_timing, the latency distribution of every stage is reported at the end.
+    """
+    searcher = None
+    try:
+        searcher = SemanticSearch(collection_name=collection_name)
+        if searcher.get_collection_count() == 0:
             print(f"Collection '{collection_name}' is empty. Add documents before searching.")
             return 1
         
-        # Perform search
-        results = searcher.search(query, n_results=n_results)
+        # Queries are streamed from the file; their IDs wait here until their results come back
+        query_ids = deque()
         
-        # Apply re-ranking if specified
-        if rerank_method:
-            results = apply_reranking(
-                results, query, rerank_method, 
-                diversity_factor, recency_weight, profile_path
-            )
+        def queries():
+            for query_id, query in read_queries(queries_path):
+                query_ids.append((query_id, query))
+                yield query
         
-        # Format and display results
-        formatted_results = format_search_results(results, query)
-        print(formatted_results)
+        stats = SearchStats()
+        reported = 0
+        output = open(output_path, 'w', encoding='utf-8') if output_path else sys.stdout
+        try:
+            for results in searcher.search_many(queries(), n_results, batch_size, stats=stats, where=where):
+                query_id, query = query_ids.popleft()
+                output.write(json.dumps({
+                    "id": query_id,
+                    "query": query,
+                    "results": [
+                        {"id": doc_id, "document": document, "metadata": metadata, "distance": distance}
+                        for doc_id, document, metadata, distance in zip(
+                            results['ids'][0], results['documents'][0],
+                            results['metadatas'][0], results['distances'][0])
+                    ]
+                }) + "\n")
+                
+                # Report each batch once its first result has been written
+                if len(stats.batches) > reported:
+                    reported = len(stats.batches)
+                    size, embed_seconds, query_seconds = stats.batches[-1]
+                    print(f"Batch {reported}: {size} queries, embedding {embed_seconds * 1000:.0f} ms, "
+                          f"query {query_seconds * 1000:.0f} ms", file=sys.stderr)
+        finally:
+            if output_path:
+                output.close()
         
+        print(f"Completed: {stats}", file=sys.stderr)
+        if profile_timing:
+            print(f"Timing:\n{tracer.report()}", file=sys.stderr)
         return 0
         
     except Exception as e:
-        print(f"Error searching documents: {e}")
+        print(f"Error searching documents: {e}", file=sys.stderr)
         return 1
+    
+    finally:
+        if searcher is not None:
+            searcher.close()
 
-def show_info(collection_name: str):
-    """Show information about the collection."""
+def index_lexical(collection_name: str):
+    """Rebuild the lexical index of a collection from its stored documents."""
     try:
-        searcher = SemanticSearch(collection_name=collection_name)
-        count = searcher.get_collection_count()
+        with SemanticSearch(collection_name=collection_name) as searcher:
+            indexed = searcher.rebuild_lexical_index()
+            print(f"Indexed {indexed} documents of collection '{collection_name}' for lexical search")
+            return 0
         
-        print(f"\nCollection: {collection_name}")
-        print(f"Number of documents: {count}")
-        print(f"Storage location: {searcher.db_client.get_settings().persist_directory}")
+    except Exception as e:
+        print(f"Error building lexical index: {e}")
+        return 1
+
+def index_stats(collection_name: str):
+    """Recompute the corpus statistics of a collection from its stored documents."""
+    try:
+        with SemanticSearch(collection_name=collection_name) as searcher:
+            counted = searcher.rebuild_corpus_stats()
+            print(f"Counted {counted} documents of collection '{collection_name}' for re-ranking statistics")
+            return 0
         
-        return 0
+    except Exception as e:
+        print(f"Error building corpus statistics: {e}")
+        return 1
+
+def index_short(collection_name: str):
+    """Rebuild the truncated (Matryoshka) vectors of a collection from its stored embeddings."""
+    try:
+        with SemanticSearch(collection_name=collection_name) as searcher:
+            if searcher.short_collection is None:
+                print("Short vectors are disabled; set SHORT_EMBEDDING_DIMENSIONS (e.g. 256) "
+                      "to enable two-stage search")
+                return 1
+            stored = searcher.rebuild_short_vectors()
+            print(f"Stored {stored} {searcher.short_dimensions}-d vectors of collection '{collection_name}' "
+                  f"for two-stage search")
+            return 0
+        
+    except Exception as e:
+        print(f"Error building short vectors: {e}")
+        return 1
+
+def index_ann(collection_name: str, nlist=None, subspaces=None):
+    """Train the IVF-PQ index of a local-backend collection."""
+    try:
+        with SemanticSearch(collection_name=collection_name) as searcher:
+            settings = searcher.build_ann_index(nlist=nlist, subspaces=subspaces)
+            print(f"Built IVF-PQ index of collection '{collection_name}': {settings['nlist']} lists, "
+                  f"{settings['subspaces']} bytes per vector")
+            return 0
+        
+    except Exception as e:
+        print(f"Error building ANN index: {e}")
+        return 1
+
+def show_info(collection_name: str):
+    """Show information about the collection."""
+    try:
+        with SemanticSearch(collection_name=collection_name) as searcher:
+            count = searcher.get_collection_count()
+            
+            print(f"\nCollection: {collection_name}")
+            print(f"Number of documents: {count}")
+            print(f"Storage location: {searcher.persist_directory} ({searcher.backend} backend)")
+            if searcher.lexical_index is not None:
+                indexed = searcher.lexical_index.num_live_documents
+                print(f"Lexical index: {indexed} documents in {len(searcher.lexical_index.segments)} segments")
+                if indexed != count:
+                    print("Run 'index-lexical' to rebuild the lexical index from the collection")
+            stats = searcher.corpus_stats
+            print(f"Corpus statistics: {stats.num_documents} documents, "
+                  f"average length {stats.avg_doc_length:.1f} tokens")
+            if stats.num_documents != count:
+                print("Run 'index-stats' to recompute the corpus statistics from the collection")
+            if searcher.short_collection is not None:
+                state = "enabled" if searcher.two_stage else "disabled until 'index-short' is run"
+                print(f"Two-stage search: {searcher.short_dimensions}-d first pass, {state}")
+            if searcher.backend == 'local' and searcher.collection.ann:
+                ann = searcher.collection.ann
+                print(f"ANN index: IVF-PQ, {ann['nlist']} lists, {ann['subspaces']} bytes per vector, "
+                      f"nprobe {searcher.collection.nprobe}")
+            
+            return 0
         
     except Exception as e:
         print(f"Error getting collection info: {e}")
@@ -213,14 +456,34 @@ def main():
     args = parse_args()
     
     if args.command == 'add':
-        return add_document(args.file, args.collection, 200)
+        return add_document(args.file, args.collection, CHUNK_SIZE, args.batch_size)
+    
+    elif args.command == 'ingest':
+        return ingest_paths(args.paths, args.collection, args.pattern, args.workers, args.batch_size)
     
     elif args.command == 'search':
         return search_documents(
             args.query, args.collection, args.results, 
-            args.rerank, args.diversity, args.recency, args.profile
+            args.rerank, args.diversity, args.recency, args.profile, args.mode, args.nprobe, args.where,
+            args.profile_timing
         )
     
+    elif args.command == 'search-batch':
+        return search_batch(args.queries, args.collection, args.results, args.batch_size, args.output, args.where,
+                            args.profile_timing)
+    
+    elif args.command == 'index-lexical':
+        return index_lexical(args.collection)
+    
+    elif args.command == 'index-stats':
+        return index_stats(args.collection)
+    
+    elif args.command == 'index-short':
+        return index_short(args.collection)
+    
+    elif args.command == 'index-ann':
+        return index_ann(args.collection, args.nlist, args.subspaces)
+    
     elif args.command == 'info':
         return show_info(args.collection)
     
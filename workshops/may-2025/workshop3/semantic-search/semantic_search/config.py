@@ -7,7 +7,35 @@ load_dotenv()
 
 # OpenAI API configurations
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Optional override, e.g. a local fake embeddings endpoint
 EMBEDDING_MODEL = "text-embedding-3-small"  # Default model
+EMBEDDING_DIMENSIONS = None  # Ask text-embedding-3 models for shortened vectors; None for the model's full size
+
+# Embedding request packing
+EMBEDDING_MAX_INPUTS_PER_REQUEST = 256  # Maximum number of chunks sent in one embeddings request (API limit is 2048)
+EMBEDDING_MAX_TOKENS_PER_REQUEST = 100000  # Token budget per embeddings request (API limit is 300k)
+
+# Embedding request concurrency and rate limits
+EMBEDDING_MAX_IN_FLIGHT = 4  # Number of embeddings requests kept in flight concurrently
+EMBEDDING_REQUESTS_PER_MINUTE = 3000  # Requests-per-minute budget (None to disable)
+EMBEDDING_TOKENS_PER_MINUTE = 1000000  # Tokens-per-minute budget (None to disable)
+EMBEDDING_MAX_RETRIES = 5  # Retries for 429/5xx responses, with jittered exponential backoff
+
+# Embedding cache configurations
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")  # Empty to disable
+EMBEDDING_CACHE_MAX_ENTRIES = 1000000  # Vectors kept on disk before least recently used ones are evicted
+EMBEDDING_CACHE_MEMORY_ENTRIES = 10000  # Vectors kept in the in-process LRU
+
+# Vector store configurations
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")  # "chroma", or "local" for the in-process engine
+LOCAL_VECTOR_DTYPE = "float32"  # Storage type of vectors searched by the local engine: float32 or int8
+LOCAL_QUANTIZED_RESCORE_COPY = False  # Also store a float32 copy of int8 vectors to rescore candidates exactly
+LOCAL_QUANTIZED_RESCORE_FACTOR = 4  # int8 candidates rescored from the float32 copy per requested result
+LOCAL_QUERY_BLOCK_ROWS = 65536  # Rows scored per matrix product by the local engine's exact search
+LOCAL_ANN_NPROBE = 16  # IVF lists scanned per query once a collection has an IVF-PQ index
+LOCAL_ANN_RESCORE_FACTOR = 50  # Candidates rescored exactly per requested result
+LOCAL_ANN_TRAINING_SAMPLE = 50000  # Vectors sampled to train the IVF-PQ quantizers
+LOCAL_FILTER_GATHER_FRACTION = 0.1  # Filters matching at most this share of a segment are scored row by row, exactly
 
 # ChromaDB configurations
 CHROMA_PERSIST_DIRECTORY = "./chroma_db"
@@ -17,7 +45,28 @@ SIMILARITY_METRIC = "cosine"  # Options: cosine, euclidean, dot_product
 # Document processing configurations
 CHUNK_SIZE = 200  # Reduced size of text chunks in characters (originally 1000)
 CHUNK_OVERLAP = 50  # Reduced overlap between chunks to maintain context (originally 200)
-MAX_CHUNKS_PER_BATCH = 3  # Maximum number of chunks to process in a single batch
+INGEST_BATCH_SIZE = 256  # Number of chunks buffered by an ingestion session before they are committed
+INGEST_WORKERS = os.cpu_count() or 1  # Processes reading and chunking files during directory ingestion
+INGEST_FILE_PATTERN = "*.txt"  # Files picked up when a directory is ingested
 
 # Search configurations
-DEFAULT_SEARCH_RESULTS = 5  # Default number of results to return
\ No newline at end of file
+DEFAULT_SEARCH_RESULTS = 5  # Default number of results to return
+SEARCH_BATCH_SIZE = 128  # Queries embedded and sent to ChromaDB together by search_many
+
+# Lexical (BM25) index and hybrid search configurations
+LEXICAL_INDEX_ENABLED = True  # Maintain a persistent inverted index next to each collection
+LEXICAL_MAX_SEGMENTS = 8  # Index segments kept before they are merged into one
+HYBRID_CANDIDATES = 50  # Candidates taken from each retriever before fusion
+RRF_K = 60  # Reciprocal rank fusion constant: score = sum of 1 / (RRF_K + rank)
+
+# Two-stage (Matryoshka) search configurations
+SHORT_EMBEDDING_DIMENSIONS = int(os.getenv("SHORT_EMBEDDING_DIMENSIONS", "0")) or None  # e.g. 256; None disables
+TWO_STAGE_CANDIDATES_PER_RESULT = 10  # Short-vector candidates rescored with full vectors per requested result
+
+# Re-ranking configurations
+PROFILE_MATCHER_CACHE_SIZE = 16  # Compiled user-profile keyword matchers kept for reuse across queries
+PROFILE_AUTOMATON_MIN_KEYWORDS = 64  # Smaller profiles are counted with str.count, faster than the automaton's scan
+
+# Tracing configurations
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")  # File that finished traces are appended to as OTLP/JSON lines
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "semantic-search")  # service.name of exported traces
\ No newline at end of file
@@ -0,0 +1,131 @@
+# Per-collection corpus statistics used to normalize re-ranking scores at corpus level
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from semantic_search.bm25 import tokenize
+from semantic_search.config import CHROMA_PERSIST_DIRECTORY
+from semantic_search.filters import parse_date
+from semantic_search.lexical_index import InvertedIndex
+
+# Metadata fields a chunk's date is read from, in order of preference
+TIMESTAMP_FIELDS = ('timestamp', 'date', 'modified')
+
+def chunk_timestamp(metadata: Optional[Dict[str, Any]]) -> Optional[float]:
+    """
+    Epoch seconds of a chunk: its numeric `timestamp`, else its `date` or
+    `modified` field as epoch seconds, a numeric string or an ISO 8601 date.
+    None if it has none.
+    """
+    for field in TIMESTAMP_FIELDS:
+        value = (metadata or {}).get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str):
+            parsed = parse_date(value)
+            if parsed is not None:
+                return parsed
+            try:
+                return float(value)
+            except ValueError:
+                continue
+    return None
+
+def with_timestamps(metadatas: Optional[Sequence[Optional[Dict[str, Any]]]]) -> Optional[List[Optional[Dict[str, Any]]]]:
+    """Copies of chunk metadatas with a numeric `timestamp` added wherever chunk_timestamp() finds a date."""
+    if metadatas is None:
+        return None
+    stamped = []
+    for metadata in metadatas:
+        timestamp = chunk_timestamp(metadata)
+        if timestamp is not None and not isinstance((metadata or {}).get('timestamp'), (int, float)):
+            metadata = dict(metadata or {}, timestamp=timestamp)
+        stamped.append(metadata)
+    return stamped
+
+def timestamps_of(metadatas: Sequence[Optional[Dict[str, Any]]]) -> np.ndarray:
+    """Epoch seconds of each chunk, NaN where it has no date."""
+    timestamps = [chunk_timestamp(metadata) for metadata in metadatas]
+    return np.array([np.nan if timestamp is None else timestamp for timestamp in timestamps], dtype=np.float64)
+
+class CorpusStats:
+    """
+    Collection-wide statistics for corpus-level score normalization in re-ranking.
+
+    Kept up to date by SemanticSearch.add_documents() and delete_documents()
+    and saved by persist() as corpus_stats_<collection>.json next to the
+    collection: the number of chunks and their total token length, and the
+    range of their timestamps (see chunk_timestamp). The date range only
+    widens as chunks come and go; rebuild it with
+    SemanticSearch.rebuild_corpus_stats(). Term document frequencies are
+    read from the collection's lexical index, which already stores them.
+    """
+
+    def __init__(self, path: str, lexical_index: Optional[InvertedIndex] = None):
+        """Open the statistics stored at `path`, or start empty ones."""
+        self.path = path
+        self.lexical_index = lexical_index
+        self.clear()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            self.num_documents = saved['documents']
+            self.total_length = saved['total_length']
+            self.timestamp_min = saved['timestamp_min']
+            self.timestamp_max = saved['timestamp_max']
+
+    @classmethod
+    def for_collection(cls, collection_name: str, persist_directory: str = CHROMA_PERSIST_DIRECTORY,
+                       lexical_index: Optional[InvertedIndex] = None) -> 'CorpusStats':
+        """Open the statistics of a collection."""
+        return cls(os.path.join(persist_directory, f"corpus_stats_{collection_name}.json"), lexical_index)
+
+    def clear(self):
+        self.num_documents = 0
+        self.total_length = 0
+        self.timestamp_min = self.timestamp_max = None
+
+    @property
+    def avg_doc_length(self) -> float:
+        return self.total_length / self.num_documents if self.num_documents else 0.0
+
+    def add(self, documents: Sequence[str], metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None):
+        """Count new chunks and widen the date range with their timestamps."""
+        self.num_documents += len(documents)
+        self.total_length += sum(len(tokenize(document or '')) for document in documents)
+        timestamps = timestamps_of(metadatas or [])
+        timestamps = timestamps[~np.isnan(timestamps)]
+        if len(timestamps):
+            low, high = float(timestamps.min()), float(timestamps.max())
+            self.timestamp_min = low if self.timestamp_min is None else min(self.timestamp_min, low)
+            self.timestamp_max = high if self.timestamp_max is None else max(self.timestamp_max, high)
+
+    def remove(self, documents: Sequence[str]):
+        """Uncount deleted or replaced chunks."""
+        self.num_documents = max(0, self.num_documents - len(documents))
+        self.total_length = max(0, self.total_length - sum(len(tokenize(document or '')) for document in documents))
+
+    @property
+    def has_document_frequencies(self) -> bool:
+        return self.lexical_index is not None and self.lexical_index.num_documents > 0
+
+    def idf(self, terms: Sequence[str]) -> np.ndarray:
+        """BM25 inverse document frequency of terms over the whole corpus (requires has_document_frequencies)."""
+        df = self.lexical_index.document_frequencies(terms)
+        num_documents = self.lexical_index.num_documents
+        return np.log((num_documents - df + 0.5) / (df + 0.5) + 1)
+
+    def recency(self, timestamps: np.ndarray) -> Optional[np.ndarray]:
+        """Timestamps scaled to [0, 1] over the corpus date range (1 for the newest); None without one."""
+        if self.timestamp_min is None or self.timestamp_max <= self.timestamp_min:
+            return None
+        return np.clip((timestamps - self.timestamp_min) / (self.timestamp_max - self.timestamp_min), 0, 1)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'documents': self.num_documents, 'total_length': self.total_length,
+                       'timestamp_min': self.timestamp_min, 'timestamp_max': self.timestamp_max}, f)
+        os.replace(self.path + '.tmp', self.path)
\ No newline at end of file
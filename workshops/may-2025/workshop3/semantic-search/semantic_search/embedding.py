@@ -1,39 +1,213 @@
 # Embedding handling module
+import time
 import openai
-from typing import List
+from typing import List, Iterator, Optional, Tuple, Union
 
-from semantic_search.config import OPENAI_API_KEY, EMBEDDING_MODEL
+from semantic_search.config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MAX_INPUTS_PER_REQUEST,
+    EMBEDDING_MAX_TOKENS_PER_REQUEST,
+    EMBEDDING_MAX_IN_FLIGHT,
+    EMBEDDING_CACHE_PATH
+)
+from semantic_search.cache import EmbeddingCache
+from semantic_search.executor import EmbeddingExecutor
+from semantic_search.utils import estimate_tokens
+
+# Full output size of the OpenAI embedding models
+MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+class EmbeddingStats:
+    """Throughput counters for an embedding run."""
+
+    def __init__(self):
+        """Start the clock for a new run."""
+        self.chunks = 0
+        self.cached = 0
+        self.failed_ids = []
+        self.requests = 0
+        self.tokens = 0
+        self.started_at = time.perf_counter()
+
+    def record(self, chunks: int, tokens: int, requests: int = 1, cached: int = 0):
+        """Record embedded chunks and the requests (if any) they needed."""
+        self.chunks += chunks
+        self.cached += cached
+        self.requests += requests
+        self.tokens += tokens
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the run started."""
+        return time.perf_counter() - self.started_at
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.chunks} chunks ({self.cached} cached) in {self.requests} requests over {self.elapsed:.2f}s "
+                f"({self.chunks_per_second:.1f} chunks/s, {self.requests_per_second:.1f} requests/s)")
 
 class EmbeddingGenerator:
     """Class to handle embedding generation from OpenAI API."""
-    
-    def __init__(self, api_key: str = None):
-        """Initialize the embedding generator."""
+
+    def __init__(self, api_key: str = None, model: str = None, base_url: str = None,
+                 max_in_flight: int = EMBEDDING_MAX_IN_FLIGHT, cache: Optional[EmbeddingCache] = None,
+                 use_cache: bool = True, dimensions: int = EMBEDDING_DIMENSIONS):
+        """
+        Initialize the embedding generator.
+        
+        Embeddings are looked up in `cache` (the shared cache at EMBEDDING_CACHE_PATH
+        by default) before calling the API. Pass use_cache=False to always call the API.
+        `dimensions` asks text-embedding-3 models for vectors of that size instead of
+        their full size.
+        """
         self.api_key = api_key or OPENAI_API_KEY
         if not self.api_key:
             raise ValueError("OpenAI API key is required. Set it in .env file or pass it directly.")
         
-        self.client = openai.OpenAI(api_key=self.api_key)
-        self.model = EMBEDDING_MODEL
+        # Retries are handled by the executor so that they respect the rate limits
+        self.client = openai.OpenAI(api_key=self.api_key, base_url=base_url or OPENAI_BASE_URL, max_retries=0)
+        self.model = model or EMBEDDING_MODEL
+        self.dimensions = dimensions
+        # Shortened vectors are cached apart from full ones
+        self._cache_model = f"{self.model}:{dimensions}" if dimensions else self.model
+        self.executor = EmbeddingExecutor(self._request, max_in_flight=max_in_flight)
+        
+        if cache is None and use_cache and EMBEDDING_CACHE_PATH:
+            cache = EmbeddingCache.shared(EMBEDDING_CACHE_PATH)
+        self.cache = cache if use_cache else None
     
-    def get_embedding(self, text: str) -> List[float]:
-        """Generate embedding for a single text."""
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        """Send a single embeddings request."""
+        options = {"dimensions": self.dimensions} if self.dimensions else {}
         response = self.client.embeddings.create(
-            input=text,
-            model=self.model
+            input=texts,
+            model=self.model,
+            **options
         )
-        return response.data[0].embedding
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    
+    def _lookup(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return cached embeddings for texts, with None for cache misses."""
+        if self.cache is None:
+            return [None] * len(texts)
+        return self.cache.get_many(self._cache_model, texts)
+    
+    def _store(self, texts: List[str], embeddings: List[List[float]]):
+        """Add freshly generated embeddings to the cache."""
+        if self.cache is not None and texts:
+            self.cache.put_many(self._cache_model, texts, embeddings)
+    
+    def get_embedding(self, text: str) -> List[float]:
+        """Generate embedding for a single text."""
+        return self.get_embeddings([text])[0]
     
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for multiple texts in batch."""
-        response = self.client.embeddings.create(
-            input=texts,
-            model=self.model
-        )
-        return [item.embedding for item in response.data]
+        embeddings = self._lookup(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fetched = self.executor.run([texts[i] for i in missing])
+            self._store([texts[i] for i in missing], fetched)
+            for i, embedding in zip(missing, fetched):
+                embeddings[i] = embedding
+        return embeddings
+    
+    def pack_batches(self, texts: List[str], max_inputs: int = None,
+                     max_tokens: int = None) -> Iterator[Tuple[int, int]]:
+        """
+        Pack consecutive texts into request-sized (start, end) ranges.
+
+        A range is closed when adding the next text would exceed either the input
+        count or the estimated token budget. A single text larger than the token
+        budget is sent on its own.
+        """
+        max_inputs = max_inputs or EMBEDDING_MAX_INPUTS_PER_REQUEST
+        max_tokens = max_tokens or EMBEDDING_MAX_TOKENS_PER_REQUEST
+
+        start = 0
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if i > start and (i - start >= max_inputs or batch_tokens + tokens > max_tokens):
+                yield start, i
+                start = i
+                batch_tokens = 0
+            batch_tokens += tokens
+
+        if start < len(texts):
+            yield start, len(texts)
+
+    def embed_batches(self, texts: List[str], max_inputs: int = None, max_tokens: int = None,
+                      stats: EmbeddingStats = None,
+                      return_exceptions: bool = False) -> Iterator[Tuple[int, int, Union[List[List[float]], Exception]]]:
+        """
+        Embed texts with token-budgeted requests running concurrently.
+        
+        Yields (start, end, embeddings) for each packed range in input order. With
+        return_exceptions=True a failed range yields its exception instead of raising.
+        """
+        cached = self._lookup(texts)
+        ranges = []
+        for start, end in self.pack_batches(texts, max_inputs, max_tokens):
+            missing = [i for i in range(start, end) if cached[i] is None]
+            ranges.append((start, end, missing))
+        
+        # Only cache misses are sent; fully cached ranges need no request at all
+        results = self.executor.imap(([texts[i] for i in missing] for _, _, missing in ranges if missing),
+                                     return_exceptions)
+        
+        for start, end, missing in ranges:
+            embeddings = cached[start:end]
+            if missing:
+                fetched = next(results)
+                if isinstance(fetched, Exception):
+                    yield start, end, fetched
+                    continue
+                self._store([texts[i] for i in missing], fetched)
+                for i, embedding in zip(missing, fetched):
+                    embeddings[i - start] = embedding
+            if stats is not None:
+                stats.record(end - start, sum(estimate_tokens(texts[i]) for i in missing),
+                             requests=1 if missing else 0, cached=end - start - len(missing))
+            yield start, end, embeddings
+    
+    def embed_documents(self, texts: List[str], max_inputs: int = None, max_tokens: int = None,
+                        stats: EmbeddingStats = None) -> List[List[float]]:
+        """Generate embeddings for any number of texts using token-budgeted multi-input requests."""
+        embeddings = []
+        for _, _, batch_embeddings in self.embed_batches(texts, max_inputs, max_tokens, stats):
+            embeddings.extend(batch_embeddings)
+        return embeddings
     
     def get_embedding_dimension(self) -> int:
-        """Get the dimension of the embeddings from the current model."""
-        # Generate a test embedding to find out the dimension
-        test_embedding = self.get_embedding("test")
-        return len(test_embedding)
\ No newline at end of file
+        """Get the dimension of the embeddings from the requested size or the model table, without an API call."""
+        if self.dimensions:
+            return self.dimensions
+        if self.model not in MODEL_DIMENSIONS:
+            raise ValueError(f"Unknown embedding dimension for model {self.model!r}; pass dimensions explicitly")
+        return MODEL_DIMENSIONS[self.model]
+    
+    def close(self):
+        """Stop the executor's worker threads and close the OpenAI client's connections."""
+        self.executor.shutdown()
+        self.client.close()
+    
+    def __enter__(self) -> 'EmbeddingGenerator':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
\ No newline at end of file
@@ -0,0 +1,166 @@
+# Concurrent embedding request execution with rate limiting and retries
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+import openai
+
+from semantic_search.config import (
+    EMBEDDING_MAX_IN_FLIGHT,
+    EMBEDDING_REQUESTS_PER_MINUTE,
+    EMBEDDING_TOKENS_PER_MINUTE,
+    EMBEDDING_MAX_RETRIES
+)
+from semantic_search.utils import estimate_tokens
+
+class RateLimiter:
+    """Token-bucket limiter enforcing requests-per-minute and tokens-per-minute budgets."""
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        """Initialize the limiter. A budget of None disables that limit."""
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute or 0)
+        self._token_allowance = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_allowance = min(self.requests_per_minute,
+                                          self._request_allowance + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._token_allowance = min(self.tokens_per_minute,
+                                        self._token_allowance + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int = 0):
+        """Block until one request of the given token size fits in both budgets."""
+        # A request larger than the whole budget would never fit; let it drain the bucket instead
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+
+        while True:
+            with self._lock:
+                self._refill()
+                wait = 0.0
+                if self.requests_per_minute and self._request_allowance < 1:
+                    wait = max(wait, (1 - self._request_allowance) * 60 / self.requests_per_minute)
+                if self.tokens_per_minute and self._token_allowance < tokens:
+                    wait = max(wait, (tokens - self._token_allowance) * 60 / self.tokens_per_minute)
+                if wait == 0:
+                    if self.requests_per_minute:
+                        self._request_allowance -= 1
+                    if self.tokens_per_minute:
+                        self._token_allowance -= tokens
+                    return
+            time.sleep(wait)
+
+def is_retryable(error: Exception) -> bool:
+    """Return True for rate-limit (429), server (5xx) and connection errors."""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(error, 'status_code', None)
+    return status is not None and (status == 429 or status >= 500)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Read the Retry-After header from an API error, if present."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+class EmbeddingExecutor:
+    """
+    Runs embedding requests on a thread pool with a bounded number in flight.
+
+    Every request goes through the shared RateLimiter and is retried on 429/5xx
+    responses with jittered exponential backoff. Results of imap() are yielded
+    in input order regardless of completion order.
+    """
+
+    def __init__(self, request_fn: Callable[[List[str]], Any], max_in_flight: int = EMBEDDING_MAX_IN_FLIGHT,
+                 requests_per_minute: Optional[int] = EMBEDDING_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: Optional[int] = EMBEDDING_TOKENS_PER_MINUTE,
+                 max_retries: int = EMBEDDING_MAX_RETRIES, base_delay: float = 0.5, max_delay: float = 30.0):
+        """
+        Initialize the executor.
+
+        Args:
+            request_fn: Function sending one embeddings request for a list of texts
+            max_in_flight: Maximum number of concurrent requests
+            requests_per_minute: Request budget (None for unlimited)
+            tokens_per_minute: Estimated token budget (None for unlimited)
+            max_retries: Retries per request on retryable errors
+            base_delay: Initial backoff delay in seconds
+            max_delay: Upper bound for a single backoff delay in seconds
+        """
+        self.request_fn = request_fn
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='embedding')
+
+    def run(self, texts: List[str]) -> Any:
+        """Send one request in the calling thread, with rate limiting and retries."""
+        tokens = sum(estimate_tokens(text) for text in texts)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(tokens)
+            try:
+                return self.request_fn(texts)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                attempt += 1
+                self.retries += 1
+                time.sleep(delay)
+
+    def imap(self, batches: Iterable[List[str]], return_exceptions: bool = False) -> Iterator[Any]:
+        """
+        Run one request per batch concurrently and yield results in input order.
+
+        With return_exceptions=True a failed batch yields its exception instead
+        of aborting the whole run.
+        """
+        pending = deque()
+        window = self.max_in_flight * 2
+        batches = iter(batches)
+
+        while True:
+            while len(pending) < window:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                pending.append(self._pool.submit(self.run, batch))
+
+            if not pending:
+                return
+
+            future = pending.popleft()
+            try:
+                yield future.result()
+            except Exception as e:
+                if not return_exceptions:
+                    for remaining in pending:
+                        remaining.cancel()
+                    raise
+                yield e
+
+    def shutdown(self):
+        """Stop the worker threads."""
+        self._pool.shutdown(wait=True)
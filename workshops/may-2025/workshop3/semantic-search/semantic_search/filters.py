@@ -0,0 +1,178 @@
+# Metadata filters: ChromaDB-style where clauses, and the per-segment index that evaluates them for the local engine
+import bisect
+import json
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+COMPARISONS = ('$eq', '$ne', '$gt', '$gte', '$lt', '$lte', '$in', '$nin')
+RANGES = ('$gt', '$gte', '$lt', '$lte')
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$')
+
+def parse_date(value: Any) -> Optional[float]:
+    """Seconds since the epoch of an ISO 8601 date or datetime (UTC unless it has an offset), or None."""
+    if not isinstance(value, str) or not ISO_DATE.match(value):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def normalize_where(where: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate a where clause and rewrite it in the form ChromaDB accepts.
+
+    A clause is {"field": value} or {"field": {"$op": value}} with $eq, $ne,
+    $gt, $gte, $lt, $lte, $in or $nin, combined with {"$and": [...]} and
+    {"$or": [...]}. A dict of several fields is their $and. Range bounds given
+    as ISO 8601 dates become seconds since the epoch, so dates stored as
+    timestamps (like the `modified` metadata of ingested files) can be
+    filtered by calendar date on either backend. $ne and $nin also match rows
+    without the field, as in ChromaDB. Raises ValueError for malformed clauses.
+    """
+    if not isinstance(where, dict) or not where:
+        raise ValueError(f"Expected a where clause to be a non-empty dict, got {where!r}")
+    if len(where) > 1:
+        return {'$and': [normalize_where({field: condition}) for field, condition in where.items()]}
+    (field, condition), = where.items()
+    if field in ('$and', '$or'):
+        if not isinstance(condition, list) or not condition:
+            raise ValueError(f"Expected {field} to be a non-empty list of where clauses, got {condition!r}")
+        clauses = [normalize_where(clause) for clause in condition]
+        return clauses[0] if len(clauses) == 1 else {field: clauses}
+    if field.startswith('$'):
+        raise ValueError(f"Unknown where operator {field!r}")
+    if not isinstance(condition, dict):
+        condition = {'$eq': condition}
+    if len(condition) != 1:
+        raise ValueError(f"Expected one operator for field {field!r}, got {condition!r}")
+    (operator, value), = condition.items()
+    if operator not in COMPARISONS:
+        raise ValueError(f"Unknown operator {operator!r} for field {field!r} (expected one of {', '.join(COMPARISONS)})")
+    if operator in RANGES:
+        epoch = parse_date(value)
+        value = epoch if epoch is not None else value
+        if not _is_number(value):
+            raise ValueError(f"Expected a number or an ISO 8601 date for {operator} on {field!r}, got {value!r}")
+    elif operator in ('$in', '$nin'):
+        if not isinstance(value, list) or not value:
+            raise ValueError(f"Expected a non-empty list for {operator} on {field!r}, got {value!r}")
+    return {field: {operator: value}}
+
+class FilterIndex:
+    """
+    Sorted-array index of a segment's metadata, evaluating where clauses into row bitmaps.
+
+    For every metadata field, the rows that have it are kept sorted by value
+    in two columns: numbers (ISO 8601 date strings are entered here too, as
+    epoch seconds), and every other value by its code in the field's sorted
+    vocabulary of JSON-encoded values. An equality, set or range condition is
+    then one binary search per value for a contiguous run of rows, so its cost
+    grows with the rows it matches rather than the segment; $and and $or
+    combine the resulting boolean masks. Saved next to the segment's arrays as
+    filters.json (field names and vocabularies) and filters.npz (columns).
+    """
+
+    def __init__(self, num_rows: int, fields: Dict[str, Dict[str, Any]]):
+        self.num_rows = num_rows
+        # field: {'numbers', 'number_rows', 'codes', 'code_rows', 'vocabulary'}
+        self.fields = fields
+
+    @classmethod
+    def build(cls, metadatas: Sequence[Optional[Dict[str, Any]]]) -> 'FilterIndex':
+        values: Dict[str, tuple] = {}
+        for row, metadata in enumerate(metadatas):
+            for field, value in (metadata or {}).items():
+                numbers, others = values.setdefault(field, ([], []))
+                if _is_number(value):
+                    numbers.append((float(value), row))
+                    continue
+                others.append((json.dumps(value), row))
+                epoch = parse_date(value)
+                if epoch is not None:
+                    numbers.append((epoch, row))
+        fields = {}
+        for field, (numbers, others) in values.items():
+            vocabulary = sorted({key for key, _ in others})
+            codes = {key: code for code, key in enumerate(vocabulary)}
+            number_values = np.array([number for number, _ in numbers], dtype=np.float64)
+            code_values = np.array([codes[key] for key, _ in others], dtype=np.int32)
+            number_order, code_order = np.argsort(number_values, kind='stable'), np.argsort(code_values, kind='stable')
+            fields[field] = {
+                'numbers': number_values[number_order],
+                'number_rows': np.array([row for _, row in numbers], dtype=np.int32)[number_order],
+                'codes': code_values[code_order],
+                'code_rows': np.array([row for _, row in others], dtype=np.int32)[code_order],
+                'vocabulary': vocabulary,
+            }
+        return cls(len(metadatas), fields)
+
+    @classmethod
+    def load(cls, directory: str) -> 'FilterIndex':
+        with open(os.path.join(directory, 'filters.json'), 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+        with np.load(os.path.join(directory, 'filters.npz')) as arrays:
+            fields = {field: {'vocabulary': vocabulary,
+                              **{key: arrays[f"{i}_{key}"] for key in ('numbers', 'number_rows', 'codes', 'code_rows')}}
+                      for i, (field, vocabulary) in enumerate(zip(schema['fields'], schema['vocabularies']))}
+        return cls(schema['num_rows'], fields)
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, 'filters.json'))
+
+    def save(self, directory: str):
+        # The columns are written before the schema that exists() looks for
+        np.savez(os.path.join(directory, 'filters.npz'),
+                 **{f"{i}_{key}": column[key] for i, column in enumerate(self.fields.values())
+                    for key in ('numbers', 'number_rows', 'codes', 'code_rows')})
+        with open(os.path.join(directory, 'filters.json'), 'w', encoding='utf-8') as f:
+            json.dump({'num_rows': self.num_rows, 'fields': list(self.fields),
+                       'vocabularies': [column['vocabulary'] for column in self.fields.values()]}, f)
+
+    def mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Boolean mask of the rows matching a clause in normalize_where() form."""
+        (field, condition), = where.items()
+        if field in ('$and', '$or'):
+            masks = [self.mask(clause) for clause in condition]
+            return np.logical_and.reduce(masks) if field == '$and' else np.logical_or.reduce(masks)
+        (operator, value), = condition.items()
+        mask = np.zeros(self.num_rows, dtype=bool)
+        column = self.fields.get(field)
+        if column is not None:
+            if operator in RANGES:
+                mask[self._range(column, operator, value)] = True
+            else:
+                for item in (value if operator in ('$in', '$nin') else [value]):
+                    mask[self._equal(column, item)] = True
+        return ~mask if operator in ('$ne', '$nin') else mask
+
+    @staticmethod
+    def _equal(column: Dict[str, Any], value: Any) -> np.ndarray:
+        """Rows whose value equals `value`."""
+        if _is_number(value):
+            numbers = column['numbers']
+            return column['number_rows'][np.searchsorted(numbers, value, 'left'):np.searchsorted(numbers, value, 'right')]
+        key = json.dumps(value)
+        code = bisect.bisect_left(column['vocabulary'], key)
+        if code >= len(column['vocabulary']) or column['vocabulary'][code] != key:
+            return column['code_rows'][:0]
+        codes = column['codes']
+        return column['code_rows'][np.searchsorted(codes, code, 'left'):np.searchsorted(codes, code, 'right')]
+
+    @staticmethod
+    def _range(column: Dict[str, Any], operator: str, bound: float) -> np.ndarray:
+        """Rows whose numeric value is within a one-sided range."""
+        numbers = column['numbers']
+        if operator in ('$gt', '$gte'):
+            return column['number_rows'][np.searchsorted(numbers, bound, 'right' if operator == '$gt' else 'left'):]
+        return column['number_rows'][:np.searchsorted(numbers, bound, 'left' if operator == '$lt' else 'right')]
\ No newline at end of file
@@ -0,0 +1,251 @@
+# Streaming ingestion into a single long-lived collection
+import glob
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from semantic_search.config import (
+    DEFAULT_COLLECTION_NAME,
+    INGEST_BATCH_SIZE,
+    INGEST_WORKERS,
+    INGEST_FILE_PATTERN,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP
+)
+from semantic_search.embedding import EmbeddingStats
+from semantic_search.manifest import IngestionManifest, chunk_digest, file_fingerprint
+from semantic_search.search import SemanticSearch
+from semantic_search.utils import chunk_text, create_metadata
+
+def chunk_id_prefix(file_path: str) -> str:
+    """Chunk ID prefix for a file: its name plus a short hash of its absolute path."""
+    path_hash = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:8]
+    return f"{os.path.basename(file_path)}_{path_hash}"
+
+def collect_files(paths: Iterable[str], pattern: str = INGEST_FILE_PATTERN) -> List[str]:
+    """
+    Expand files, directories (searched recursively for `pattern`) and glob
+    patterns into a sorted list of unique file paths.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            matches = glob.glob(os.path.join(glob.escape(path), '**', pattern), recursive=True)
+        elif os.path.isfile(path):
+            matches = [path]
+        else:
+            matches = glob.glob(path, recursive=True)
+        files.update(match for match in matches if os.path.isfile(match))
+    return sorted(files)
+
+def read_and_chunk(file_path: str, chunk_size: int = CHUNK_SIZE,
+                   chunk_overlap: int = CHUNK_OVERLAP) -> Tuple[str, Tuple[float, int], List[str]]:
+    """
+    Read a file once and return its SHA-256, the (mtime, size) it had when read, and its chunks.
+
+    Runs in the worker processes of IngestionSession.add_files().
+    """
+    with open(file_path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    return content_hash, (stat.st_mtime, stat.st_size), chunk_text(data.decode('utf-8'), chunk_size, chunk_overlap)
+
+class IngestionSession:
+    """
+    Streams chunks into one collection through a reusable SemanticSearch.
+
+    The OpenAI client, Chroma client and collection are opened once per session.
+    Chunks are buffered and committed (embedded and upserted) every `batch_size`
+    chunks and on close.
+
+    Files added with add_file() are ingested incrementally against the
+    collection's IngestionManifest: unchanged files are skipped, only new or
+    changed chunks are embedded, and chunks that disappeared are deleted.
+
+    Usage:
+        with IngestionSession("documents") as session:
+            session.prune_missing_files()
+            session.add_file("notes.txt", chunk_text(process_file("notes.txt")))
+    """
+
+    def __init__(self, collection_name: str = DEFAULT_COLLECTION_NAME, batch_size: int = INGEST_BATCH_SIZE,
+                 searcher: Optional[SemanticSearch] = None, incremental: bool = True):
+        """Open the collection (or reuse an existing searcher) and its manifest for the session."""
+        # A searcher opened here is closed with the session
+        self._owns_searcher = searcher is None
+        self.searcher = searcher or SemanticSearch(collection_name=collection_name)
+        self.batch_size = max(1, batch_size)
+        self.stats = EmbeddingStats()
+        self.chunks_added = 0
+        self.manifest = IngestionManifest.for_collection(
+            self.searcher.collection_name, self.searcher.persist_directory) if incremental else None
+        self._documents: List[str] = []
+        self._ids: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._chunk_files: List[Optional[str]] = []
+        self._pending_files: Dict[str, tuple] = {}
+        self._failed_files = set()
+
+    def add(self, text: str, chunk_id: str, metadata: Dict[str, Any], source_file: str = None):
+        """Buffer one chunk, committing the buffer once it reaches the batch size."""
+        self._documents.append(text)
+        self._ids.append(chunk_id)
+        self._metadatas.append(metadata)
+        self._chunk_files.append(source_file)
+        if len(self._documents) >= self.batch_size:
+            self.flush()
+
+    def add_file(self, file_path: str, chunks: Iterable[str], content_hash: str = None,
+                 file_stat: Tuple[float, int] = None) -> Dict[str, Any]:
+        """
+        Ingest the chunks of one file incrementally.
+
+        `content_hash` is the file's SHA-256 if the caller has already computed it,
+        and `file_stat` the (mtime, size) the file had when it was read for it;
+        both are recorded in the manifest once the file's chunks are written.
+        Returns a summary with the file's status ('new', 'changed' or 'unchanged')
+        and the number of chunks embedded, skipped and deleted.
+        """
+        summary = {"status": "new", "embedded": 0, "skipped": 0, "deleted": 0}
+        previous = {}
+
+        if self.manifest is not None:
+            entry = self.manifest.get(file_path)
+            if entry is not None and self.manifest.is_unchanged(file_path):
+                summary["status"] = "unchanged"
+                return summary
+            if content_hash is None:
+                content_hash, file_stat = file_fingerprint(file_path)
+            elif file_stat is None:
+                stat = os.stat(file_path)
+                file_stat = (stat.st_mtime, stat.st_size)
+            if entry is not None:
+                if content_hash == entry['sha256']:
+                    self.manifest.touch(file_path, file_stat)
+                    summary["status"] = "unchanged"
+                    return summary
+                summary["status"] = "changed"
+                previous = self.manifest.chunk_hashes(file_path)
+
+        prefix = chunk_id_prefix(file_path)
+        current = {}
+        for chunk_index, text in enumerate(chunks):
+            chunk_id = f"{prefix}_{chunk_index}"
+            current[chunk_id] = chunk_digest(text)
+            if previous.get(chunk_id) == current[chunk_id]:
+                summary["skipped"] += 1
+                continue
+            self.add(text, chunk_id, create_metadata(file_path, chunk_index, 0), source_file=file_path)
+            summary["embedded"] += 1
+
+        stale_ids = [chunk_id for chunk_id in previous if chunk_id not in current]
+        self.searcher.delete_documents(stale_ids)
+        summary["deleted"] = len(stale_ids)
+
+        if self.manifest is not None:
+            # Recorded once all of the file's chunks have been committed; other pending
+            # files may still have chunks in the buffer and wait for the next flush
+            self._pending_files[file_path] = (content_hash, file_stat, current)
+            if not any(source == file_path for source in self._chunk_files):
+                self._record_file(file_path)
+        return summary
+
+    def add_files(self, file_paths: List[str], chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                  workers: int = INGEST_WORKERS) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Ingest many files, reading and chunking them in a process pool.
+
+        Files whose mtime and size match the manifest are skipped without being
+        read. The rest are read and chunked by `workers` processes, a bounded
+        number of files ahead, while this process embeds and writes their chunks
+        in order through the session's shared batches.
+
+        Yields (file_path, summary) as each file is handed to the session. A file
+        that cannot be read yields a summary with status 'error'.
+        """
+        workers = max(1, workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            paths = iter(file_paths)
+            while True:
+                # Keep the workers busy without holding the chunks of the whole tree in memory
+                while len(pending) < workers * 4:
+                    file_path = next(paths, None)
+                    if file_path is None:
+                        break
+                    if self.manifest is not None and self.manifest.is_unchanged(file_path):
+                        pending.append((file_path, None))
+                    else:
+                        pending.append((file_path, pool.submit(read_and_chunk, file_path, chunk_size, chunk_overlap)))
+                if not pending:
+                    return
+
+                file_path, future = pending.popleft()
+                if future is None:
+                    yield file_path, {"status": "unchanged", "embedded": 0, "skipped": 0, "deleted": 0}
+                    continue
+                try:
+                    content_hash, file_stat, chunks = future.result()
+                except Exception as e:
+                    yield file_path, {"status": "error", "error": str(e), "embedded": 0, "skipped": 0, "deleted": 0}
+                    continue
+                yield file_path, self.add_file(file_path, chunks, content_hash=content_hash, file_stat=file_stat)
+
+    def prune_missing_files(self) -> int:
+        """Delete the chunks of previously ingested files that no longer exist. Returns the number of chunks deleted."""
+        if self.manifest is None:
+            return 0
+        deleted = 0
+        for file_path in self.manifest.missing_files():
+            chunk_ids = self.manifest.remove(file_path)
+            self.searcher.delete_documents(chunk_ids)
+            deleted += len(chunk_ids)
+        self.manifest.save()
+        return deleted
+
+    def flush(self):
+        """Embed and write all buffered chunks."""
+        if not self._documents:
+            return
+        batch_stats = self.searcher.add_documents(self._documents, ids=self._ids, metadatas=self._metadatas,
+                                                  upsert=True)
+        self.stats.record(batch_stats.chunks, batch_stats.tokens, batch_stats.requests, batch_stats.cached)
+        self.chunks_added += len(self._documents) - len(batch_stats.failed_ids)
+
+        failed_ids = set(batch_stats.failed_ids)
+        for chunk_id, source in zip(self._ids, self._chunk_files):
+            if chunk_id in failed_ids and source is not None:
+                self._failed_files.add(source)
+
+        self._documents, self._ids, self._metadatas, self._chunk_files = [], [], [], []
+        # The buffer is empty, so every pending file has had all of its chunks written
+        for file_path in list(self._pending_files):
+            self._record_file(file_path)
+
+    def _record_file(self, file_path: str):
+        """Record a fully committed file in the manifest; a file with failed chunks keeps its old entry."""
+        content_hash, file_stat, chunks = self._pending_files.pop(file_path)
+        if file_path in self._failed_files:
+            self._failed_files.discard(file_path)
+        else:
+            self.manifest.record(file_path, content_hash, chunks, file_stat)
+
+    def close(self):
+        """Commit any remaining chunks and save the manifest and the lexical index."""
+        try:
+            self.flush()
+            self.searcher.persist()
+            if self.manifest is not None:
+                self.manifest.save()
+        finally:
+            if self._owns_searcher:
+                self.searcher.close()
+
+    def __enter__(self) -> 'IngestionSession':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
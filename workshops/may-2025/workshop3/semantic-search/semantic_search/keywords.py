@@ -0,0 +1,122 @@
+# Aho-Corasick matching of weighted user-profile keywords for personalized re-ranking
+import hashlib
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from semantic_search.config import PROFILE_AUTOMATON_MIN_KEYWORDS, PROFILE_MATCHER_CACHE_SIZE
+
+def profile_hash(profile: Dict[str, float]) -> str:
+    """Digest of a user profile's keywords and weights, independent of their order."""
+    return hashlib.sha1(json.dumps(profile, sort_keys=True).encode('utf-8')).hexdigest()
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over the keywords of a user profile.
+
+    The keywords (lowercased; case variants of one keyword add up their
+    weights) are compiled once into a trie with failure links, so every
+    document is scanned in a single pass whatever the size of the profile,
+    instead of once per keyword. Occurrences are counted like str.count():
+    non-overlapping per keyword, leftmost first. Empty keywords are ignored.
+    Profiles of fewer than PROFILE_AUTOMATON_MIN_KEYWORDS keywords are
+    counted with str.count instead, whose C loop beats a Python scan there.
+
+    Matchers are compiled once per profile and shared through for_profile(),
+    which caches the most recently used ones by profile_hash().
+    """
+
+    _cache: 'OrderedDict[str, KeywordMatcher]' = OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, profile: Dict[str, float]):
+        weights: Dict[str, float] = {}
+        for keyword, weight in profile.items():
+            keyword = keyword.lower()
+            if keyword:
+                weights[keyword] = weights.get(keyword, 0.0) + float(weight)
+        self.keywords = list(weights)
+        self.weights = np.fromiter(weights.values(), dtype=np.float64, count=len(weights))
+        self._lengths = [len(keyword) for keyword in self.keywords]
+
+        # Trie of the keywords: state -> {character: next state}; outputs are the keywords ending at a state
+        self._goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for keyword_id, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(keyword_id)
+
+        # Failure links in breadth-first order: the longest proper suffix of a state that is also in the trie.
+        # Each state also reports the keywords of its failure state, which end at the same position.
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                outputs[next_state] = outputs[next_state] + outputs[self._fail[next_state]]
+        self._outputs = [tuple(output) for output in outputs]
+
+    @classmethod
+    def for_profile(cls, profile: Dict[str, float]) -> 'KeywordMatcher':
+        """The compiled matcher of a profile, reused while it stays among the most recently used ones."""
+        key = profile_hash(profile)
+        with cls._cache_lock:
+            matcher = cls._cache.get(key)
+            if matcher is not None:
+                cls._cache.move_to_end(key)
+                return matcher
+        matcher = cls(profile)
+        with cls._cache_lock:
+            cls._cache[key] = matcher
+            while len(cls._cache) > PROFILE_MATCHER_CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return matcher
+
+    def matches(self, text: str) -> List[int]:
+        """IDs of the keywords occurring in a lowercased text, once per counted occurrence."""
+        goto, fail, outputs, lengths = self._goto, self._fail, self._outputs, self._lengths
+        # Position from which each keyword's next occurrence counts, so occurrences do not overlap
+        next_start: Dict[int, int] = {}
+        found = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword_id in outputs[state]:
+                start = position - lengths[keyword_id] + 1
+                if start >= next_start.get(keyword_id, 0):
+                    found.append(keyword_id)
+                    next_start[keyword_id] = position + 1
+        return found
+
+    def scores(self, documents: Sequence[str]) -> np.ndarray:
+        """Sum of the weights of the keyword occurrences in each document."""
+        lowered = [document.lower() for document in documents]
+        if len(self.keywords) < PROFILE_AUTOMATON_MIN_KEYWORDS:
+            counts = np.array([[document.count(keyword) for keyword in self.keywords] for document in lowered],
+                              dtype=np.float64).reshape(len(documents), len(self.keywords))
+            return counts @ self.weights
+        rows, keyword_ids = [], []
+        for row, document in enumerate(lowered):
+            found = self.matches(document)
+            keyword_ids.extend(found)
+            rows.extend([row] * len(found))
+        return np.bincount(np.array(rows, dtype=np.int64), minlength=len(documents),
+                           weights=self.weights[np.array(keyword_ids, dtype=np.int64)])
\ No newline at end of file
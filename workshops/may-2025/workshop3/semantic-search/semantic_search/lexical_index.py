@@ -0,0 +1,360 @@
+# Persistent inverted index for BM25 retrieval over a whole collection
+import hashlib
+import json
+import os
+import shutil
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from semantic_search.bm25 import tokenize
+from semantic_search.config import CHROMA_PERSIST_DIRECTORY, LEXICAL_MAX_SEGMENTS
+
+def term_hash(term: str) -> int:
+    """64-bit hash identifying a term on disk."""
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def query_terms(query: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted unique term hashes of a query and how often each occurs in it."""
+    hashes = np.array([term_hash(term) for term in tokenize(query)], dtype=np.uint64)
+    return np.unique(hashes, return_counts=True)
+
+class IndexSegment:
+    """
+    Immutable slice of the index: the postings of a batch of documents.
+
+    Terms are identified by their 64-bit hash and kept sorted, so a term is
+    found with a binary search instead of a vocabulary lookup. For the term at
+    position t, postings[indptr[t]:indptr[t + 1]] are the segment-local
+    ordinals of the documents containing it (uint32) and tfs[...] how often it
+    occurs in each (uint16). Document IDs are stored as one UTF-8 blob with
+    offsets and only decoded for results. On disk each array is a .npy file,
+    memory-mapped when loaded; only the deletion bitmap is read into memory.
+    """
+
+    ARRAYS = ('term_hashes', 'indptr', 'postings', 'tfs', 'doc_lengths', 'id_blob', 'id_offsets')
+
+    def __init__(self, name: str, arrays: Dict[str, np.ndarray], deleted: Optional[np.ndarray] = None):
+        self.name = name
+        for key in self.ARRAYS:
+            setattr(self, key, arrays[key])
+        self.num_documents = len(self.doc_lengths)
+        self.deleted = deleted if deleted is not None else np.zeros(self.num_documents, dtype=bool)
+        self.saved = False
+        self._norms = None
+        self._norms_key = None
+
+    @classmethod
+    def build(cls, name: str, ids: Sequence[str], documents: Sequence[str]) -> 'IndexSegment':
+        """Tokenize a batch of documents into a new segment."""
+        tokenized = [tokenize(document) for document in documents]
+        lengths = np.fromiter(map(len, tokenized), dtype=np.int64, count=len(documents))
+        tokens = list(chain.from_iterable(tokenized))
+        vocabulary = {term: i for i, term in enumerate(dict.fromkeys(tokens))}
+        terms = np.fromiter(map(vocabulary.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+        docs = np.repeat(np.arange(len(documents), dtype=np.int64), lengths)
+        hashes = np.fromiter(map(term_hash, vocabulary), dtype=np.uint64, count=len(vocabulary))
+        return cls(name, cls._pack(hashes[terms], docs, np.ones(len(docs), dtype=np.int64), lengths, ids))
+
+    @staticmethod
+    def _pack(hashes: np.ndarray, docs: np.ndarray, tfs: np.ndarray, lengths: np.ndarray,
+              ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Arrays of a segment from (term hash, document, term frequency) triples, summing repeated pairs."""
+        order = np.lexsort((docs, hashes))
+        hashes, docs, tfs = hashes[order], docs[order], tfs[order]
+        if len(hashes):
+            starts = np.flatnonzero(np.r_[True, (hashes[1:] != hashes[:-1]) | (docs[1:] != docs[:-1])])
+            tfs = np.add.reduceat(tfs, starts)
+            hashes, docs = hashes[starts], docs[starts]
+        term_hashes, term_starts = np.unique(hashes, return_index=True)
+
+        encoded = [doc_id.encode('utf-8') for doc_id in ids]
+        id_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(doc_id) for doc_id in encoded], out=id_offsets[1:])
+        return {
+            'term_hashes': term_hashes,
+            'indptr': np.append(term_starts, len(hashes)).astype(np.int64),
+            'postings': docs.astype(np.uint32),
+            'tfs': np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16),
+            'doc_lengths': np.asarray(lengths, dtype=np.uint32),
+            'id_blob': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'id_offsets': id_offsets,
+        }
+
+    @classmethod
+    def merge(cls, name: str, segments: Sequence['IndexSegment']) -> 'IndexSegment':
+        """Merge segments into one, dropping deleted documents, without re-tokenizing."""
+        hashes, docs, tfs, lengths, ids = [], [], [], [], []
+        base = 0
+        for segment in segments:
+            live = ~segment.deleted
+            # New ordinals of the segment's live documents
+            ordinals = np.cumsum(live) - 1 + base
+            posting_hashes = np.repeat(segment.term_hashes, np.diff(segment.indptr))
+            posting_docs = np.asarray(segment.postings, dtype=np.int64)
+            keep = live[posting_docs]
+            hashes.append(posting_hashes[keep])
+            docs.append(ordinals[posting_docs[keep]])
+            tfs.append(np.asarray(segment.tfs, dtype=np.int64)[keep])
+            lengths.append(np.asarray(segment.doc_lengths)[live])
+            ids.extend(doc_id for doc_id, is_live in zip(segment.doc_ids(), live) if is_live)
+            base += int(live.sum())
+        return cls(name, cls._pack(np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64),
+                                   np.concatenate(docs) if docs else np.zeros(0, dtype=np.int64),
+                                   np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.int64),
+                                   np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64), ids))
+
+    @classmethod
+    def load(cls, directory: str, name: str) -> 'IndexSegment':
+        """Open a saved segment, memory-mapping its arrays."""
+        path = os.path.join(directory, name)
+        arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode='r') for key in cls.ARRAYS}
+        num_documents = len(arrays['doc_lengths'])
+        deleted = np.unpackbits(np.load(os.path.join(path, 'deleted.npy')), count=num_documents).astype(bool)
+        segment = cls(name, arrays, deleted)
+        segment.saved = True
+        return segment
+
+    def save(self, directory: str):
+        """Write the segment's arrays (once) and its deletion bitmap."""
+        path = os.path.join(directory, self.name)
+        if not self.saved:
+            os.makedirs(path, exist_ok=True)
+            for key in self.ARRAYS:
+                np.save(os.path.join(path, f"{key}.npy"), getattr(self, key))
+            self.saved = True
+        np.save(os.path.join(path, 'deleted.npy'), np.packbits(self.deleted))
+
+    def doc_id(self, ordinal: int) -> str:
+        return bytes(self.id_blob[self.id_offsets[ordinal]:self.id_offsets[ordinal + 1]]).decode('utf-8')
+
+    def doc_ids(self) -> List[str]:
+        blob = bytes(self.id_blob)
+        offsets = self.id_offsets.tolist()
+        return [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self.num_documents)]
+
+    def term_ranges(self, hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Start and end of each term's postings; empty ranges for terms not in the segment."""
+        if not len(self.term_hashes):
+            return np.zeros(len(hashes), dtype=np.int64), np.zeros(len(hashes), dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.term_hashes, hashes), len(self.term_hashes) - 1)
+        found = self.term_hashes[positions] == hashes
+        starts = np.where(found, self.indptr[positions], 0)
+        ends = np.where(found, self.indptr[positions + 1], 0)
+        return starts, ends
+
+    def _length_norms(self, avg_doc_length: float, k1: float, b: float) -> np.ndarray:
+        """BM25 length normalization k1 * (1 - b + b * length / avg_doc_length) of every document, cached."""
+        key = (avg_doc_length, k1, b)
+        if self._norms_key != key:
+            self._norms = (k1 * (1 - b + b * np.asarray(self.doc_lengths, dtype=np.float32)
+                                 / np.float32(avg_doc_length))).astype(np.float32)
+            self._norms_key = key
+        return self._norms
+
+    def top_documents(self, starts: np.ndarray, ends: np.ndarray, weights: np.ndarray, avg_doc_length: float,
+                      n_results: int, k1: float, b: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The `n_results` best live documents of the segment by BM25.
+
+        Takes the query terms' postings ranges and IDF weights; returns the
+        ordinals and scores of matching documents, in no particular order.
+        """
+        norms = self._length_norms(avg_doc_length, k1, b)
+        docs, contributions = [], []
+        for start, end, weight in zip(starts, ends, weights):
+            if end == start:
+                continue
+            # Each term's postings are contiguous, so they are read as slices of the mapped arrays
+            term_docs = self.postings[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            docs.append(term_docs)
+            contributions.append(np.float32(weight * (k1 + 1)) * tf / (tf + norms[term_docs]))
+        docs, contributions = np.concatenate(docs), np.concatenate(contributions)
+
+        if len(docs) * 8 < self.num_documents:
+            # Few postings: sum per matching document instead of over the whole segment
+            docs, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=contributions)
+            live = ~self.deleted[docs]
+            docs, scores = docs[live], scores[live]
+        else:
+            scores = np.bincount(docs, weights=contributions, minlength=self.num_documents)
+            if self.deleted.any():
+                scores[self.deleted] = 0
+            docs = np.arange(self.num_documents)
+
+        if len(docs) > n_results:
+            top = np.argpartition(-scores, n_results - 1)[:n_results]
+            docs, scores = docs[top], scores[top]
+        matching = scores > 0
+        return docs[matching], scores[matching]
+        return scores
+
+class InvertedIndex:
+    """
+    Persistent BM25 index over all chunks of a collection.
+
+    Documents are added in batches, each becoming an immutable segment; an
+    added ID that already exists replaces the old document, which is marked
+    deleted in its segment. Segments are merged into one when there are more
+    than `max_segments` of them or a quarter of the documents are deleted.
+    IDF and the average document length are computed over the whole corpus
+    (deleted documents count until the next merge, as in Lucene).
+
+    The index lives in a directory next to the Chroma data; save() writes new
+    segments and deletion bitmaps, then atomically replaces index.json, which
+    lists the live segments.
+    """
+
+    def __init__(self, directory: str, max_segments: int = LEXICAL_MAX_SEGMENTS):
+        """Open the index stored in `directory`, or start an empty one."""
+        self.directory = directory
+        self.max_segments = max(1, max_segments)
+        self.segments: List[IndexSegment] = []
+        self._next_segment = 0
+        self._locations: Optional[Dict[str, Tuple[IndexSegment, int]]] = None
+        self._dirty = False
+        manifest_path = os.path.join(directory, 'index.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.segments = [IndexSegment.load(directory, name) for name in manifest['segments']]
+            self._next_segment = manifest['next_segment']
+
+    @classmethod
+    def for_collection(cls, collection_name: str,
+                       persist_directory: str = CHROMA_PERSIST_DIRECTORY) -> 'InvertedIndex':
+        """Open the index belonging to a collection."""
+        return cls(os.path.join(persist_directory, f"lexical_{collection_name}"))
+
+    @property
+    def num_documents(self) -> int:
+        """Documents counted by IDF, including deleted ones not merged away yet."""
+        return sum(segment.num_documents for segment in self.segments)
+
+    @property
+    def num_live_documents(self) -> int:
+        return sum(segment.num_documents - int(segment.deleted.sum()) for segment in self.segments)
+
+    @property
+    def avg_doc_length(self) -> float:
+        total = sum(float(np.sum(segment.doc_lengths, dtype=np.float64)) for segment in self.segments)
+        return total / self.num_documents if self.num_documents else 0.0
+
+    def _segment_name(self) -> str:
+        self._next_segment += 1
+        return f"segment_{self._next_segment:06d}"
+
+    def _location_map(self) -> Dict[str, Tuple[IndexSegment, int]]:
+        """Live ID -> (segment, ordinal), built on the first write."""
+        if self._locations is None:
+            self._locations = {}
+            for segment in self.segments:
+                for ordinal, doc_id in enumerate(segment.doc_ids()):
+                    if not segment.deleted[ordinal]:
+                        self._locations[doc_id] = (segment, ordinal)
+        return self._locations
+
+    def add(self, ids: Sequence[str], documents: Sequence[str], replace: bool = True):
+        """
+        Index a batch of documents.
+
+        With replace=False, IDs that are already indexed keep their old document.
+        """
+        locations = self._location_map()
+        batch = {}
+        for doc_id, document in zip(ids, documents):
+            if doc_id in locations and not replace:
+                continue
+            batch[doc_id] = document  # The last duplicate in a batch wins
+        if not batch:
+            return
+        self.delete(list(batch))
+        segment = IndexSegment.build(self._segment_name(), list(batch), list(batch.values()))
+        self.segments.append(segment)
+        for ordinal, doc_id in enumerate(batch):
+            locations[doc_id] = (segment, ordinal)
+        self._dirty = True
+
+    def delete(self, ids: Iterable[str]):
+        """Mark documents as deleted."""
+        locations = self._location_map()
+        for doc_id in ids:
+            location = locations.pop(doc_id, None)
+            if location is not None:
+                segment, ordinal = location
+                segment.deleted[ordinal] = True
+                self._dirty = True
+
+    def clear(self):
+        """Drop every document."""
+        self.segments = []
+        self._locations = {}
+        self._dirty = True
+
+    def search(self, query: str, n_results: int, k1: float = 1.5, b: float = 0.75) -> Tuple[List[str], np.ndarray]:
+        """
+        The `n_results` best documents for a query by BM25 over the whole corpus.
+
+        Returns their IDs and scores, best first; documents matching no query term are left out.
+        """
+        hashes, multiplicity = query_terms(query)
+        if not len(hashes) or not self.segments or n_results <= 0:
+            return [], np.zeros(0)
+
+        ranges = [segment.term_ranges(hashes) for segment in self.segments]
+        df = sum(ends - starts for starts, ends in ranges)
+        num_documents = self.num_documents
+        weights = np.log((num_documents - df + 0.5) / (df + 0.5) + 1) * multiplicity
+        avg_doc_length = self.avg_doc_length or 1.0
+
+        # Top documents of each segment, then the best of those
+        candidates = []
+        for segment, (starts, ends) in zip(self.segments, ranges):
+            if not (ends - starts).any():
+                continue
+            docs, scores = segment.top_documents(starts, ends, weights, avg_doc_length, n_results, k1, b)
+            candidates.extend((float(score), segment, int(doc)) for score, doc in zip(scores, docs))
+        candidates.sort(key=lambda candidate: -candidate[0])
+        best = candidates[:n_results]
+        return [segment.doc_id(ordinal) for _, segment, ordinal in best], np.array([score for score, _, _ in best])
+
+    def document_frequency(self, term: str) -> int:
+        """Number of indexed documents containing a term."""
+        return int(self.document_frequencies([term])[0])
+
+    def document_frequencies(self, terms: Sequence[str]) -> np.ndarray:
+        """Number of indexed documents containing each term, in one lookup per segment."""
+        hashes = np.array([term_hash(term) for term in terms], dtype=np.uint64)
+        df = np.zeros(len(hashes), dtype=np.int64)
+        for segment in self.segments:
+            starts, ends = segment.term_ranges(hashes)
+            df += ends - starts
+        return df
+
+    def save(self):
+        """Persist new segments and deletions, merging segments first if needed."""
+        if not self._dirty:
+            return
+        num_deleted = self.num_documents - self.num_live_documents
+        if len(self.segments) > self.max_segments or num_deleted * 4 > self.num_documents:
+            self.segments = [IndexSegment.merge(self._segment_name(), self.segments)] if self.num_live_documents else []
+            self._locations = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        for segment in self.segments:
+            segment.save(self.directory)
+        manifest_path = os.path.join(self.directory, 'index.json')
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'segments': [segment.name for segment in self.segments],
+                       'next_segment': self._next_segment}, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+        # Segments no longer listed were merged away
+        live = {segment.name for segment in self.segments}
+        for name in os.listdir(self.directory):
+            if name.startswith('segment_') and name not in live:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        self._dirty = False
\ No newline at end of file
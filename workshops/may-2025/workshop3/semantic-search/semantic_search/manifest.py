@@ -0,0 +1,111 @@
+# Ingestion manifest for incremental re-ingestion
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from semantic_search.config import CHROMA_PERSIST_DIRECTORY
+
+def file_fingerprint(file_path: str) -> Tuple[str, Tuple[float, int]]:
+    """
+    SHA-256 of a file's contents, read in blocks, and the (mtime, size) it had when opened.
+
+    The stat is taken from the open file before reading, so an edit made while
+    or after the file is read changes the mtime and is caught by the next run.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest(), (stat.st_mtime, stat.st_size)
+
+def chunk_digest(text: str) -> str:
+    """Short content hash of a chunk."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+class IngestionManifest:
+    """
+    Record of the files ingested into a collection.
+
+    For every file the manifest keeps its mtime, size and content hash, plus the
+    content hash of each chunk by chunk ID. Re-ingestion uses it to skip files
+    that did not change, embed only new or changed chunks, and delete chunks
+    that no longer exist. It is stored as JSON inside the Chroma directory.
+    """
+
+    def __init__(self, path: str):
+        """Load the manifest at `path`, or start an empty one."""
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f).get('files', {})
+
+    @classmethod
+    def for_collection(cls, collection_name: str,
+                       persist_directory: str = CHROMA_PERSIST_DIRECTORY) -> 'IngestionManifest':
+        """Open the manifest belonging to a collection."""
+        return cls(os.path.join(persist_directory, f"manifest_{collection_name}.json"))
+
+    @staticmethod
+    def key(file_path: str) -> str:
+        return os.path.abspath(file_path)
+
+    def get(self, file_path: str) -> Optional[Dict]:
+        """Recorded entry for a file, if any."""
+        return self.files.get(self.key(file_path))
+
+    def is_unchanged(self, file_path: str) -> bool:
+        """True if the file's mtime and size match the recorded ones."""
+        entry = self.get(file_path)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        return entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size
+
+    def chunk_hashes(self, file_path: str) -> Dict[str, str]:
+        """Recorded chunk ID -> chunk hash mapping for a file."""
+        entry = self.get(file_path)
+        return dict(entry['chunks']) if entry else {}
+
+    def record(self, file_path: str, content_hash: str, chunks: Dict[str, str], file_stat: Tuple[float, int]):
+        """
+        Record a file as fully ingested with the given chunks.
+
+        `file_stat` is the (mtime, size) the file had when it was read to
+        produce `content_hash`, not when it is recorded, so an edit made in
+        between is not mistaken for the ingested content.
+        """
+        mtime, size = file_stat
+        self.files[self.key(file_path)] = {
+            'mtime': mtime,
+            'size': size,
+            'sha256': content_hash,
+            'chunks': chunks
+        }
+
+    def touch(self, file_path: str, file_stat: Tuple[float, int]):
+        """Refresh the recorded mtime and size of a file whose content did not change."""
+        entry = self.get(file_path)
+        entry['mtime'], entry['size'] = file_stat
+
+    def remove(self, file_path: str) -> List[str]:
+        """Forget a file and return the chunk IDs it had."""
+        entry = self.files.pop(self.key(file_path), None)
+        return list(entry['chunks']) if entry else []
+
+    def missing_files(self) -> List[str]:
+        """Recorded files that no longer exist on disk."""
+        return [path for path in self.files if not os.path.exists(path)]
+
+    def save(self):
+        """Write the manifest atomically."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files}, f)
+        os.replace(tmp_path, self.path)
@@ -1,98 +1,98 @@
 # Re-ranking module for semantic search application
-from typing import List, Dict, Any
+import re
+from typing import Any, Callable, Dict, List, Sequence, Union
 import numpy as np
-from statistics import mean
+
+from semantic_search.bm25 import BM25Index, tokenize
+from semantic_search.corpus_stats import CorpusStats, timestamps_of
+from semantic_search.keywords import KeywordMatcher
+from semantic_search.results import ResultSet
+from semantic_search.tracing import tracer
+
+# Stages of a re-ranking pipeline
+RERANK_STAGES = ('bm25', 'diversity', 'recency', 'personalized')
+
+# Length normalization of personalization scores against the corpus average, as BM25's b
+PERSONALIZATION_LENGTH_NORMALIZATION = 0.75
 
 class ReRanker:
-    """Class for re-ranking search results using various techniques."""
+    """
+    Class for re-ranking search results using various techniques.
+    
+    Each technique is a stage over a ResultSet that computes new scores or a
+    new order of its rows (bm25_stage, diversity_stage, recency_stage and
+    personalized_stage), and RerankPipeline chains them. The *_rerank methods
+    apply a single stage to a ChromaDB-style result dict.
+    """
     
     def __init__(self):
         """Initialize the re-ranker."""
-        pass
+        self._bm25_documents = None
+        self._bm25_cached_index = None
+    
+    def _bm25_index(self, documents: List[str]) -> BM25Index:
+        """Return the BM25 index of a candidate set, reusing the last one if the documents are the same."""
+        if self._bm25_documents != documents:
+            self._bm25_cached_index = BM25Index(documents)
+            self._bm25_documents = list(documents)
+        return self._bm25_cached_index
     
-    def bm25_rerank(self, query: str, results: Dict[str, Any], k1: float = 1.5, b: float = 0.75) -> Dict[str, Any]:
+    def _apply(self, results: Dict[str, Any], stage: Callable[..., ResultSet], *args, **kwargs) -> Dict[str, Any]:
+        """Run one stage over the first query of a result dict; results without documents pass through."""
+        if not results or 'documents' not in results or not results['documents'][0]:
+            return results
+        result_set = ResultSet.from_results(results)
+        reranked = stage(result_set, *args, **kwargs)
+        return results if reranked is result_set else reranked.to_results()
+    
+    def bm25_rerank(self, query: str, results: Dict[str, Any], k1: float = 1.5, b: float = 0.75,
+                    stats: CorpusStats = None) -> Dict[str, Any]:
         """
         Re-rank results using BM25 scoring (a classic lexical ranking algorithm).
         
+        Without corpus statistics, term weights and document lengths are relative
+        to the candidates; with them, to the whole collection.
+        
         Args:
             query: The search query
             results: The original search results
             k1: BM25 parameter for term frequency saturation
             b: BM25 parameter for document length normalization
+            stats: Statistics of the searched collection (SemanticSearch.corpus_stats)
         
         Returns:
             Re-ranked search results
         """
-        if not results or 'documents' not in results or not results['documents'][0]:
-            return results
-        
-        # Extract documents and their original scores
-        documents = results['documents'][0]
-        original_scores = [1 - dist for dist in results['distances'][0]]  # Convert distances to scores
-        metadatas = results['metadatas'][0]
-        
-        # Process the query (simple tokenization)
-        query_terms = query.lower().split()
-        
-        # Calculate document lengths and average document length
-        doc_lengths = [len(doc.split()) for doc in documents]
-        avg_doc_length = mean(doc_lengths)
-        
-        # Calculate corpus-wide term frequencies (simple approach)
-        term_doc_counts = {}
-        for term in query_terms:
-            term_doc_counts[term] = sum(1 for doc in documents if term.lower() in doc.lower())
-        
-        # Calculate BM25 scores
-        bm25_scores = []
-        
-        for i, doc in enumerate(documents):
-            doc_terms = doc.lower().split()
-            doc_length = doc_lengths[i]
-            
-            score = 0
-            for term in query_terms:
-                if term_doc_counts[term] == 0:
-                    continue
-                    
-                # Calculate term frequency in this document
-                tf = doc.lower().count(term.lower())
-                
-                # Inverse document frequency
-                idf = np.log((len(documents) - term_doc_counts[term] + 0.5) / 
-                            (term_doc_counts[term] + 0.5) + 1)
-                
-                # BM25 term score
-                term_score = idf * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_length / avg_doc_length))
-                
-                score += term_score
-                
-            bm25_scores.append(score)
+        return self._apply(results, self.bm25_stage, query, k1, b, stats)
+    
+    def bm25_stage(self, result_set: ResultSet, query: str, k1: float = 1.5, b: float = 0.75,
+                   stats: CorpusStats = None) -> ResultSet:
+        """BM25 re-ranking of a ResultSet (see bm25_rerank)."""
+        documents = result_set.documents
+        
+        # Tokenize the candidates once and score all query terms against them together
+        if stats is not None and stats.num_documents:
+            idf = stats.idf if stats.has_document_frequencies else None
+            bm25_scores = self._bm25_index(documents).score(query, k1, b, idf=idf, avg_doc_length=stats.avg_doc_length)
+        else:
+            bm25_scores = self._bm25_index(documents).score(query, k1, b)
         
         # Combine BM25 scores with original semantic scores (50/50 weight)
         # Normalize scores first
-        if max(bm25_scores) > 0:
-            bm25_scores = [score / max(bm25_scores) for score in bm25_scores]
+        max_score = bm25_scores.max()
+        if max_score > 0:
+            bm25_scores = bm25_scores / max_score
         
-        combined_scores = [0.5 * bm25 + 0.5 * semantic 
-                          for bm25, semantic in zip(bm25_scores, original_scores)]
-        
-        # Re-sort the results based on the combined scores
-        sorted_indices = sorted(range(len(combined_scores)), key=lambda i: combined_scores[i], reverse=True)
-        
-        # Create re-ranked results
-        reranked_results = {
-            'documents': [[documents[i] for i in sorted_indices]],
-            'metadatas': [[metadatas[i] for i in sorted_indices]],
-            'distances': [[1 - combined_scores[i] for i in sorted_indices]],  # Convert scores back to distances
-        }
-        
-        return reranked_results
+        return result_set.ranked(0.5 * bm25_scores + 0.5 * result_set.scores)
     
     def diversity_rerank(self, results: Dict[str, Any], diversity_factor: float = 0.5) -> Dict[str, Any]:
         """
         Re-rank results to increase diversity using Maximal Marginal Relevance (MMR).
         
+        Similarity between candidates is measured on their stored embeddings when the
+        results include them (search with include_embeddings=True), and on
+        bag-of-words vectors otherwise.
+        
         Args:
             results: The original search results
             diversity_factor: How much to prioritize diversity (0-1, higher means more diverse)
@@ -100,215 +100,204 @@ class ReRanker:
         Returns:
             Re-ranked search results with increased diversity
         """
-        if not results or 'documents' not in results or not results['documents'][0]:
-            return results
-        
-        # Extract documents and their original scores
-        documents = results['documents'][0]
-        original_scores = [1 - dist for dist in results['distances'][0]]  # Convert distances to scores
-        metadatas = results['metadatas'][0]
-        
-        # Simple TF-IDF vectorization for documents
-        # In a real application, you would use embeddings directly if available
-        
-        # Create a vocabulary
-        all_words = set()
-        doc_words = []
-        
-        for doc in documents:
-            words = set(doc.lower().split())
-            doc_words.append(words)
-            all_words.update(words)
-        
-        vocabulary = list(all_words)
-        
-        # Create document vectors
-        doc_vectors = []
-        for words in doc_words:
-            vector = [1 if word in words else 0 for word in vocabulary]
-            # Normalize
-            magnitude = np.sqrt(sum(v * v for v in vector))
-            if magnitude > 0:
-                vector = [v / magnitude for v in vector]
-            doc_vectors.append(vector)
+        return self._apply(results, self.diversity_stage, diversity_factor)
+    
+    def diversity_stage(self, result_set: ResultSet, diversity_factor: float = 0.5) -> ResultSet:
+        """MMR re-ranking of a ResultSet (see diversity_rerank); scores are kept, only the order changes."""
+        order = result_set.order
+        if result_set.embeddings is not None:
+            vectors = result_set.embeddings[order]
+        else:
+            vectors = self._bag_of_words_vectors([result_set.documents[i] for i in order])
+        
+        return result_set.reordered(self._mmr_order(result_set.scores[order], vectors, diversity_factor))
+    
+    def _bag_of_words_vectors(self, documents: List[str]) -> np.ndarray:
+        """Binary bag-of-words vectors of the documents, one row per document."""
+        doc_words = [set(doc.lower().split()) for doc in documents]
+        vocabulary = {}
+        rows, columns = [], []
+        for row, words in enumerate(doc_words):
+            for word in words:
+                rows.append(row)
+                columns.append(vocabulary.setdefault(word, len(vocabulary)))
+        
+        vectors = np.zeros((len(documents), max(len(vocabulary), 1)), dtype=np.float32)
+        vectors[rows, columns] = 1
+        return vectors
+    
+    def _mmr_order(self, relevance: np.ndarray, vectors: np.ndarray, diversity_factor: float) -> List[int]:
+        """
+        Order candidates by Maximal Marginal Relevance.
         
-        # MMR algorithm
-        selected_indices = []
-        remaining_indices = list(range(len(documents)))
+        Pairwise cosine similarities are computed once as a single matrix product.
+        Each step then only updates every candidate's maximum similarity to the
+        selected set with the newly selected row, instead of recomputing it.
+        """
+        # Cosine similarities from the Gram matrix; its diagonal holds the squared norms
+        similarity = vectors @ vectors.T
+        norms = np.sqrt(np.maximum(np.diagonal(similarity), 0))
+        norms[norms == 0] = np.inf  # Zero vectors are not similar to anything
+        similarity /= norms[:, None]
+        similarity /= norms[None, :]
+        
+        # Selected candidates are excluded by setting their relevance to -inf
+        relevance_term = (1 - diversity_factor) * np.asarray(relevance, dtype=similarity.dtype)
+        max_similarity = np.full(len(relevance), -np.inf, dtype=similarity.dtype)
+        mmr_scores = np.empty_like(max_similarity)
         
         # Select the highest scoring document first
-        best_idx = max(remaining_indices, key=lambda i: original_scores[i])
-        selected_indices.append(best_idx)
-        remaining_indices.remove(best_idx)
-        
-        # Select the rest using MMR
-        while remaining_indices:
-            best_score = -1
-            best_idx = -1
-            
-            for i in remaining_indices:
-                # Relevance score (from original ranking)
-                relevance = original_scores[i]
-                
-                # Diversity score (maximum similarity to any selected document)
-                max_similarity = max(
-                    [self._cosine_similarity(doc_vectors[i], doc_vectors[j]) 
-                     for j in selected_indices],
-                    default=0
-                )
-                
-                # MMR score
-                mmr_score = (1 - diversity_factor) * relevance - diversity_factor * max_similarity
-                
-                if mmr_score > best_score:
-                    best_score = mmr_score
-                    best_idx = i
-            
-            selected_indices.append(best_idx)
-            remaining_indices.remove(best_idx)
-        
-        # Create re-ranked results
-        reranked_results = {
-            'documents': [[documents[i] for i in selected_indices]],
-            'metadatas': [[metadatas[i] for i in selected_indices]],
-            'distances': [[1 - original_scores[i] for i in selected_indices]],  # Convert scores back to distances
-        }
-        
-        return reranked_results
+        best_idx = int(np.argmax(relevance))
+        order = [best_idx]
+        relevance_term[best_idx] = -np.inf
+        
+        # Select the rest using MMR; argmax picks the earliest candidate on ties
+        for _ in range(len(relevance) - 1):
+            np.maximum(max_similarity, similarity[best_idx], out=max_similarity)
+            np.multiply(max_similarity, -diversity_factor, out=mmr_scores)
+            mmr_scores += relevance_term
+            best_idx = int(np.argmax(mmr_scores))
+            order.append(best_idx)
+            relevance_term[best_idx] = -np.inf
+        
+        return order
     
-    def recency_rerank(self, results: Dict[str, Any], recency_weight: float = 0.3) -> Dict[str, Any]:
+    def recency_rerank(self, results: Dict[str, Any], recency_weight: float = 0.3,
+                       stats: CorpusStats = None) -> Dict[str, Any]:
         """
         Re-rank results to boost more recent documents.
-        Requires 'date' or 'timestamp' in document metadata.
+        Requires a 'timestamp', 'date' or 'modified' field in document metadata,
+        as epoch seconds or an ISO 8601 date; candidates without one get no boost.
+        
+        Dates are scaled to 0-1 over the date range of the whole collection when
+        corpus statistics are given, and over that of the candidates otherwise.
         
         Args:
             results: The original search results
             recency_weight: How much to prioritize recency (0-1)
+            stats: Statistics of the searched collection (SemanticSearch.corpus_stats)
         
         Returns:
             Re-ranked search results with recency boost
         """
-        if not results or 'documents' not in results or not results['documents'][0]:
-            return results
-        
-        # Extract documents and their original scores
-        documents = results['documents'][0]
-        original_scores = [1 - dist for dist in results['distances'][0]]  # Convert distances to scores
-        metadatas = results['metadatas'][0]
-        
+        return self._apply(results, self.recency_stage, recency_weight, stats)
+    
+    def recency_stage(self, result_set: ResultSet, recency_weight: float = 0.3,
+                      stats: CorpusStats = None) -> ResultSet:
+        """Recency re-ranking of a ResultSet (see recency_rerank)."""
         # Check if we have date information
-        has_date = all('date' in meta or 'timestamp' in meta for meta in metadatas)
-        if not has_date:
+        timestamps = timestamps_of(result_set.metadatas)
+        dated = ~np.isnan(timestamps)
+        if not dated.any():
             print("Warning: Cannot perform recency re-ranking as documents lack date metadata")
-            return results
-        
-        # Extract dates (using 'date' or 'timestamp' field)
-        dates = []
-        for meta in metadatas:
-            if 'date' in meta:
-                dates.append(meta['date'])
-            elif 'timestamp' in meta:
-                dates.append(meta['timestamp'])
-            else:
-                dates.append(None)
+            return result_set
         
-        # Convert to numeric values (assuming ISO format dates or Unix timestamps)
-        # This is a simplified version - in a real application, use proper date parsing
-        try:
-            numeric_dates = [float(date) if date else 0 for date in dates]
-            
-            # Normalize dates to 0-1 range
-            if max(numeric_dates) > min(numeric_dates):
-                normalized_dates = [(d - min(numeric_dates)) / (max(numeric_dates) - min(numeric_dates)) 
-                                  for d in numeric_dates]
-            else:
-                normalized_dates = [1.0 for _ in numeric_dates]
-                
-        except (ValueError, TypeError):
-            print("Warning: Date conversion failed, skipping recency re-ranking")
-            return results
+        # Normalize dates to 0-1 range
+        recency = stats.recency(timestamps) if stats is not None else None
+        if recency is None:
+            oldest, newest = timestamps[dated].min(), timestamps[dated].max()
+            recency = (timestamps - oldest) / (newest - oldest) if newest > oldest else np.ones_like(timestamps)
+        recency = np.where(dated, recency, 0.0)
         
         # Combine original scores with recency scores
-        combined_scores = [(1 - recency_weight) * score + recency_weight * recency 
-                          for score, recency in zip(original_scores, normalized_dates)]
-        
-        # Re-sort the results based on the combined scores
-        sorted_indices = sorted(range(len(combined_scores)), key=lambda i: combined_scores[i], reverse=True)
-        
-        # Create re-ranked results
-        reranked_results = {
-            'documents': [[documents[i] for i in sorted_indices]],
-            'metadatas': [[metadatas[i] for i in sorted_indices]],
-            'distances': [[1 - combined_scores[i] for i in sorted_indices]],  # Convert scores back to distances
-        }
-        
-        return reranked_results
+        return result_set.ranked((1 - recency_weight) * result_set.scores + recency_weight * recency)
     
-    def personalized_rerank(self, results: Dict[str, Any], user_profile: Dict[str, float]) -> Dict[str, Any]:
+    def personalized_rerank(self, results: Dict[str, Any], user_profile: Dict[str, float],
+                            stats: CorpusStats = None) -> Dict[str, Any]:
         """
         Re-rank results based on user preferences.
         
+        Profile keywords are counted in each document in one pass by an
+        Aho-Corasick automaton, compiled once per profile and cached (see
+        KeywordMatcher.for_profile), so large profiles stay cheap. With corpus
+        statistics, keyword counts are normalized by each document's
+        length relative to the collection's average, so long chunks are not
+        favoured just for mentioning keywords more often.
+        
         Args:
             results: The original search results
             user_profile: Dictionary of user preferences (keywords -> weights)
+            stats: Statistics of the searched collection (SemanticSearch.corpus_stats)
         
         Returns:
             Re-ranked search results with personalization
         """
-        if not results or 'documents' not in results or not results['documents'][0]:
-            return results
-        
+        return self._apply(results, self.personalized_stage, user_profile, stats)
+    
+    def personalized_stage(self, result_set: ResultSet, user_profile: Dict[str, float],
+                           stats: CorpusStats = None) -> ResultSet:
+        """Personalized re-ranking of a ResultSet (see personalized_rerank)."""
         if not user_profile:
-            return results
-        
-        # Extract documents and their original scores
-        documents = results['documents'][0]
-        original_scores = [1 - dist for dist in results['distances'][0]]  # Convert distances to scores
-        metadatas = results['metadatas'][0]
+            return result_set
         
-        # Calculate personalization scores
-        personalization_scores = []
+        # Weighted keyword occurrences of every document
+        documents = result_set.documents
+        personalization_scores = KeywordMatcher.for_profile(user_profile).scores(documents)
         
-        for doc in documents:
-            doc_lower = doc.lower()
-            
-            # Calculate a score based on presence of profile keywords
-            score = 0
-            for keyword, weight in user_profile.items():
-                if keyword.lower() in doc_lower:
-                    # Count occurrences and apply weight
-                    count = doc_lower.count(keyword.lower())
-                    score += count * weight
-            
-            personalization_scores.append(score)
+        if stats is not None and stats.avg_doc_length:
+            lengths = np.fromiter((len(tokenize(doc)) for doc in documents), dtype=np.float64, count=len(documents))
+            b = PERSONALIZATION_LENGTH_NORMALIZATION
+            personalization_scores /= 1 - b + b * lengths / stats.avg_doc_length
         
         # Normalize personalization scores
-        if max(personalization_scores) > 0:
-            personalization_scores = [score / max(personalization_scores) for score in personalization_scores]
+        max_score = personalization_scores.max()
+        if max_score > 0:
+            personalization_scores = personalization_scores / max_score
         
         # Combine scores (70% original, 30% personalization)
-        combined_scores = [0.7 * orig + 0.3 * pers 
-                          for orig, pers in zip(original_scores, personalization_scores)]
-        
-        # Re-sort the results based on the combined scores
-        sorted_indices = sorted(range(len(combined_scores)), key=lambda i: combined_scores[i], reverse=True)
-        
-        # Create re-ranked results
-        reranked_results = {
-            'documents': [[documents[i] for i in sorted_indices]],
-            'metadatas': [[metadatas[i] for i in sorted_indices]],
-            'distances': [[1 - combined_scores[i] for i in sorted_indices]],  # Convert scores back to distances
-        }
-        
-        return reranked_results
+        return result_set.ranked(0.7 * result_set.scores + 0.3 * personalization_scores)
+
+def parse_stages(spec: str) -> List[str]:
+    """Stage names of a pipeline such as 'bm25,recency,diversity' or 'bm25 -> recency -> diversity'."""
+    stages = [name.strip() for name in re.split(r',|->', spec) if name.strip()]
+    unknown = [name for name in stages if name not in RERANK_STAGES]
+    if not stages or unknown:
+        raise ValueError(f"Unknown re-ranking stages in {spec!r} (expected a chain of {', '.join(RERANK_STAGES)})")
+    return stages
+
+class RerankPipeline:
+    """
+    A chain of re-ranking stages applied in turn to one ResultSet.
     
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors."""
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        magnitude1 = np.sqrt(sum(a * a for a in vec1))
-        magnitude2 = np.sqrt(sum(b * b for b in vec2))
-        
-        if magnitude1 == 0 or magnitude2 == 0:
-            return 0
-            
-        return dot_product / (magnitude1 * magnitude2)
\ No newline at end of file
+    Every stage blends its signal into the scores left by the previous one and
+    permutes the same rows (diversity only permutes them), so documents and
+    metadata are never copied between stages. The stages share one ReRanker,
+    so the BM25 index of the candidates is built once.
+    """
+    
+    def __init__(self, stages: Union[str, Sequence[str]], diversity_factor: float = 0.5, recency_weight: float = 0.3,
+                 user_profile: Dict[str, float] = None, stats: CorpusStats = None, reranker: ReRanker = None):
+        """
+        Args:
+            stages: Stage names, or a spec for parse_stages()
+            diversity_factor: Diversity factor of the diversity stage (0-1)
+            recency_weight: Weight of the recency stage (0-1)
+            user_profile: Keyword weights of the personalized stage
+            stats: Statistics of the searched collection (SemanticSearch.corpus_stats)
+            reranker: The ReRanker running the stages (a new one by default)
+        """
+        self.stages = parse_stages(stages) if isinstance(stages, str) else parse_stages(','.join(stages))
+        self.diversity_factor = diversity_factor
+        self.recency_weight = recency_weight
+        self.user_profile = user_profile
+        self.stats = stats
+        self.reranker = reranker or ReRanker()
+    
+    def run(self, query: str, result_set: ResultSet) -> ResultSet:
+        """Apply every stage in turn, traced as a 'rerank' span with a 'rerank.<stage>' child per stage."""
+        with tracer.span('rerank', stages=','.join(self.stages), candidates=len(result_set)):
+            for stage in self.stages:
+                with tracer.span(f'rerank.{stage}'):
+                    if stage == 'bm25':
+                        result_set = self.reranker.bm25_stage(result_set, query, stats=self.stats)
+                    elif stage == 'diversity':
+                        result_set = self.reranker.diversity_stage(result_set, self.diversity_factor)
+                    elif stage == 'recency':
+                        result_set = self.reranker.recency_stage(result_set, self.recency_weight, self.stats)
+                    else:
+                        result_set = self.reranker.personalized_stage(result_set, self.user_profile, self.stats)
+        return result_set
+    
+    def rerank(self, query: str, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply every stage to the first query of a result dict."""
+        return self.reranker._apply(results, lambda result_set: self.run(query, result_set))
\ No newline at end of file
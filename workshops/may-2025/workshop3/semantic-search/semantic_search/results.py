@@ -0,0 +1,76 @@
+# Columnar search results that re-ranking stages permute without copying
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+class ResultSet:
+    """
+    The results of one query as columns, in a ranked order.
+
+    ids, documents, metadatas and embeddings are stored once, in the order
+    the search returned them, and shared by every ResultSet derived from
+    this one. `scores` holds the current relevance of each stored row
+    (1 - distance to begin with) and `order` the stored rows from best to
+    worst, so a re-ranking stage only computes new scores and a new
+    permutation.
+    """
+
+    def __init__(self, ids: Optional[Sequence[str]], documents: Sequence[str],
+                 metadatas: Sequence[Optional[Dict[str, Any]]], scores: np.ndarray,
+                 embeddings: Optional[np.ndarray] = None, order: Optional[np.ndarray] = None):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.scores = scores
+        self.embeddings = embeddings
+        self.order = np.arange(len(documents)) if order is None else order
+
+    @classmethod
+    def from_results(cls, results: Dict[str, Any], index: int = 0) -> 'ResultSet':
+        """
+        Columns of the `index`-th query of a ChromaDB-style result dict.
+
+        IDs and embeddings are kept when the results include them.
+        """
+        documents = results['documents'][index]
+        ids = results['ids'][index] if results.get('ids') else None
+        metadatas = results['metadatas'][index] if results.get('metadatas') else [None] * len(documents)
+        embeddings = results.get('embeddings')
+        embeddings = embeddings[index] if embeddings is not None else None
+        if embeddings is not None and len(embeddings) == len(documents):
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+        else:
+            embeddings = None
+        scores = 1 - np.asarray(results['distances'][index], dtype=np.float64)
+        return cls(ids, documents, metadatas, scores, embeddings)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def ranked(self, scores: np.ndarray) -> 'ResultSet':
+        """
+        The same rows with new scores (one per stored row), sorted by them.
+
+        The sort is stable, so ties keep their current order.
+        """
+        order = self.order[np.argsort(-scores[self.order], kind='stable')]
+        return ResultSet(self.ids, self.documents, self.metadatas, scores, self.embeddings, order)
+
+    def reordered(self, positions: Sequence[int]) -> 'ResultSet':
+        """The same scores, with the rows at these positions of the current order in turn."""
+        return ResultSet(self.ids, self.documents, self.metadatas, self.scores, self.embeddings,
+                         self.order[np.asarray(positions, dtype=np.intp)])
+
+    def to_results(self) -> Dict[str, Any]:
+        """A ChromaDB-style result dict of the ranking, with scores converted back to distances."""
+        order = self.order.tolist()
+        results: Dict[str, List[Any]] = {
+            'documents': [[self.documents[i] for i in order]],
+            'metadatas': [[self.metadatas[i] for i in order]],
+            'distances': [(1 - self.scores[self.order]).tolist()],
+        }
+        if self.ids is not None:
+            results['ids'] = [[self.ids[i] for i in order]]
+        if self.embeddings is not None:
+            results['embeddings'] = [self.embeddings[self.order]]
+        return results
\ No newline at end of file
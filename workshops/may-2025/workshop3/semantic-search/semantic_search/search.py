@@ -1,116 +1,514 @@
 # Main semantic search implementation
+import contextvars
 import os
-from typing import List, Dict, Any
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
 
-import openai
-import chromadb
-from chromadb.config import Settings
+import numpy as np
 
 from semantic_search.config import (
-    OPENAI_API_KEY, 
-    EMBEDDING_MODEL, 
     CHROMA_PERSIST_DIRECTORY,
     DEFAULT_COLLECTION_NAME,
-    SIMILARITY_METRIC
+    DEFAULT_SEARCH_RESULTS,
+    SEARCH_BATCH_SIZE,
+    SIMILARITY_METRIC,
+    VECTOR_BACKEND,
+    LEXICAL_INDEX_ENABLED,
+    HYBRID_CANDIDATES,
+    RRF_K,
+    SHORT_EMBEDDING_DIMENSIONS,
+    TWO_STAGE_CANDIDATES_PER_RESULT
 )
+from semantic_search.backends import open_client
+from semantic_search.corpus_stats import CorpusStats, with_timestamps
+from semantic_search.embedding import EmbeddingGenerator, EmbeddingStats
+from semantic_search.filters import normalize_where
+from semantic_search.lexical_index import InvertedIndex
+from semantic_search.tracing import tracer
+from semantic_search.vector_index import distances_to
+
+def truncate_embeddings(embeddings, dimensions: int) -> np.ndarray:
+    """
+    Shorten Matryoshka embeddings to their first `dimensions` components, renormalized.
+    
+    For text-embedding-3 models this equals requesting `dimensions` from the API,
+    so short vectors can be derived from full ones without another request.
+    """
+    short = np.asarray(embeddings, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(short, axis=1, keepdims=True)
+    return short / np.where(norms == 0, 1, norms)
+
+def two_stage_query(short_collection, collection, query_embeddings: List[List[float]], n_results: int,
+                    dimensions: int, candidates: int, include: List[str]) -> Dict:
+    """
+    Coarse-to-fine search over a collection and its collection of truncated vectors.
+    
+    The first stage finds the `candidates` nearest rows to each truncated query
+    in `short_collection`; the second fetches their full vectors from
+    `collection` (one get() for all queries) and ranks them by the full
+    query's distance in the collection's metric. Returns the collection.query()
+    result shape with exact distances.
+    """
+    queries = np.asarray(query_embeddings, dtype=np.float32)
+    shortlists = short_collection.query(query_embeddings=truncate_embeddings(queries, dimensions).tolist(),
+                                        n_results=candidates, include=["distances"])['ids']
+    candidate_ids = sorted(set().union(*shortlists))
+    if not candidate_ids:
+        return {key: [[] for _ in shortlists] for key in ['ids', *include]}
+    stored = collection.get(ids=candidate_ids, include=["embeddings", *[key for key in include if key != "distances"]])
+    positions = {doc_id: i for i, doc_id in enumerate(stored['ids'])}
+    
+    vectors = np.asarray(stored['embeddings'], dtype=np.float32).reshape(len(stored['ids']), -1)
+    metric = (collection.metadata or {}).get('hnsw:space', 'l2')
+    distances = distances_to(vectors @ queries.T, np.linalg.norm(vectors, axis=1), np.linalg.norm(queries, axis=1),
+                             metric)
+    
+    results = {key: [] for key in ['ids', *include]}
+    for q, shortlist in enumerate(shortlists):
+        rows = np.array([positions[doc_id] for doc_id in shortlist if doc_id in positions], dtype=np.int64)
+        ranked = rows[np.argsort(distances[rows, q], kind='stable')[:n_results]]
+        results['ids'].append([stored['ids'][row] for row in ranked])
+        if 'distances' in include:
+            results['distances'].append([float(distances[row, q]) for row in ranked])
+        for key in ('documents', 'metadatas', 'embeddings'):
+            if key in include:
+                results[key].append([stored[key][row] for row in ranked])
+    return results
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked ID lists by reciprocal rank: each list contributes 1 / (k + rank) to an ID's score.
+    
+    Returns (id, score) pairs, best first; ties keep the order in which IDs were first seen.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+class SearchStats:
+    """Throughput and per-batch latency of a batched search run."""
+
+    def __init__(self):
+        """Start the clock for a new run."""
+        self.queries = 0
+        self.batches = []  # (queries, embed seconds, query seconds) per batch
+        self.started_at = time.perf_counter()
+
+    def record(self, queries: int, embed_seconds: float, query_seconds: float):
+        """Record one batch of queries."""
+        self.queries += queries
+        self.batches.append((queries, embed_seconds, query_seconds))
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the run started."""
+        return time.perf_counter() - self.started_at
+
+    @property
+    def queries_per_second(self) -> float:
+        return self.queries / self.elapsed if self.elapsed > 0 else 0.0
+
+    def latency_percentile(self, percentile: float) -> float:
+        """Percentile of per-batch latency (embedding plus collection query) in seconds."""
+        if not self.batches:
+            return 0.0
+        latencies = sorted(embed + query for _, embed, query in self.batches)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+    def __str__(self) -> str:
+        return (f"{self.queries} queries in {len(self.batches)} batches over {self.elapsed:.2f}s "
+                f"({self.queries_per_second:.1f} queries/s, batch latency "
+                f"p50 {self.latency_percentile(50) * 1000:.0f} ms, p95 {self.latency_percentile(95) * 1000:.0f} ms)")
 
 class SemanticSearch:
-    def __init__(self, openai_api_key: str = None, collection_name: str = DEFAULT_COLLECTION_NAME):
-        """Initialize the semantic search with OpenAI and ChromaDB."""
-        # Set up OpenAI client
-        self.openai_api_key = openai_api_key or OPENAI_API_KEY
-        if not self.openai_api_key:
-            raise ValueError("OpenAI API key is required. Set it in .env file or pass it directly.")
-        
-        self.client = openai.OpenAI(api_key=self.openai_api_key)
-        
-        # Set up ChromaDB with current configuration
-        chroma_settings = Settings(
-            persist_directory=CHROMA_PERSIST_DIRECTORY
-        )
+    def __init__(self, openai_api_key: str = None, collection_name: str = DEFAULT_COLLECTION_NAME,
+                 persist_directory: str = CHROMA_PERSIST_DIRECTORY, embedder: EmbeddingGenerator = None,
+                 lexical_index: bool = LEXICAL_INDEX_ENABLED, backend: str = VECTOR_BACKEND,
+                 short_dimensions: int = SHORT_EMBEDDING_DIMENSIONS):
+        """
+        Initialize the semantic search with OpenAI and a vector store.
         
-        self.db_client = chromadb.PersistentClient(
-            path=CHROMA_PERSIST_DIRECTORY,
-            settings=chroma_settings
-        )
+        `backend` is 'chroma' (ChromaDB) or 'local' (the in-process engine of
+        semantic_search.vector_index); both store data under persist_directory.
+        
+        With lexical_index, a persistent BM25 index of the collection is kept up to
+        date by add_documents() and delete_documents() and saved by persist().
+        So are the collection's corpus statistics (corpus_stats), which the
+        re-rankers use for corpus-level normalization.
+        
+        With short_dimensions, every embedding is also stored truncated to that
+        many dimensions in a companion collection, and vector searches run in two
+        stages: a first pass over the short vectors, then the shortlist is
+        rescored with the full ones (see two_stage_query).
+        """
+        # Set up the embedding generator (and its OpenAI client); one created here is closed by close()
+        self._owns_embedder = embedder is None
+        self.embedder = embedder or EmbeddingGenerator(api_key=openai_api_key)
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.openai_api_key = self.embedder.api_key
+        self.client = self.embedder.client
+        
+        # Set up the vector store with current configuration
+        self.backend = backend
+        self.db_client = open_client(persist_directory, backend)
         
         # Get or create collection
         self.collection = self.db_client.get_or_create_collection(
             name=collection_name,
             metadata={"hnsw:space": SIMILARITY_METRIC}
         )
+        
+        # Inverted index for lexical and hybrid search, stored next to the collection
+        self.lexical_index = InvertedIndex.for_collection(collection_name, persist_directory) if lexical_index else None
+        
+        # Document lengths, date range and term frequencies of the collection for re-ranking
+        self.corpus_stats = CorpusStats.for_collection(collection_name, persist_directory, self.lexical_index)
+        
+        # Truncated copies of the embeddings for the first stage of two-stage search
+        self.short_dimensions = short_dimensions
+        self.short_collection = None
+        if short_dimensions:
+            self.short_collection = self.db_client.get_or_create_collection(
+                name=f"{collection_name}_{short_dimensions}d",
+                metadata={"hnsw:space": SIMILARITY_METRIC}
+            )
+        # Collections filled before short vectors were enabled need rebuild_short_vectors() first
+        self.two_stage = (self.short_collection is not None
+                          and self.short_collection.count() == self.collection.count())
     
     def get_embedding(self, text: str) -> List[float]:
         """Get embeddings for a text using OpenAI's API."""
-        response = self.client.embeddings.create(
-            input=text,
-            model=EMBEDDING_MODEL
-        )
-        return response.data[0].embedding
+        return self.embedder.get_embedding(text)
     
-    def add_documents(self, documents: List[str], ids: List[str] = None, metadatas: List[Dict[str, Any]] = None):
-        """Add documents to the vector database."""
+    def add_documents(self, documents: List[str], ids: List[str] = None, metadatas: List[Dict[str, Any]] = None,
+                      max_inputs: int = None, max_tokens: int = None, upsert: bool = False) -> EmbeddingStats:
+        """
+        Add documents to the vector database.
+        
+        Documents are packed into token-budgeted multi-input embedding requests
+        that run concurrently; each batch is written to the collection in order.
+        With upsert=True existing IDs are overwritten instead of ignored.
+        Chunks with a date in their metadata (see corpus_stats.chunk_timestamp)
+        are stored with it as a numeric `timestamp` too.
+        Returns the throughput statistics of the run, including the IDs that failed.
+        """
         if ids is None:
             ids = [f"doc_{i}" for i in range(len(documents))]
+        metadatas = with_timestamps(metadatas)
         
-        # Get max chunks per batch from config
-        from semantic_search.config import MAX_CHUNKS_PER_BATCH
+        stats = EmbeddingStats()
+        write = self.collection.upsert if upsert else self.collection.add
         
-        # Process in batches to avoid memory issues
-        for i in range(0, len(documents), MAX_CHUNKS_PER_BATCH):
-            batch_end = min(i + MAX_CHUNKS_PER_BATCH, len(documents))
-            batch_docs = documents[i:batch_end]
-            batch_ids = ids[i:batch_end]
-            batch_metadatas = None if metadatas is None else metadatas[i:batch_end]
-            
-            print(f"Processing batch {i//MAX_CHUNKS_PER_BATCH + 1}/{(len(documents)-1)//MAX_CHUNKS_PER_BATCH + 1} " 
-                  f"(chunks {i+1}-{batch_end} of {len(documents)})...")
-            
+        # Embedding requests run concurrently; batches come back in input order
+        for start, end, batch_embeddings in self.embedder.embed_batches(
+                documents, max_inputs, max_tokens, stats, return_exceptions=True):
             try:
-                # Get embeddings for the current batch
-                batch_embeddings = [self.get_embedding(doc) for doc in batch_docs]
+                if isinstance(batch_embeddings, Exception):
+                    raise batch_embeddings
+                
+                # Chunks already stored are replaced by an upsert and skipped by an add
+                existing = self.collection.get(ids=ids[start:end], include=["documents"])
                 
                 # Add to ChromaDB
-                self.collection.add(
+                write(
                     embeddings=batch_embeddings,
-                    documents=batch_docs,
-                    ids=batch_ids,
-                    metadatas=batch_metadatas
+                    documents=documents[start:end],
+                    ids=ids[start:end],
+                    metadatas=None if metadatas is None else metadatas[start:end]
                 )
+                if self.short_collection is not None:
+                    short_write = self.short_collection.upsert if upsert else self.short_collection.add
+                    short_write(embeddings=truncate_embeddings(batch_embeddings, self.short_dimensions).tolist(),
+                                ids=ids[start:end])
+                if self.lexical_index is not None:
+                    self.lexical_index.add(ids[start:end], documents[start:end], replace=upsert)
                 
-                # With PersistentClient, data is automatically persisted
-                print(f"Successfully added batch {i//MAX_CHUNKS_PER_BATCH + 1}.")
+                if upsert:
+                    self.corpus_stats.remove(existing['documents'])
+                    stored = set()
+                else:
+                    stored = set(existing['ids'])
+                new = [i for i in range(start, end) if ids[i] not in stored]
+                self.corpus_stats.add([documents[i] for i in new],
+                                      None if metadatas is None else [metadatas[i] for i in new])
             except Exception as e:
-                print(f"Error processing batch {i//MAX_CHUNKS_PER_BATCH + 1}: {e}")
+                print(f"Error processing chunks {start+1}-{end}: {e}")
+                stats.failed_ids.extend(ids[start:end])
                 # Continue with next batch
         
-        print(f"Added {len(documents)} documents to the collection.")
+        print(f"Added {len(documents) - len(stats.failed_ids)} of {len(documents)} documents to the collection: {stats}")
+        return stats
 
     
-    def search(self, query: str, n_results: int = None) -> Dict:
-        """Search for similar documents based on the query."""
-        from semantic_search.config import DEFAULT_SEARCH_RESULTS
+    def search(self, query: str, n_results: int = None, include_embeddings: bool = False,
+               where: Dict[str, Any] = None) -> Dict:
+        """
+        Search for similar documents based on the query.
+        
+        Set include_embeddings to also return the stored embeddings of the results
+        (used by embedding-based re-ranking). `where` restricts the search to
+        documents whose metadata matches a ChromaDB-style filter, e.g.
+        {"file_ext": ".md", "modified": {"$gte": "2025-05-01"}} (see
+        semantic_search.filters.normalize_where); both backends apply it before
+        vectors are scored.
+        
+        Each search is traced as a 'search' span with 'search.embed' and
+        'search.vector_query' children (see semantic_search.tracing).
+        """
+        with tracer.span('search', mode='vector'):
+            return self._vector_search(query, n_results, include_embeddings, where)
+    
+    def _vector_search(self, query: str, n_results: int = None, include_embeddings: bool = False,
+                       where: Dict[str, Any] = None) -> Dict:
+        with tracer.span('search.embed'):
+            query_embedding = self.get_embedding(query)
+        return self._query([query_embedding], n_results, include_embeddings, where)
+    
+    def search_many(self, queries: Iterable[str], n_results: int = None, batch_size: int = SEARCH_BATCH_SIZE,
+                    include_embeddings: bool = False, stats: SearchStats = None,
+                    where: Dict[str, Any] = None) -> Iterator[Dict]:
+        """
+        Search for many queries, yielding one result per query in input order.
+        
+        Queries are read in batches of `batch_size`. Each batch is embedded with
+        one multi-input request (cached embeddings are reused) and sent to the
+        collection as a single query with many vectors. Up to the embedder's
+        max_in_flight batches are embedded ahead of the collection queries, so
+        `queries` can be an unbounded stream. Each result has the same shape as
+        search() returns. Per-batch latencies are recorded in `stats`, and
+        `where` filters every query like search().
+        """
+        stats = stats if stats is not None else SearchStats()
+        queries = iter(queries)
+        
+        def embed(batch: List[str]):
+            started = time.perf_counter()
+            with tracer.span('search.embed', queries=len(batch)):
+                embeddings = self.embedder.get_embeddings(batch)
+            return batch, embeddings, time.perf_counter() - started
+        
+        with ThreadPoolExecutor(max_workers=self.embedder.executor.max_in_flight,
+                                thread_name_prefix="search-embedding") as pool:
+            pending = deque()
+            while True:
+                while len(pending) < self.embedder.executor.max_in_flight:
+                    batch = list(islice(queries, max(1, batch_size)))
+                    if not batch:
+                        break
+                    pending.append(pool.submit(embed, batch))
+                if not pending:
+                    return
+                
+                batch, embeddings, embed_seconds = pending.popleft().result()
+                started = time.perf_counter()
+                results = self._query(embeddings, n_results, include_embeddings, where)
+                stats.record(len(batch), embed_seconds, time.perf_counter() - started)
+                
+                # Split the fanned-in result into one search() shaped result per query
+                keys = [key for key in ('ids', 'documents', 'metadatas', 'distances', 'embeddings')
+                        if results.get(key) is not None]
+                for i in range(len(batch)):
+                    yield {key: [results[key][i]] for key in keys}
+    
+    def _query(self, query_embeddings: List[List[float]], n_results: int = None,
+               include_embeddings: bool = False, where: Dict[str, Any] = None) -> Dict:
+        """Query the collection with one or more embeddings."""
         n_results = n_results or DEFAULT_SEARCH_RESULTS
-
-        query_embedding = self.get_embedding(query)
         
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
-            include=["documents", "metadatas", "distances"]
-        )
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        # The short vectors carry no metadata; a filter already narrows the rows scored in the full collection
+        two_stage = self.two_stage and not where
+        with tracer.span('search.vector_query', queries=len(query_embeddings), n_results=n_results,
+                         two_stage=two_stage, filtered=bool(where)):
+            if two_stage:
+                return two_stage_query(self.short_collection, self.collection, query_embeddings, n_results,
+                                       self.short_dimensions, n_results * TWO_STAGE_CANDIDATES_PER_RESULT, include)
+            results = self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=normalize_where(where) if where else None,
+                include=include
+            )
         
         return results
     
+    def lexical_search(self, query: str, n_results: int = None, where: Dict[str, Any] = None) -> Dict:
+        """
+        Search the collection by BM25 over the lexical index.
+        
+        Returns results in the shape search() returns; distances are 1 - BM25
+        score scaled by the best score, so the best match has distance 0. The
+        lexical index holds no metadata, so with `where` the best
+        HYBRID_CANDIDATES matches are fetched and filtered.
+        """
+        if self.lexical_index is None:
+            raise ValueError("The lexical index is disabled for this searcher")
+        n_results = n_results or DEFAULT_SEARCH_RESULTS
+        with tracer.span('search', mode='lexical'):
+            with tracer.span('search.lexical_query'):
+                ids, scores = self.lexical_index.search(query, max(n_results, HYBRID_CANDIDATES) if where else n_results)
+            scaled = scores / scores[0] if len(scores) else scores
+            return self._fetch(ids, [float(1 - score) for score in scaled], where, n_results)
+    
+    def hybrid_search(self, query: str, n_results: int = None, candidates: int = HYBRID_CANDIDATES,
+                      rrf_k: int = RRF_K, where: Dict[str, Any] = None) -> Dict:
+        """
+        Search with vector and BM25 retrieval in parallel and fuse their rankings.
+        
+        Each retriever returns `candidates` results; they are combined by
+        reciprocal rank fusion, so exact keyword matches outside the vector
+        top-k can surface. Returns results in the shape search() returns;
+        distances are 1 - the fused score scaled by its maximum (first in every
+        ranking), so they stay within [0, 1]. With `where`, the vector side is
+        filtered before scoring and fused results are filtered before the top
+        `n_results` are kept.
+        """
+        if self.lexical_index is None:
+            raise ValueError("The lexical index is disabled for this searcher")
+        n_results = n_results or DEFAULT_SEARCH_RESULTS
+        candidates = max(candidates, n_results)
+        
+        with tracer.span('search', mode='hybrid'):
+            # The vector side waits on the embeddings API while the lexical side scores locally;
+            # it runs in a copy of this context so that its spans join the trace
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="hybrid-vector") as pool:
+                vector_future = pool.submit(contextvars.copy_context().run, self._vector_search, query, candidates,
+                                            where=where)
+                with tracer.span('search.lexical_query'):
+                    lexical_ids, _ = self.lexical_index.search(query, candidates)
+                vector_ids = vector_future.result()['ids'][0]
+            
+            fused = reciprocal_rank_fusion([vector_ids, lexical_ids], rrf_k)
+            if not where:
+                fused = fused[:n_results]
+            best_possible = 2.0 / (rrf_k + 1)
+            return self._fetch([doc_id for doc_id, _ in fused], [1 - score / best_possible for _, score in fused],
+                               where, n_results)
+    
+    def _fetch(self, ids: List[str], distances: List[float], where: Dict[str, Any] = None,
+               limit: int = None) -> Dict:
+        """
+        Documents and metadatas of IDs from the collection, in search() shape and in the given order.
+        
+        IDs whose metadata does not match `where` are dropped, and at most `limit` are kept.
+        """
+        if not ids:
+            return {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        with tracer.span('search.fetch', ids=len(ids)):
+            stored = self.collection.get(ids=ids, where=normalize_where(where) if where else None,
+                                         include=["documents", "metadatas"])
+        positions = {doc_id: i for i, doc_id in enumerate(stored['ids'])}
+        found = [(doc_id, distance) for doc_id, distance in zip(ids, distances) if doc_id in positions][:limit]
+        return {
+            'ids': [[doc_id for doc_id, _ in found]],
+            'documents': [[stored['documents'][positions[doc_id]] for doc_id, _ in found]],
+            'metadatas': [[stored['metadatas'][positions[doc_id]] for doc_id, _ in found]],
+            'distances': [[distance for _, distance in found]],
+        }
+    
+    def delete_documents(self, ids: List[str]):
+        """Delete documents from the vector database by ID."""
+        if ids:
+            self.corpus_stats.remove(self.collection.get(ids=ids, include=["documents"])['documents'])
+            self.collection.delete(ids=ids)
+            if self.short_collection is not None:
+                self.short_collection.delete(ids=ids)
+            if self.lexical_index is not None:
+                self.lexical_index.delete(ids)
+    
     def get_collection_count(self) -> int:
         """Get the number of documents in the collection."""
         return self.collection.count()
     
     def persist(self):
-        """Persist the database to disk."""
-        # In newer versions of ChromaDB (with PersistentClient), 
-        # the data is automatically persisted, so this method is kept
-        # for backward compatibility but doesn't need to do anything
-        print("Database persisted to disk.")
-        # Note: With PersistentClient, ChromaDB automatically persists data
-        # after operations, so no explicit persist call is needed
\ No newline at end of file
+        """Persist the lexical index and the corpus statistics to disk."""
+        # ChromaDB's PersistentClient persists data after every operation,
+        # so only the lexical index and statistics have to be written explicitly
+        if self.lexical_index is not None:
+            self.lexical_index.save()
+        self.corpus_stats.save()
+    
+    def close(self):
+        """Release the embedding generator's threads and connections, if this searcher created it."""
+        if self._owns_embedder:
+            self.embedder.close()
+    
+    def __enter__(self) -> 'SemanticSearch':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def rebuild_lexical_index(self, batch_size: int = 1000) -> int:
+        """Rebuild the lexical index from the documents in the collection. Returns the number indexed."""
+        if self.lexical_index is None:
+            raise ValueError("The lexical index is disabled for this searcher")
+        self.lexical_index.clear()
+        offset = 0
+        while True:
+            batch = self.collection.get(include=["documents"], limit=batch_size, offset=offset)
+            if not batch['ids']:
+                break
+            self.lexical_index.add(batch['ids'], batch['documents'])
+            offset += len(batch['ids'])
+        self.lexical_index.save()
+        return offset
+    
+    def rebuild_corpus_stats(self, batch_size: int = 1000) -> int:
+        """
+        Recompute the corpus statistics from the documents in the collection. Returns the number counted.
+        
+        Tightens the date range after deletions, and fills in statistics for collections ingested before they were kept.
+        """
+        self.corpus_stats.clear()
+        offset = 0
+        while True:
+            batch = self.collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            if not batch['ids']:
+                break
+            self.corpus_stats.add(batch['documents'], batch['metadatas'])
+            offset += len(batch['ids'])
+        self.corpus_stats.save()
+        return offset
+    
+    def rebuild_short_vectors(self, batch_size: int = 1000) -> int:
+        """
+        Rebuild the truncated vectors from the full embeddings in the collection, without API calls.
+        
+        Enables two-stage search on a collection ingested before short vectors were. Returns the number stored.
+        """
+        if self.short_collection is None:
+            raise ValueError("Short vectors are disabled for this searcher")
+        self.db_client.delete_collection(self.short_collection.name)
+        self.short_collection = self.db_client.get_or_create_collection(
+            name=f"{self.collection_name}_{self.short_dimensions}d",
+            metadata={"hnsw:space": SIMILARITY_METRIC}
+        )
+        offset = 0
+        while True:
+            batch = self.collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+            if not batch['ids']:
+                break
+            self.short_collection.add(ids=batch['ids'],
+                                      embeddings=truncate_embeddings(batch['embeddings'], self.short_dimensions).tolist())
+            offset += len(batch['ids'])
+        self.two_stage = True
+        return offset
+    
+    def build_ann_index(self, nlist: int = None, subspaces: int = None) -> Dict[str, int]:
+        """
+        Train an IVF-PQ index for the collection on the local backend (see LocalCollection.build_ann_index).
+        
+        ChromaDB collections are always searched through their own HNSW index.
+        """
+        if self.backend != 'local':
+            raise ValueError("IVF-PQ indexes are only available on the local vector backend")
+        return self.collection.build_ann_index(nlist=nlist, subspaces=subspaces)
\ No newline at end of file
@@ -0,0 +1,145 @@
+# Local OpenAI-compatible embeddings endpoint for tests and benchmarks
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+def fake_embedding(text: str, dimensions: int) -> np.ndarray:
+    """Deterministic unit vector derived from the text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+class StubEmbeddingServer:
+    """
+    Minimal stand-in for the OpenAI embeddings API.
+
+    Serves POST /v1/embeddings on localhost and counts requests and inputs so
+    callers can assert how many round-trips an ingestion run needed. Latency and
+    error responses can be injected to exercise concurrency and retries.
+
+    Usage:
+        with StubEmbeddingServer(dimensions=8) as server:
+            with EmbeddingGenerator(api_key="test", base_url=server.base_url) as generator:
+                ...
+    """
+
+    def __init__(self, dimensions: int = 1536, latency: float = 0.0, fail_requests: int = 0,
+                 fail_status: int = 429):
+        """
+        Create the server; call start() or use it as a context manager.
+
+        Args:
+            dimensions: Embedding dimension returned when the request does not set one
+            latency: Seconds to sleep before answering each request
+            fail_requests: Number of initial requests answered with fail_status
+            fail_status: HTTP status used for injected failures
+        """
+        self.dimensions = dimensions
+        self.latency = latency
+        self.fail_requests = fail_requests
+        self.fail_status = fail_status
+        self.request_count = 0
+        self.input_count = 0
+        self.failed_count = 0
+        self.max_concurrency = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'StubEmbeddingServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _embed_request(self, body: dict) -> dict:
+        inputs = body['input']
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dimensions = body.get('dimensions') or self.dimensions
+
+        with self._lock:
+            self.request_count += 1
+            self.input_count += len(inputs)
+
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(text, dimensions)
+            if body.get('encoding_format') == 'base64':
+                embedding = base64.b64encode(vector.astype('<f4').tobytes()).decode('ascii')
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get('model'),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if not self.path.rstrip('/').endswith('/embeddings'):
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length))
+
+                with server._lock:
+                    server._active += 1
+                    server.max_concurrency = max(server.max_concurrency, server._active)
+                    fail = server.failed_count < server.fail_requests
+                    if fail:
+                        server.failed_count += 1
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    if fail:
+                        self._send(server.fail_status, {"error": {"message": "Injected failure"}},
+                                   {"Retry-After": "0"})
+                    else:
+                        self._send(200, server._embed_request(body))
+                finally:
+                    with server._lock:
+                        server._active -= 1
+
+            def _send(self, status: int, payload: dict, headers: dict = None):
+                raw = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,202 @@
+# Query-time tracing: named spans, per-stage latency histograms and OpenTelemetry-compatible export
+import bisect
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from semantic_search.config import TRACE_EXPORT_PATH, TRACE_SERVICE_NAME
+
+# Histogram bucket upper bounds in seconds: 10 µs to ~100 s, four buckets per doubling (~19% apart)
+BUCKET_BOUNDS = [1e-5 * 2 ** (i / 4) for i in range(94)]
+
+class Histogram:
+    """
+    Latency distribution in fixed exponential buckets.
+
+    Recording is a binary search and a counter increment, and memory does not
+    grow with the number of observations. Percentiles are read off the bucket
+    bounds, so they are exact to within a bucket (~19%), capped by the largest
+    observation.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percentile: float) -> float:
+        """Upper bound of the bucket holding the given percentile (0-100) of observations, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[bucket] if bucket < len(BUCKET_BOUNDS) else self.max, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """Count, mean, p50, p90, p99 and max in milliseconds."""
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p90_ms': self.percentile(90) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+class Span:
+    """A timed, named operation within a trace; its parent is the span that was open when it started."""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'start_ns', 'duration_ns', 'error')
+
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.duration_ns = 0
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        return self.duration_ns / 1e9
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The span in OTLP/JSON form (opentelemetry.proto.trace.v1.Span)."""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.start_ns + self.duration_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()],
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.error:
+            span['status'] = {'code': 2, 'message': self.error}  # STATUS_CODE_ERROR
+        return span
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+class SpanFileExporter:
+    """
+    Appends finished traces to a file as OTLP/JSON, one trace per line.
+
+    Every line is an ExportTraceServiceRequest, the format the OpenTelemetry
+    Collector's otlpjsonfile receiver reads, so the file can be replayed into a
+    collector or inspected with jq. Spans are buffered until the root span of
+    their trace ends.
+    """
+
+    def __init__(self, path: str, service_name: str = TRACE_SERVICE_NAME):
+        self.path = path
+        self.service_name = service_name
+        self._pending: Dict[str, List[Span]] = {}
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            spans = self._pending.setdefault(span.trace_id, [])
+            spans.append(span)
+            if span.parent_id is not None:
+                return
+            del self._pending[span.trace_id]
+            request = {'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+                'scopeSpans': [{'scope': {'name': 'semantic_search'}, 'spans': [s.to_otlp() for s in spans]}],
+            }]}
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(request) + '\n')
+
+# The innermost open span of the current thread or task
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('current_span', default=None)
+
+class Tracer:
+    """
+    Records spans into per-name latency histograms and hands them to an optional exporter.
+
+    Spans nest through a context variable, so a span opened inside another
+    one becomes its child; work submitted to a thread pool joins the trace
+    when it runs in a copy of the submitting context (contextvars.copy_context).
+    """
+
+    def __init__(self, exporter: Optional[SpanFileExporter] = None):
+        self.exporter = exporter
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time the enclosed block as a span named `name`."""
+        parent = _current_span.get()
+        span = Span(name, parent.trace_id if parent else os.urandom(16).hex(), os.urandom(8).hex(),
+                    parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        started = time.perf_counter_ns()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ns = time.perf_counter_ns() - started
+            _current_span.reset(token)
+            self.record(span)
+
+    def record(self, span: Span):
+        with self._lock:
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = Histogram()
+            histogram.observe(span.duration)
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Latency summary of every span name (see Histogram.summary)."""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+
+    def report(self) -> str:
+        """The latency summary as a table."""
+        lines = [f"{'span':<28} {'count':>7} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}  (ms)"]
+        for name, summary in self.stats().items():
+            lines.append(f"{name:<28} {summary['count']:>7} {summary['mean_ms']:>9.2f} {summary['p50_ms']:>9.2f} "
+                         f"{summary['p90_ms']:>9.2f} {summary['p99_ms']:>9.2f} {summary['max_ms']:>9.2f}")
+        return "\n".join(lines)
+
+# Process-wide tracer of the search pipeline; set TRACE_EXPORT_PATH to also write traces to a file
+tracer = Tracer(SpanFileExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None)
\ No newline at end of file
@@ -1,7 +1,13 @@
 # Utility functions for the semantic search application
 import os
 import re
-from typing import List, Dict, Any
+from array import array
+from bisect import bisect_right
+from functools import partial
+from typing import List, Dict, Any, Iterator, TextIO
+
+import numpy as np
+
 from semantic_search.config import CHUNK_SIZE, CHUNK_OVERLAP
 
 def process_file(filepath: str) -> str:
@@ -14,6 +20,93 @@ def process_file(filepath: str) -> str:
     
     return content
 
+_WHITESPACE = re.compile(r'\s+')
+
+def _find_chunk_end(text: str, start: int, chunk_size: int) -> int:
+    """
+    Find where the chunk starting at `start` should end.
+    
+    Requires text to extend beyond start + chunk_size. Prefers the last sentence end
+    ('. ', '? ', '! ' in that order) in the second half of the window, then the last
+    space, and falls back to a hard cut at chunk_size.
+    """
+    end = start + chunk_size
+    
+    # Find the last period, question mark, or exclamation point before the end
+    # This helps create more natural chunk boundaries at sentence ends
+    for punctuation in ['. ', '? ', '! ']:
+        last_punct = text.rfind(punctuation, start, end)
+        if last_punct != -1 and last_punct > start + chunk_size // 2:
+            return last_punct + 1  # Include the punctuation
+    
+    # If no suitable punctuation found, try to find a space to break at
+    last_space = text.rfind(' ', start + 1, end + 1)
+    
+    # If we couldn't find a space, just use the original end
+    return last_space if last_space != -1 else end
+
+def _next_chunk_start(start: int, end: int, chunk_overlap: int) -> int:
+    """Move the start pointer, considering overlap, while always making progress."""
+    next_start = end - chunk_overlap
+    return next_start if next_start > start else end
+
+# Shortest text chunk_text builds a _BoundaryIndex for, and the prefix sampled for sentence ends
+_BOUNDARY_INDEX_MIN_LENGTH = 64 * 1024
+# Shortest chunk size it builds one for; below it, rescanning each window with rfind is as fast
+_BOUNDARY_INDEX_MIN_CHUNK_SIZE = 2000
+
+def _use_boundary_index(text: str, chunk_size: int) -> bool:
+    """
+    Whether a text is long, split into long chunks and averages fewer than one sentence end per chunk.
+    
+    Those windows fail all three sentence-end searches before falling back to a
+    space, which is the only case where _BoundaryIndex beats rescanning.
+    """
+    if len(text) < _BOUNDARY_INDEX_MIN_LENGTH or chunk_size < _BOUNDARY_INDEX_MIN_CHUNK_SIZE:
+        return False
+    sample = _BOUNDARY_INDEX_MIN_LENGTH
+    sentence_ends = sum(text.count(punctuation, 0, sample) for punctuation in ['. ', '? ', '! '])
+    return sentence_ends < sample // chunk_size
+
+class _BoundaryIndex:
+    """
+    Sorted offsets of sentence ends and spaces in a whitespace-normalized text.
+    
+    Built with one vectorized scan, so each chunk boundary is a handful of binary
+    searches instead of rescanning the window. Chunk ends never move backwards,
+    so every search starts from the previous answer.
+    """
+    
+    def __init__(self, text: str):
+        codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        spaces = np.flatnonzero(codes == ord(' '))
+        before_space = spaces[spaces > 0] - 1
+        # Offsets of the punctuation in '. ', '? ' and '! ', in order of preference, then of spaces
+        self.offsets = [array('q', before_space[codes[before_space] == ord(mark)].tobytes()) for mark in '.?!']
+        self.offsets.append(array('q', spaces.tobytes()))
+        self._lower_bounds = [0] * len(self.offsets)
+    
+    def chunk_end(self, start: int, chunk_size: int) -> int:
+        """Same boundary as _find_chunk_end(text, start, chunk_size); starts must not decrease."""
+        end = start + chunk_size
+        offsets, lower_bounds = self.offsets, self._lower_bounds
+        
+        for slot in range(3):
+            # Last sentence end that fits in the window, i.e. text.rfind(mark + ' ', start, end)
+            i = bisect_right(offsets[slot], end - 2, lower_bounds[slot]) - 1
+            if i >= 0:
+                lower_bounds[slot] = i
+                if offsets[slot][i] > start + chunk_size // 2:
+                    return offsets[slot][i] + 1
+        
+        # Last space in (start, end], i.e. text.rfind(' ', start + 1, end + 1)
+        i = bisect_right(offsets[3], end, lower_bounds[3]) - 1
+        if i >= 0:
+            lower_bounds[3] = i
+            if offsets[3][i] > start:
+                return offsets[3][i]
+        return end
+
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, 
                chunk_overlap: int = CHUNK_OVERLAP) -> List[str]:
     """Split text into chunks with overlap."""
@@ -21,78 +114,105 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE,
         return []
     
     # Clean the text - replace multiple whitespace with single space
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = ' '.join(text.split())
+    if not text:
+        return []
     
     # If text is shorter than chunk_size, return it as is
     if len(text) <= chunk_size:
         return [text]
     
+    if _use_boundary_index(text, chunk_size):
+        chunk_end = _BoundaryIndex(text).chunk_end
+    else:
+        chunk_end = partial(_find_chunk_end, text)
     chunks = []
     start = 0
     
-    # For very large texts, print progress
-    total_length = len(text)
-    is_large_text = total_length > 100000  # About 100KB
+    while True:
+        # Adjust the end to avoid cutting words in half
+        end = chunk_end(start, chunk_size) if start + chunk_size < len(text) else len(text)
+        chunks.append(text[start:end].strip())
+        
+        if end >= len(text):
+            return chunks
+        
+        # Move the start pointer, considering overlap
+        start = _next_chunk_start(start, end, chunk_overlap)
+
+def iter_chunks(stream: TextIO, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                read_size: int = None) -> Iterator[str]:
+    """
+    Lazily split a text stream into the same chunks as chunk_text.
     
-    if is_large_text:
-        print(f"Processing large text ({total_length} characters)...")
+    Whitespace is normalized incrementally while reading, and only the text from
+    the current chunk start onwards is buffered, so memory is bounded by
+    chunk_size plus read_size (4 * chunk_size by default) rather than the file size.
+    """
+    read_size = read_size or chunk_size * 4
+    buffer = ''
+    start = 0  # Chunk start, relative to the buffer
+    seen_text = False  # Whether any non-whitespace text has been read
+    pending_space = False  # Whitespace read after the last text, not yet added to the buffer
+    eof = False
     
-    while start < len(text):
-        # Get the current chunk
-        end = start + chunk_size
-        
-        # Adjust the end to avoid cutting words in half
-        if end < len(text):
-            # Find the last period, question mark, or exclamation point before the end
-            # This helps create more natural chunk boundaries at sentence ends
-            for punctuation in ['. ', '? ', '! ']:
-                last_punct = text.rfind(punctuation, start, end)
-                if last_punct != -1 and last_punct > start + chunk_size // 2:
-                    end = last_punct + 1  # Include the punctuation
-                    break
+    while True:
+        # Read until the window and the character after it are buffered, or the stream ends
+        while not eof and len(buffer) <= start + chunk_size:
+            block = stream.read(read_size)
+            if not block:
+                eof = True
+                break
             
-            # If no suitable punctuation found, try to find a space
-            if end == start + chunk_size:
-                # Try to find a space to break at
-                while end > start and text[end] != ' ':
-                    end -= 1
-                
-                # If we couldn't find a space, just use the original end
-                if end == start:
-                    end = start + chunk_size
-        else:
-            end = len(text)
+            block = _WHITESPACE.sub(' ', block)
+            if block.startswith(' '):
+                pending_space = seen_text
+                block = block[1:]
+            if not block:
+                continue
+            trailing_space = block.endswith(' ')
+            if trailing_space:
+                block = block[:-1]
+            if block:
+                buffer += (' ' if pending_space else '') + block
+                seen_text = True
+            pending_space = trailing_space
         
-        # Add the chunk to the list
-        chunks.append(text[start:end].strip())
+        if start >= len(buffer):
+            return
         
-        # Move the start pointer, considering overlap
-        start = end - chunk_overlap
+        if start + chunk_size < len(buffer):
+            end = _find_chunk_end(buffer, start, chunk_size)
+        else:
+            end = len(buffer)
         
-        # Handle edge case where overlap is larger than the end of text
-        if start < 0:
-            break
+        yield buffer[start:end].strip()
         
-        # Print progress for large texts
-        if is_large_text and len(chunks) % 10 == 0:
-            progress = min(100, round((end / total_length) * 100))
-            print(f"Chunking progress: {progress}% ({len(chunks)} chunks created)")
-    
-    if is_large_text:
-        print(f"Chunking complete. Created {len(chunks)} chunks.")
-    
-    return chunks
+        if eof and end >= len(buffer):
+            return
+        
+        # Drop text before the next chunk start
+        start = _next_chunk_start(start, end, chunk_overlap)
+        buffer = buffer[start:]
+        start = 0
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of tokens in a text (about 4 characters per token)."""
+    return len(text) // 4 + 1
 
 def create_metadata(filepath: str, chunk_id: int, total_chunks: int) -> Dict[str, Any]:
-    """Create metadata for a document chunk."""
+    """Create metadata for a document chunk; `modified` is the file's modification time in epoch seconds."""
     filename = os.path.basename(filepath)
-    return {
+    metadata = {
         "source": filepath,
         "filename": filename,
         "chunk_id": chunk_id,
         "total_chunks": total_chunks,
         "file_ext": os.path.splitext(filename)[1]
     }
+    if os.path.exists(filepath):
+        metadata["modified"] = int(os.path.getmtime(filepath))
+    return metadata
 
 def format_search_results(results: Dict, query: str) -> str:
     """Format search results for display."""
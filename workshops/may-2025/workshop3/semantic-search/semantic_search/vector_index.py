@@ -0,0 +1,709 @@
+# In-process vector index: a dependency-light alternative to ChromaDB
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from semantic_search.ann import IVFPQ, adc_distances, default_subspaces
+from semantic_search.config import (
+    LOCAL_ANN_NPROBE, LOCAL_ANN_RESCORE_FACTOR, LOCAL_ANN_TRAINING_SAMPLE, LOCAL_FILTER_GATHER_FRACTION,
+    LOCAL_QUANTIZED_RESCORE_COPY, LOCAL_QUANTIZED_RESCORE_FACTOR, LOCAL_QUERY_BLOCK_ROWS, LOCAL_VECTOR_DTYPE,
+)
+from semantic_search.filters import FilterIndex, normalize_where
+
+METRICS = ('cosine', 'l2', 'ip')
+# Storage types of new collections; collections created as float16 by earlier versions still open and write
+DTYPES = ('float32', 'int8')
+
+class VectorSegment:
+    """
+    Append-only slice of a collection: the vectors, IDs and records of one write.
+
+    Vectors are kept in an (n, d) float32 or int8 matrix, with their L2 norms
+    alongside, so cosine, inner product and squared L2 distances all come from
+    one matrix product. int8 rows are scaled per vector (x is stored as
+    round(x / scale) with scale = max|x| / 127) and scored directly, a quarter
+    of the bytes of float32. Optionally a float32 copy is written to a
+    separate file and read only for the rows being rescored; without it
+    distances and embeddings are the dequantized ones. IDs are one UTF-8 blob with offsets, and documents and
+    metadatas one JSON line per row, read by offset only for the rows a caller
+    asks for. On disk every array is a .npy file that is memory-mapped when
+    loaded; only the deletion bitmap is read into memory.
+
+    Once the collection has an IVF-PQ index, each segment also stores the
+    list and PQ codes of its rows for that index version; the codes are
+    grouped by list in memory on first use, so a probed list is one slice.
+
+    Metadata is also indexed for where filters (see FilterIndex) when the
+    segment is written; segments written before that build the index from
+    their records the first time they are filtered.
+    """
+
+    ARRAYS = ('vectors', 'norms', 'id_blob', 'id_offsets', 'record_offsets')
+    # Per-vector int8 scales, and the float32 copy of quantized vectors
+    OPTIONAL_ARRAYS = ('scales', 'full_vectors')
+    # Compact rows are converted to float32 this many at a time, into a buffer that stays in cache
+    CONVERT_ROWS = 256
+
+    def __init__(self, path: str, arrays: Dict[str, np.ndarray], deleted: Optional[np.ndarray] = None):
+        self.path = path
+        self.name = os.path.basename(path)
+        for key in self.ARRAYS:
+            setattr(self, key, arrays[key])
+        for key in self.OPTIONAL_ARRAYS:
+            setattr(self, key, arrays.get(key))
+        self.num_rows = len(self.norms)
+        self.deleted = deleted if deleted is not None else np.zeros(self.num_rows, dtype=bool)
+        self._records = None
+        self.ann_lists = self.ann_codes = None
+        self._inverted_lists = None
+        self._filter_index = None
+
+    @classmethod
+    def write(cls, path: str, ids: Sequence[str], vectors: np.ndarray, documents: Sequence[Optional[str]],
+              metadatas: Sequence[Optional[Dict[str, Any]]], dtype: str,
+              rescore_copy: bool = False) -> 'VectorSegment':
+        """Write a new segment and open it, with a float32 copy of quantized vectors if `rescore_copy`."""
+        # A directory left by an interrupted write was never listed in the manifest
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        encoded_ids = [doc_id.encode('utf-8') for doc_id in ids]
+        lines = [(json.dumps({'document': document, 'metadata': metadata}) + '\n').encode('utf-8')
+                 for document, metadata in zip(documents, metadatas)]
+        arrays = {
+            'vectors': vectors.astype(dtype),
+            'norms': np.linalg.norm(vectors, axis=1).astype(np.float32),
+            'id_blob': np.frombuffer(b''.join(encoded_ids), dtype=np.uint8),
+            'id_offsets': np.concatenate([[0], np.cumsum([len(i) for i in encoded_ids])]).astype(np.int64),
+            'record_offsets': np.concatenate([[0], np.cumsum([len(line) for line in lines])]).astype(np.int64),
+        }
+        if dtype == 'int8':
+            scales = np.abs(vectors).max(axis=1, initial=0) / 127
+            scales[scales == 0] = 1
+            arrays['vectors'] = np.round(vectors / scales[:, None]).astype(np.int8)
+            arrays['scales'] = scales.astype(np.float32)
+        if dtype != 'float32' and rescore_copy:
+            arrays['full_vectors'] = vectors
+        with open(os.path.join(path, 'records.jsonl'), 'wb') as f:
+            f.writelines(lines)
+        FilterIndex.build(metadatas).save(path)
+        for key, array in arrays.items():
+            np.save(os.path.join(path, f"{key}.npy"), array)
+        segment = cls.load(path)
+        segment.save_deletions()
+        return segment
+
+    @classmethod
+    def load(cls, path: str, ann_version: Optional[int] = None) -> 'VectorSegment':
+        """Open a saved segment, memory-mapping its arrays, with its codes for IVF-PQ index `ann_version`."""
+        arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode='r') for key in cls.ARRAYS}
+        for key in cls.OPTIONAL_ARRAYS:
+            if os.path.exists(os.path.join(path, f"{key}.npy")):
+                arrays[key] = np.load(os.path.join(path, f"{key}.npy"), mmap_mode='r')
+        deleted = None
+        deleted_path = os.path.join(path, 'deleted.npy')
+        if os.path.exists(deleted_path):
+            deleted = np.unpackbits(np.load(deleted_path), count=len(arrays['norms'])).astype(bool)
+        segment = cls(path, arrays, deleted)
+        if ann_version is not None and os.path.exists(segment._codes_path(ann_version, 'codes')):
+            segment.ann_lists = np.load(segment._codes_path(ann_version, 'lists'), mmap_mode='r')
+            segment.ann_codes = np.load(segment._codes_path(ann_version, 'codes'), mmap_mode='r')
+        return segment
+
+    def save_deletions(self):
+        np.save(os.path.join(self.path, 'deleted.npy'), np.packbits(self.deleted))
+
+    @property
+    def encoded(self) -> bool:
+        return self.ann_codes is not None
+
+    def encode(self, quantizer: IVFPQ, version: int):
+        """Compute and store the IVF-PQ lists and codes of every row."""
+        self.save_codes(*quantizer.encode(self.full_vectors if self.full_vectors is not None else self.vectors),
+                        version)
+
+    def save_codes(self, lists: np.ndarray, codes: np.ndarray, version: int):
+        # Lists are written before codes and load() looks for the codes, so a partial write is never read
+        np.save(self._codes_path(version, 'lists'), lists)
+        np.save(self._codes_path(version, 'codes'), codes)
+        for name in os.listdir(self.path):
+            if name.startswith('ivf_') and not name.startswith(f"ivf_{version:06d}_"):
+                os.remove(os.path.join(self.path, name))
+        self.ann_lists, self.ann_codes = lists, codes
+        self._inverted_lists = None
+
+    def _codes_path(self, version: int, kind: str) -> str:
+        return os.path.join(self.path, f"ivf_{version:06d}_{kind}.npy")
+
+    def matching(self, where: Dict[str, Any]) -> np.ndarray:
+        """Mask of the rows, deleted or not, whose metadata matches a normalized where clause."""
+        if self._filter_index is None:
+            if FilterIndex.exists(self.path):
+                self._filter_index = FilterIndex.load(self.path)
+            else:
+                self._filter_index = FilterIndex.build([self.record(row)['metadata'] for row in range(self.num_rows)])
+                self._filter_index.save(self.path)
+        return self._filter_index.mask(where)
+
+    def ann_candidates(self, lists: np.ndarray, tables: np.ndarray, nlist: int,
+                       allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Live rows in the given IVF lists and their estimated distances from the lists' lookup tables.
+
+        With `allowed`, a mask of live rows, only those rows are returned.
+        """
+        if self._inverted_lists is None:
+            order = np.argsort(self.ann_lists, kind='stable')
+            offsets = np.searchsorted(np.asarray(self.ann_lists)[order], np.arange(nlist + 1))
+            self._inverted_lists = order, offsets, np.asarray(self.ann_codes)[order]
+        order, offsets, codes = self._inverted_lists
+        starts, lengths = offsets[lists], offsets[lists + 1] - offsets[lists]
+        # Positions of the probed lists' entries, and which probed list (lookup table) each belongs to
+        probed = np.repeat(np.arange(len(lists)), lengths)
+        positions = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        rows = order[positions]
+        live = ~self.deleted[rows] if allowed is None else allowed[rows]
+        return rows[live], adc_distances(tables, codes[positions[live]], probed[live])
+
+    def distances(self, rows: np.ndarray, query: np.ndarray, query_norm: float, metric: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact distances of some rows from a query, reading only those rows. Returns (rows sorted, distances)."""
+        rows = np.sort(rows)
+        return rows, distances_to((self.float_vectors(rows) @ query)[:, None], self.norms[rows],
+                                  np.array([query_norm]), metric)[:, 0]
+
+    def float_vectors(self, rows) -> np.ndarray:
+        """Full-precision vectors of some rows (dequantized if the segment has no float32 copy)."""
+        if self.full_vectors is not None:
+            return np.asarray(self.full_vectors[rows], dtype=np.float32)
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= np.asarray(self.scales[rows])[..., None]
+        return vectors
+
+    @property
+    def num_live(self) -> int:
+        return self.num_rows - int(self.deleted.sum())
+
+    def ids(self) -> List[str]:
+        blob = bytes(self.id_blob)
+        offsets = self.id_offsets.tolist()
+        return [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self.num_rows)]
+
+    def doc_id(self, row: int) -> str:
+        return bytes(self.id_blob[self.id_offsets[row]:self.id_offsets[row + 1]]).decode('utf-8')
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Document and metadata of a row."""
+        if self._records is None:
+            self._records = open(os.path.join(self.path, 'records.jsonl'), 'rb')
+        start, end = int(self.record_offsets[row]), int(self.record_offsets[row + 1])
+        self._records.seek(start)
+        return json.loads(self._records.read(end - start))
+
+    def close(self):
+        if self._records is not None:
+            self._records.close()
+            self._records = None
+
+    def top_k(self, queries: np.ndarray, query_norms: np.ndarray, n_results: int, metric: str,
+              block_rows: int, rescore_factor: int = LOCAL_QUANTIZED_RESCORE_FACTOR,
+              allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The `n_results` nearest live rows to each query, by exhaustive search.
+
+        The matrix is scanned in blocks of `block_rows`: one matrix product per
+        block scores every query, and argpartition keeps each query's best rows,
+        so memory stays bounded however large the segment is. For quantized
+        segments with a float32 copy the scan keeps `rescore_factor * n_results`
+        rows per query, which are then rescored from the copy.
+
+        With `allowed`, a mask of live rows (such as the rows matching a
+        filter), only those rows are candidates. When they are at most
+        LOCAL_FILTER_GATHER_FRACTION of the segment, only they are read and
+        scored; otherwise the scan masks out the others.
+
+        Returns (rows, distances), each of shape (queries, <= n_results), unsorted.
+        """
+        rescore = self.full_vectors is not None
+        n_candidates = n_results * rescore_factor if rescore else n_results
+        excluded = self.deleted if allowed is None else ~allowed
+        if allowed is not None and np.count_nonzero(allowed) <= self.num_rows * LOCAL_FILTER_GATHER_FRACTION:
+            selected = np.flatnonzero(allowed)
+            blocks = [(rows, rows) for rows in np.array_split(selected, max(1, -(-len(selected) // block_rows)))]
+        else:
+            blocks = [(slice(start, min(start + block_rows, self.num_rows)),
+                       np.arange(start, min(start + block_rows, self.num_rows)))
+                      for start in range(0, self.num_rows, block_rows)]
+        buffer = np.empty((min(self.CONVERT_ROWS, self.num_rows), queries.shape[1]), dtype=np.float32)
+        best_rows, best_distances = [np.empty((len(queries), 0), dtype=np.int64)], [np.empty((len(queries), 0))]
+        for index, rows in blocks:
+            if not len(rows):
+                continue
+            dots = self._dots(index, queries, buffer)
+            if self.scales is not None:
+                # Scale the (rows, queries) products rather than dequantizing the (rows, d) block
+                dots *= self.scales[index][:, None]
+            distances = distances_to(dots, self.norms[index], query_norms, metric).T
+            skipped = excluded[index]
+            if skipped.any():
+                distances[:, skipped] = np.inf
+            top = _smallest(distances, n_candidates)
+            best_rows.append(rows[top])
+            best_distances.append(np.take_along_axis(distances, top, axis=1))
+        rows, distances = np.concatenate(best_rows, axis=1), np.concatenate(best_distances, axis=1)
+        if not rescore or not rows.shape[1]:
+            return rows, distances
+
+        # Each candidate row is read and scored once, however many queries share it
+        unique, inverse = np.unique(rows, return_inverse=True)
+        exact = distances_to(self.float_vectors(unique) @ queries.T, self.norms[unique], query_norms, metric).T
+        distances = np.where(np.isfinite(distances),
+                             np.take_along_axis(exact, inverse.reshape(rows.shape), axis=1), np.inf)
+        top = _smallest(distances, n_results)
+        return np.take_along_axis(rows, top, axis=1), np.take_along_axis(distances, top, axis=1)
+
+    def _dots(self, index, queries: np.ndarray, buffer: np.ndarray) -> np.ndarray:
+        """(rows, queries) dot products of the stored vectors of a block (a slice or row numbers) with the queries."""
+        if self.vectors.dtype == np.float32:
+            return np.asarray(self.vectors[index]) @ queries.T
+        if not isinstance(index, slice):
+            return np.asarray(self.vectors[index], dtype=np.float32) @ queries.T
+        dots = np.empty((index.stop - index.start, len(queries)), dtype=np.float32)
+        for low in range(index.start, index.stop, len(buffer)):
+            high = min(low + len(buffer), index.stop)
+            np.copyto(buffer[:high - low], self.vectors[low:high], casting='unsafe')
+            dots[low - index.start:high - index.start] = buffer[:high - low] @ queries.T
+        return dots
+
+def _smallest(distances: np.ndarray, k: int) -> np.ndarray:
+    """Column indexes of the k smallest distances in each row (all of them when there are at most k), unsorted."""
+    if distances.shape[1] > k:
+        return np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+
+def distances_to(dots: np.ndarray, norms: np.ndarray, query_norms: np.ndarray, metric: str) -> np.ndarray:
+    """
+    Chroma-compatible distances from dot products of shape (rows, queries).
+
+    cosine: 1 - cosine similarity; ip: 1 - dot product; l2: squared Euclidean distance.
+    """
+    if metric == 'cosine':
+        denominator = norms[:, None] * query_norms[None, :]
+        return 1 - dots / np.where(denominator == 0, 1, denominator)
+    if metric == 'ip':
+        return 1 - dots
+    return np.maximum(norms[:, None] ** 2 - 2 * dots + query_norms[None, :] ** 2, 0)
+
+class LocalCollection:
+    """
+    Collection of vectors with IDs, documents and metadatas, searched exactly in process.
+
+    Implements the subset of ChromaDB's Collection API that this package uses
+    (add, upsert, delete, get, query, count), so SemanticSearch can run on it
+    unchanged; calls are serialized by a lock. Every write appends a segment,
+    and replaced or deleted rows are marked in their segment's deletion
+    bitmap. Segments are merged like a binary counter (a segment is merged
+    into the one before it while that one is no larger), which keeps O(log n)
+    segments and rewrites each row O(log n) times. collection.json, replaced
+    atomically, lists the live segments, so a crash mid-write leaves the
+    previous state readable.
+
+    Search is exact until build_ann_index() trains an IVF-PQ index (see
+    semantic_search.ann); queries then scan the `nprobe` IVF lists nearest to
+    them by PQ codes and rescore the best `rescore_factor * n_results`
+    candidates exactly from the stored vectors, so only those rows are read
+    from disk. Later writes and merges encode their rows with the trained
+    quantizers, so adds never trigger a rebuild; a segment without codes
+    (left by an interrupted build) is searched exactly.
+
+    query() and get() take ChromaDB where clauses (see
+    semantic_search.filters), evaluated on each segment's metadata index into
+    a row mask before any vector is scored. Segments where the filter keeps
+    few rows are searched exactly over just those rows, since probing a few
+    IVF lists would find few of them; elsewhere the mask is applied to the
+    scan or to the IVF-PQ shortlist.
+    """
+
+    def __init__(self, path: str, name: str, metric: str = 'cosine', dtype: str = LOCAL_VECTOR_DTYPE,
+                 block_rows: int = LOCAL_QUERY_BLOCK_ROWS, rescore_copy: bool = LOCAL_QUANTIZED_RESCORE_COPY):
+        """
+        Open the collection stored in `path`, or create it with the given metric and storage dtype.
+
+        `rescore_copy` (int8 only) also stores float32 vectors for exact rescoring, fixed at creation.
+        """
+        self.path = path
+        self.name = name
+        self.block_rows = block_rows
+        self._lock = threading.RLock()
+        manifest_path = os.path.join(path, 'collection.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        else:
+            if metric not in METRICS:
+                raise ValueError(f"Unknown metric {metric!r} (expected one of {', '.join(METRICS)})")
+            if np.dtype(dtype).name not in DTYPES:
+                raise ValueError(f"Unsupported vector dtype {dtype!r} (expected one of {', '.join(DTYPES)})")
+            manifest = {'metric': metric, 'dtype': np.dtype(dtype).name, 'rescore_copy': bool(rescore_copy),
+                        'dimensions': None, 'segments': [], 'next_segment': 0}
+            os.makedirs(path, exist_ok=True)
+        self.metric = manifest['metric']
+        self.dtype = manifest['dtype']
+        # Quantized collections created before the copy was optional always kept one
+        self.rescore_copy = manifest.get('rescore_copy', True)
+        self.dimensions = manifest['dimensions']
+        self._next_segment = manifest['next_segment']
+        # {'version', 'nlist', 'subspaces'} of the IVF-PQ index, once one is built
+        self.ann = manifest.get('ann')
+        self.nprobe = LOCAL_ANN_NPROBE
+        self.rescore_factor = LOCAL_ANN_RESCORE_FACTOR
+        self.quantized_rescore_factor = LOCAL_QUANTIZED_RESCORE_FACTOR
+        ann_version = self.ann['version'] if self.ann else None
+        self._quantizer = IVFPQ.load(self._ann_path(ann_version), self.metric == 'cosine') if self.ann else None
+        self.segments = [VectorSegment.load(os.path.join(path, name), ann_version) for name in manifest['segments']]
+        self._locations = {}
+        for segment in self.segments:
+            for row, doc_id in enumerate(segment.ids()):
+                if not segment.deleted[row]:
+                    # After an interrupted replace, the newer row wins
+                    self._mark_deleted([doc_id])
+                    self._locations[doc_id] = (segment, row)
+        if not os.path.exists(manifest_path):
+            self._save_manifest()
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return {'hnsw:space': self.metric}
+
+    def count(self) -> int:
+        return len(self._locations)
+
+    def add(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]],
+            documents: Sequence[str] = None, metadatas: Sequence[Dict[str, Any]] = None):
+        """Add new rows; IDs that already exist are left unchanged."""
+        with self._lock:
+            keep = [i for i, doc_id in enumerate(ids) if doc_id not in self._locations]
+            self._write(ids, embeddings, documents, metadatas, keep)
+
+    def upsert(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]],
+               documents: Sequence[str] = None, metadatas: Sequence[Dict[str, Any]] = None):
+        """Add rows, replacing those whose IDs already exist."""
+        with self._lock:
+            self._write(ids, embeddings, documents, metadatas, range(len(ids)))
+
+    def delete(self, ids: Sequence[str] = None):
+        """Delete rows by ID."""
+        with self._lock:
+            touched = {segment for segment, _ in self._mark_deleted(ids or [])}
+            for segment in touched:
+                segment.save_deletions()
+
+    def get(self, ids: Sequence[str] = None, where: Dict[str, Any] = None, limit: int = None, offset: int = None,
+            include: Sequence[str] = ('documents', 'metadatas')) -> Dict[str, Any]:
+        """
+        Rows by ID (missing IDs are skipped), or all live rows in insertion order, paged by limit and offset.
+
+        With `where`, only rows whose metadata matches the clause are returned.
+        """
+        with self._lock:
+            return self._get(ids, where, limit, offset, include)
+
+    def _get(self, ids, where, limit, offset, include) -> Dict[str, Any]:
+        masks = self._filter_masks(where) if where else None
+        if ids is not None:
+            locations = [(doc_id, self._locations[doc_id]) for doc_id in ids if doc_id in self._locations]
+            if masks is not None:
+                locations = [(doc_id, (segment, row)) for doc_id, (segment, row) in locations if masks[segment][row]]
+        else:
+            start = offset or 0
+            stop = None if limit is None else start + limit
+            locations = list(self._iter_live(start, stop, masks))
+        result = {'ids': [doc_id for doc_id, _ in locations]}
+        result.update(self._include([location for _, location in locations], include))
+        return result
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10,
+              include: Sequence[str] = ('documents', 'metadatas', 'distances'), where: Dict[str, Any] = None,
+              nprobe: int = None, exact: bool = False) -> Dict[str, Any]:
+        """
+        The `n_results` nearest rows to each query embedding, nearest first, in ChromaDB's result shape.
+
+        With `where`, only rows whose metadata matches the clause are searched.
+        With an IVF-PQ index, `nprobe` (default: the collection's) is the number
+        of lists scanned per query, and exact=True bypasses the index.
+        """
+        with self._lock:
+            return self._query(query_embeddings, n_results, include, where, nprobe or self.nprobe, exact)
+
+    def _query(self, query_embeddings, n_results, include, where, nprobe, exact) -> Dict[str, Any]:
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        query_norms = np.linalg.norm(queries, axis=1)
+        segments = [segment for segment in self.segments if segment.num_live]
+        allowed = {}
+        if where:
+            allowed = {segment: mask & ~segment.deleted for segment, mask in self._filter_masks(where).items()}
+            segments = [segment for segment in segments if allowed[segment].any()]
+        if self._quantizer is not None and not exact:
+            # Rows of a selective filter are scored exactly rather than looked for in a few IVF lists
+            selective = {segment for segment, mask in allowed.items()
+                         if np.count_nonzero(mask) <= segment.num_rows * LOCAL_FILTER_GATHER_FRACTION}
+            approximate = [segment for segment in segments if segment.encoded and segment not in selective]
+            exhaustive = [segment for segment in segments if segment not in approximate]
+            per_query = [self._ann_candidates(query, query_norm, n_results, nprobe, approximate, allowed)
+                         for query, query_norm in zip(queries, query_norms)]
+        else:
+            exhaustive, per_query = segments, [[] for _ in queries]
+        candidates = [segment.top_k(queries, query_norms, n_results, self.metric, self.block_rows,
+                                    self.quantized_rescore_factor, allowed.get(segment))
+                      for segment in exhaustive]
+
+        result = {key: [] for key in ['ids', *include]}
+        for q in range(len(queries)):
+            found = per_query[q] + [(float(distance), segment, int(row))
+                                    for segment, (rows, distances) in zip(exhaustive, candidates)
+                                    for row, distance in zip(rows[q], distances[q]) if np.isfinite(distance)]
+            found.sort(key=lambda item: item[0])
+            found = found[:n_results]
+            result['ids'].append([segment.doc_id(row) for _, segment, row in found])
+            if 'distances' in include:
+                result['distances'].append([distance for distance, _, _ in found])
+            for key, values in self._include([(segment, row) for _, segment, row in found],
+                                             [key for key in include if key != 'distances']).items():
+                result[key].append(values)
+        return result
+
+    def _ann_candidates(self, query: np.ndarray, query_norm: float, n_results: int, nprobe: int,
+                        segments: List[VectorSegment], allowed: Dict[VectorSegment, np.ndarray]
+                        ) -> List[Tuple[float, VectorSegment, int]]:
+        """
+        Approximate neighbours of one query: the PQ shortlist of the probed lists, rescored exactly.
+
+        Segments in `allowed` only contribute the rows of their mask.
+        """
+        if not segments:
+            return []
+        lists = self._quantizer.probe(query, nprobe)
+        tables = self._quantizer.lookup_tables(query, lists)
+        shortlisted = [(segment, *segment.ann_candidates(lists, tables, self._quantizer.nlist, allowed.get(segment)))
+                       for segment in segments]
+        estimates = np.concatenate([estimated for _, _, estimated in shortlisted] + [np.empty(0)])
+        shortlist = n_results * self.rescore_factor
+        threshold = np.partition(estimates, shortlist - 1)[shortlist - 1] if len(estimates) > shortlist else np.inf
+        found = []
+        for segment, rows, estimated in shortlisted:
+            rows = rows[estimated <= threshold]
+            if len(rows):
+                rows, distances = segment.distances(rows, query, query_norm, self.metric)
+                found.extend((float(distance), segment, int(row)) for row, distance in zip(rows, distances))
+        return found
+
+    def build_ann_index(self, nlist: int = None, subspaces: int = None,
+                        sample_size: int = LOCAL_ANN_TRAINING_SAMPLE, seed: int = 0) -> Dict[str, int]:
+        """
+        Train an IVF-PQ index on a random sample of the collection and encode every row with it.
+
+        `nlist` defaults to 4 * sqrt(rows), at most one list per 39 training
+        vectors; `subspaces` (bytes per encoded vector) to about one per 8
+        dimensions. Rows written later are encoded as they arrive, so calling
+        this again is only needed to retrain after the data has drifted.
+        Returns the index settings.
+        """
+        with self._lock:
+            live = [np.flatnonzero(~segment.deleted) for segment in self.segments]
+            starts = np.cumsum([0] + [len(rows) for rows in live])
+            if not starts[-1]:
+                raise ValueError("Cannot build an ANN index for an empty collection")
+            picked = np.sort(np.random.default_rng(seed).choice(starts[-1], min(sample_size, starts[-1]), replace=False))
+            sample = np.concatenate([
+                segment.float_vectors(rows[picked[(picked >= start) & (picked < end)] - start])
+                for segment, rows, start, end in zip(self.segments, live, starts[:-1], starts[1:])])
+            if nlist is None:
+                nlist = max(1, min(int(4 * np.sqrt(starts[-1])), len(sample) // 39))
+            quantizer = IVFPQ.train(sample, nlist, subspaces or default_subspaces(self.dimensions),
+                                    normalize=self.metric == 'cosine', seed=seed)
+
+            previous = self.ann
+            version = previous['version'] + 1 if previous else 1
+            quantizer.save(self._ann_path(version))
+            for segment in self.segments:
+                segment.encode(quantizer, version)
+            self.ann = {'version': version, 'nlist': quantizer.nlist, 'subspaces': quantizer.subspaces}
+            self._quantizer = quantizer
+            self._save_manifest()
+            if previous:
+                shutil.rmtree(self._ann_path(previous['version']), ignore_errors=True)
+            return dict(self.ann)
+
+    def _ann_path(self, version: int) -> str:
+        return os.path.join(self.path, f"ivfpq_{version:06d}")
+
+    def _include(self, locations: List[Tuple[VectorSegment, int]], include: Sequence[str]) -> Dict[str, list]:
+        """Requested fields of rows."""
+        result = {}
+        if 'documents' in include or 'metadatas' in include:
+            records = [segment.record(row) for segment, row in locations]
+            if 'documents' in include:
+                result['documents'] = [record['document'] for record in records]
+            if 'metadatas' in include:
+                result['metadatas'] = [record['metadata'] for record in records]
+        if 'embeddings' in include:
+            result['embeddings'] = [segment.float_vectors(row) for segment, row in locations]
+        return result
+
+    def _filter_masks(self, where: Dict[str, Any]) -> Dict[VectorSegment, np.ndarray]:
+        """Each segment's mask of the rows matching a where clause."""
+        where = normalize_where(where)
+        return {segment: segment.matching(where) for segment in self.segments}
+
+    def _iter_live(self, start: int, stop: Optional[int], masks: Dict[VectorSegment, np.ndarray] = None
+                   ) -> Iterator[Tuple[str, Tuple[VectorSegment, int]]]:
+        position = 0
+        for segment in self.segments:
+            live = ~segment.deleted if masks is None else masks[segment] & ~segment.deleted
+            for row in np.flatnonzero(live):
+                if stop is not None and position >= stop:
+                    return
+                if position >= start:
+                    yield segment.doc_id(int(row)), (segment, int(row))
+                position += 1
+
+    def _mark_deleted(self, ids: Sequence[str]) -> List[Tuple[VectorSegment, int]]:
+        marked = []
+        for doc_id in ids:
+            location = self._locations.pop(doc_id, None)
+            if location is not None:
+                segment, row = location
+                segment.deleted[row] = True
+                marked.append(location)
+        return marked
+
+    def _write(self, ids, embeddings, documents, metadatas, keep):
+        """Append the rows at positions `keep` as a new segment, replacing earlier rows with the same IDs."""
+        # The last occurrence of a repeated ID wins
+        positions = list({ids[i]: i for i in keep}.values())
+        if not positions:
+            return
+        vectors = np.asarray([embeddings[i] for i in positions], dtype=np.float32)
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+        elif vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimensionality "
+                             f"{self.dimensions}")
+
+        self._next_segment += 1
+        segment = VectorSegment.write(
+            os.path.join(self.path, f"segment_{self._next_segment:06d}"),
+            [ids[i] for i in positions], vectors,
+            [documents[i] if documents is not None else None for i in positions],
+            [metadatas[i] if metadatas is not None else None for i in positions],
+            self.dtype, self.rescore_copy)
+        if self._quantizer is not None:
+            segment.encode(self._quantizer, self.ann['version'])
+        # List the new rows before marking the ones they replace, so that a crash never loses both
+        self.segments = self.segments + [segment]
+        self._save_manifest()
+        touched = {s for s, _ in self._mark_deleted([ids[i] for i in positions])}
+        for row, i in enumerate(positions):
+            self._locations[ids[i]] = (segment, row)
+        for s in touched:
+            s.save_deletions()
+
+        while len(self.segments) >= 2 and self.segments[-2].num_live <= self.segments[-1].num_live:
+            self._merge_last_two()
+        self._save_manifest()
+
+    def _merge_last_two(self):
+        """Rewrite the last two segments' live rows as one segment."""
+        first, second = self.segments[-2], self.segments[-1]
+        rows = [(segment, np.flatnonzero(~segment.deleted)) for segment in (first, second)]
+        ids, records = [], []
+        for segment, live in rows:
+            all_ids = segment.ids()
+            ids.extend(all_ids[row] for row in live)
+            records.extend(segment.record(int(row)) for row in live)
+        vectors = np.concatenate([segment.float_vectors(live) for segment, live in rows])
+
+        self._next_segment += 1
+        merged = VectorSegment.write(
+            os.path.join(self.path, f"segment_{self._next_segment:06d}"), ids, vectors,
+            [record['document'] for record in records], [record['metadata'] for record in records], self.dtype,
+            self.rescore_copy)
+        if self._quantizer is not None:
+            if first.encoded and second.encoded:
+                # Codes depend only on the vector, so they are carried over rather than recomputed
+                merged.save_codes(np.concatenate([np.asarray(segment.ann_lists)[live] for segment, live in rows]),
+                                  np.concatenate([np.asarray(segment.ann_codes)[live] for segment, live in rows]),
+                                  self.ann['version'])
+            else:
+                merged.encode(self._quantizer, self.ann['version'])
+        for row, doc_id in enumerate(ids):
+            self._locations[doc_id] = (merged, row)
+        self.segments = self.segments[:-2] + [merged]
+        self._save_manifest()
+        for segment in (first, second):
+            segment.close()
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    def _save_manifest(self):
+        manifest_path = os.path.join(self.path, 'collection.json')
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'metric': self.metric, 'dtype': self.dtype, 'rescore_copy': self.rescore_copy,
+                       'dimensions': self.dimensions,
+                       'segments': [segment.name for segment in self.segments],
+                       'next_segment': self._next_segment, 'ann': self.ann}, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+class LocalClient:
+    """
+    Collections of a LocalCollection store, with the part of ChromaDB's client API this package uses.
+
+    Collections live in subdirectories of `path`; get_or_create_collection()
+    reads the distance metric from metadata={"hnsw:space": ...} like ChromaDB.
+    """
+
+    def __init__(self, path: str, dtype: str = LOCAL_VECTOR_DTYPE, rescore_copy: bool = LOCAL_QUANTIZED_RESCORE_COPY):
+        self.path = path
+        self.dtype = dtype
+        self.rescore_copy = rescore_copy
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def get_or_create_collection(self, name: str, metadata: Dict[str, Any] = None) -> LocalCollection:
+        with self._lock:
+            if name not in self._collections:
+                metric = (metadata or {}).get('hnsw:space', 'l2')
+                os.makedirs(os.path.join(self.path, name), exist_ok=True)
+                self._collections[name] = LocalCollection(os.path.join(self.path, name), name, metric, self.dtype,
+                                                          rescore_copy=self.rescore_copy)
+            return self._collections[name]
+
+    def get_collection(self, name: str) -> LocalCollection:
+        if not os.path.exists(os.path.join(self.path, name, 'collection.json')) and name not in self._collections:
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name)
+
+    def list_collections(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.path)
+                      if os.path.exists(os.path.join(self.path, name, 'collection.json')))
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
\ No newline at end of file
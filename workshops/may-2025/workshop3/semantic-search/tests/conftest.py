@@ -0,0 +1,16 @@
+import pytest
+
+from semantic_search.embedding import EmbeddingGenerator
+from semantic_search.stub_server import StubEmbeddingServer
+
+@pytest.fixture
+def embedding_server():
+    """Local fake embeddings endpoint."""
+    with StubEmbeddingServer(dimensions=8) as server:
+        yield server
+
+@pytest.fixture
+def embedder(embedding_server):
+    """Embedding generator pointed at the local fake endpoint."""
+    with EmbeddingGenerator(api_key="test", base_url=embedding_server.base_url, use_cache=False) as embedder:
+        yield embedder
@@ -0,0 +1,53 @@
+from semantic_search.cache import EmbeddingCache
+from semantic_search.embedding import EmbeddingGenerator, EmbeddingStats
+
+def test_cache_round_trip_and_counters(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    cache.put_many("model", ["hello world"], [[0.5, -0.25]])
+
+    assert cache.get("model", "hello   world\n") == [0.5, -0.25]  # whitespace is normalized
+    assert cache.get("other-model", "hello world") is None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+def test_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path).put_many("model", ["a", "b"], [[1.0], [2.0]])
+
+    cache = EmbeddingCache(path)
+    assert cache.get_many("model", ["b", "c", "a"]) == [[2.0], None, [1.0]]
+    assert cache.stats["entries"] == 2
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=10, memory_entries=0)
+    texts = [f"text {i}" for i in range(10)]
+    cache.put_many("model", texts, [[float(i)] for i in range(10)])
+    cache.get("model", "text 0")  # Refresh the oldest entry
+
+    cache.put_many("model", ["text 10"], [[10.0]])
+
+    assert cache.stats["entries"] == 9
+    assert cache.get("model", "text 0") == [0.0]
+    assert cache.get("model", "text 10") == [10.0]
+
+def test_generator_skips_cached_texts(embedding_server, tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    with EmbeddingGenerator(api_key="test", base_url=embedding_server.base_url, cache=cache) as embedder:
+        texts = [f"chunk number {i}" for i in range(20)]
+
+        first = embedder.embed_documents(texts, max_inputs=8)
+        stats = EmbeddingStats()
+        second = embedder.embed_documents(texts + ["a new chunk"], max_inputs=8, stats=stats)
+
+        assert second[:20] == first
+        assert embedding_server.input_count == 21
+        assert stats.requests == 1 and stats.cached == 20
+        assert embedder.get_embedding("chunk number 3") == first[3]
+
+def test_shortened_embeddings_are_requested_and_cached_apart(embedding_server, tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    full = EmbeddingGenerator(api_key="test", base_url=embedding_server.base_url, cache=cache)
+    short = EmbeddingGenerator(api_key="test", base_url=embedding_server.base_url, cache=cache, dimensions=4)
+
+    assert len(full.get_embedding("text")) == 8
+    assert len(short.get_embedding("text")) == 4
+    assert embedding_server.request_count == 2
@@ -0,0 +1,76 @@
+import openai
+import pytest
+
+from semantic_search.embedding import EmbeddingGenerator, EmbeddingStats
+from semantic_search.search import SemanticSearch
+
+def test_pack_batches_respects_input_limit(embedder):
+    texts = ["chunk"] * 10
+    assert list(embedder.pack_batches(texts, max_inputs=4)) == [(0, 4), (4, 8), (8, 10)]
+
+def test_pack_batches_respects_token_budget(embedder):
+    # Each 40-character text is estimated at 11 tokens
+    texts = ["x" * 40] * 5
+    assert list(embedder.pack_batches(texts, max_inputs=100, max_tokens=25)) == [(0, 2), (2, 4), (4, 5)]
+
+def test_pack_batches_oversized_text_gets_own_request(embedder):
+    texts = ["short", "x" * 400, "short"]
+    assert list(embedder.pack_batches(texts, max_inputs=100, max_tokens=20)) == [(0, 1), (1, 2), (2, 3)]
+
+def test_embed_documents_uses_multi_input_requests(embedder, embedding_server):
+    texts = [f"chunk number {i}" for i in range(50)]
+    stats = EmbeddingStats()
+
+    embeddings = embedder.embed_documents(texts, max_inputs=16, stats=stats)
+
+    assert len(embeddings) == 50
+    assert embedding_server.request_count == 4
+    assert stats.chunks == 50 and stats.requests == 4
+    # Batched output matches single-input output and keeps input order
+    assert embeddings[7] == embedder.get_embedding(texts[7])
+
+def test_add_documents_batches_embedding_requests(embedder, embedding_server, tmp_path):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder)
+    documents = [f"document about topic {i}" for i in range(20)]
+
+    stats = searcher.add_documents(documents, max_inputs=8)
+
+    assert searcher.get_collection_count() == 20
+    assert stats.requests == 3
+    assert embedding_server.input_count == 20
+
+def test_embed_batches_keeps_requests_in_flight(embedding_server):
+    embedding_server.latency = 0.05
+    texts = [f"chunk number {i}" for i in range(40)]
+    with EmbeddingGenerator(api_key="test", base_url=embedding_server.base_url, max_in_flight=4,
+                            use_cache=False) as embedder:
+        embeddings = embedder.embed_documents(texts, max_inputs=5)
+        assert [embeddings[i] for i in (0, 21, 39)] == [embedder.get_embedding(texts[i]) for i in (0, 21, 39)]
+
+    assert embedding_server.max_concurrency == 4
+    # Closing the generator stops its worker threads
+    assert not any(thread.is_alive() for thread in embedder.executor._pool._threads)
+
+def test_rate_limited_requests_are_retried(embedding_server, embedder):
+    embedding_server.fail_requests = 2
+    embedder.executor.base_delay = 0.01
+
+    embeddings = embedder.embed_documents([f"chunk {i}" for i in range(10)], max_inputs=5)
+
+    assert len(embeddings) == 10
+    assert embedder.executor.retries == 2
+
+def test_non_retryable_errors_are_raised(embedding_server, embedder):
+    embedding_server.fail_requests = 1
+    embedding_server.fail_status = 400
+
+    with pytest.raises(openai.BadRequestError):
+        embedder.get_embeddings(["chunk"])
+
+def test_embedding_dimension_comes_from_the_model_table(embedder, embedding_server):
+    assert embedder.get_embedding_dimension() == 1536
+    assert EmbeddingGenerator(api_key="test", model="text-embedding-3-large", use_cache=False).get_embedding_dimension() == 3072
+    assert EmbeddingGenerator(api_key="test", dimensions=256, use_cache=False).get_embedding_dimension() == 256
+    with pytest.raises(ValueError):
+        EmbeddingGenerator(api_key="test", model="custom-model", use_cache=False).get_embedding_dimension()
+    assert embedding_server.request_count == 0
@@ -0,0 +1,157 @@
+import os
+
+import pytest
+
+from semantic_search.ingestion import IngestionSession, collect_files
+from semantic_search.manifest import IngestionManifest
+from semantic_search.search import SemanticSearch
+from semantic_search.utils import chunk_text
+
+def test_session_commits_in_batches(embedder, embedding_server, tmp_path):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder)
+
+    with IngestionSession(batch_size=10, searcher=searcher) as session:
+        for i in range(25):
+            session.add(f"chunk {i}", f"doc_{i}", {"chunk_id": i})
+        assert searcher.get_collection_count() == 20
+
+    assert searcher.get_collection_count() == 25
+    assert session.chunks_added == 25
+    assert embedding_server.request_count == 3
+
+
+def _ingest(searcher, file_path):
+    with IngestionSession(batch_size=4, searcher=searcher) as session:
+        session.prune_missing_files()
+        return session.add_file(str(file_path), chunk_text(file_path.read_text()))
+
+
+def test_unchanged_file_is_skipped(embedder, embedding_server, tmp_path):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path / "db"), embedder=embedder)
+    doc = tmp_path / "doc.txt"
+    doc.write_text(" ".join(f"Sentence number {i} is here." for i in range(60)))
+
+    first = _ingest(searcher, doc)
+    requests = embedding_server.request_count
+    assert first["status"] == "new"
+    assert searcher.get_collection_count() == first["embedded"]
+
+    second = _ingest(searcher, doc)
+    assert second["status"] == "unchanged"
+    assert embedding_server.request_count == requests
+
+
+def test_changed_file_embeds_only_changed_chunks(embedder, embedding_server, tmp_path):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path / "db"), embedder=embedder)
+    doc = tmp_path / "doc.txt"
+    sentences = [f"Sentence number {i} is here." for i in range(60)]
+    doc.write_text(" ".join(sentences))
+    first = _ingest(searcher, doc)
+
+    # Truncate the tail and edit the last remaining sentence
+    doc.write_text(" ".join(sentences[:30] + ["A brand new ending."]))
+    embedding_server.input_count = 0
+    second = _ingest(searcher, doc)
+
+    assert second["status"] == "changed"
+    assert second["skipped"] > 0
+    assert second["deleted"] > 0
+    assert second["embedded"] + second["skipped"] + second["deleted"] == first["embedded"]
+    assert embedding_server.input_count == second["embedded"]
+    assert searcher.get_collection_count() == second["embedded"] + second["skipped"]
+
+
+def test_removed_file_is_pruned(embedder, embedding_server, tmp_path):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path / "db"), embedder=embedder)
+    kept, removed = tmp_path / "kept.txt", tmp_path / "removed.txt"
+    kept.write_text("This file stays around.")
+    removed.write_text("This file is about to go away.")
+    _ingest(searcher, kept)
+    _ingest(searcher, removed)
+    assert searcher.get_collection_count() == 2
+
+    removed.unlink()
+    assert _ingest(searcher, kept)["status"] == "unchanged"
+    assert searcher.get_collection_count() == 1
+    assert IngestionManifest.for_collection("test", str(tmp_path / "db")).get(str(removed)) is None
+
+
+
+def test_file_is_recorded_only_after_its_chunks_are_written(embedder, embedding_server, tmp_path, monkeypatch):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path / "db"), embedder=embedder)
+    large, empty = tmp_path / "large.txt", tmp_path / "empty.txt"
+    large.write_text(" ".join(f"Sentence number {i} is here." for i in range(60)))
+    empty.write_text("")
+
+    session = IngestionSession(batch_size=1000, searcher=searcher)
+    session.add_file(str(large), chunk_text(large.read_text()))
+    # A file without chunks to write must not record the buffered chunks of earlier files
+    assert session.add_file(str(empty), [])["status"] == "new"
+    assert session.manifest.get(str(empty)) is not None
+    assert session.manifest.get(str(large)) is None
+
+    def failing_add_documents(*args, **kwargs):
+        raise ConnectionError("embeddings endpoint unreachable")
+    monkeypatch.setattr(searcher, "add_documents", failing_add_documents)
+    with pytest.raises(ConnectionError):
+        session.flush()
+    monkeypatch.undo()
+
+    assert session.manifest.get(str(large)) is None
+    assert searcher.get_collection_count() == 0
+    assert _ingest(searcher, large)["status"] == "new"
+
+
+def test_manifest_keeps_the_stat_of_the_ingested_content(embedder, embedding_server, tmp_path):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path / "db"), embedder=embedder)
+    doc = tmp_path / "doc.txt"
+    doc.write_text("The original content.")
+    read_mtime = os.stat(doc).st_mtime
+
+    with IngestionSession(batch_size=16, searcher=searcher) as session:
+        session.add_file(str(doc), chunk_text(doc.read_text()))
+        # Edited after it was read but before its chunks are written and recorded
+        doc.write_text("The edited content.")
+        os.utime(doc, (read_mtime + 10, read_mtime + 10))
+
+    entry = IngestionManifest.for_collection("test", str(tmp_path / "db")).get(str(doc))
+    assert entry["mtime"] == read_mtime
+    assert _ingest(searcher, doc)["status"] == "changed"
+
+def test_collect_files_expands_directories_and_globs(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "nested").mkdir()
+    for name in ["a/one.txt", "a/nested/two.txt", "a/skip.md", "three.txt"]:
+        (tmp_path / name).write_text("x")
+
+    files = collect_files([str(tmp_path / "a"), str(tmp_path / "*.txt"), str(tmp_path / "three.txt")])
+    assert files == sorted([str(tmp_path / "a" / "one.txt"), str(tmp_path / "a" / "nested" / "two.txt"),
+                            str(tmp_path / "three.txt")])
+
+
+def test_add_files_matches_serial_ingestion(embedder, embedding_server, tmp_path):
+    files = []
+    for i in range(6):
+        doc = tmp_path / f"doc{i}.txt"
+        doc.write_text(" ".join(f"File {i} sentence {j} is here." for j in range(20 + i)))
+        files.append(str(doc))
+
+    serial = SemanticSearch(collection_name="serial", persist_directory=str(tmp_path / "serial"), embedder=embedder)
+    with IngestionSession(batch_size=16, searcher=serial) as session:
+        for file_path in files:
+            session.add_file(file_path, chunk_text(open(file_path).read()))
+
+    parallel = SemanticSearch(collection_name="parallel", persist_directory=str(tmp_path / "parallel"),
+                              embedder=embedder)
+    with IngestionSession(batch_size=16, searcher=parallel) as session:
+        summaries = dict(session.add_files(files, workers=2))
+    assert [summaries[f]["status"] for f in files] == ["new"] * len(files)
+    assert parallel.collection.get()["ids"] == serial.collection.get()["ids"]
+    assert parallel.collection.get()["documents"] == serial.collection.get()["documents"]
+
+    requests = embedding_server.request_count
+    with IngestionSession(batch_size=16, searcher=parallel) as session:
+        summaries = dict(session.add_files(files + [str(tmp_path / "missing.txt")], workers=2))
+    assert {summaries[f]["status"] for f in files} == {"unchanged"}
+    assert summaries[str(tmp_path / "missing.txt")]["status"] == "error"
+    assert embedding_server.request_count == requests
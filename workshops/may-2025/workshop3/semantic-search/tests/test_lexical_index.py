@@ -0,0 +1,65 @@
+import numpy as np
+
+from semantic_search.bm25 import BM25Index
+from semantic_search.lexical_index import InvertedIndex
+
+DOCUMENTS = [f"Document {i} talks about topic {i % 7} and {'foxes' if i % 3 else 'dogs'}." for i in range(60)]
+IDS = [f"doc_{i}" for i in range(len(DOCUMENTS))]
+
+
+def _reference_top(query, documents, ids, n):
+    scores = BM25Index(documents).score(query)
+    order = [i for i in np.argsort(-scores, kind='stable') if scores[i] > 0][:n]
+    return [ids[i] for i in order], scores[order]
+
+
+def test_search_matches_bm25_over_the_whole_corpus(tmp_path):
+    index = InvertedIndex(str(tmp_path))
+    for start in range(0, len(DOCUMENTS), 16):
+        index.add(IDS[start:start + 16], DOCUMENTS[start:start + 16])
+
+    for query in ["topic 3 foxes", "dogs", "document 42", "topic topic 5"]:
+        ids, scores = index.search(query, 10)
+        expected_ids, expected_scores = _reference_top(query, DOCUMENTS, IDS, 10)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+        # Each returned ID carries its own corpus-level BM25 score (ties may come back in any order)
+        reference = BM25Index(DOCUMENTS).score(query)
+        np.testing.assert_allclose([reference[IDS.index(doc_id)] for doc_id in ids], scores, rtol=1e-5)
+
+
+def test_index_persists_replacements_and_deletions(tmp_path):
+    index = InvertedIndex(str(tmp_path))
+    index.add(IDS, DOCUMENTS)
+    index.add(["doc_5"], ["zebra crossing"])
+    index.delete(["doc_6"])
+    index.save()
+
+    reopened = InvertedIndex(str(tmp_path))
+    assert reopened.num_live_documents == len(DOCUMENTS) - 1
+    assert reopened.search("zebra", 5)[0] == ["doc_5"]
+    assert "doc_5" not in reopened.search("document 5", 60)[0]
+    assert "doc_6" not in reopened.search("document 6", 60)[0]
+
+
+def test_replace_false_keeps_existing_documents(tmp_path):
+    index = InvertedIndex(str(tmp_path))
+    index.add(["a"], ["original text"])
+    index.add(["a", "b"], ["replacement text", "other text"], replace=False)
+    assert index.search("original", 5)[0] == ["a"]
+    assert index.search("replacement", 5)[0] == []
+
+
+def test_segments_are_merged_without_changing_results(tmp_path):
+    index = InvertedIndex(str(tmp_path), max_segments=3)
+    for start in range(0, len(DOCUMENTS), 10):
+        index.add(IDS[start:start + 10], DOCUMENTS[start:start + 10])
+    index.delete(IDS[:5])
+    index.save()
+
+    merged = InvertedIndex(str(tmp_path))
+    assert len(merged.segments) == 1
+    assert merged.num_documents == len(DOCUMENTS) - 5
+    _, expected_scores = _reference_top("topic 4 dogs", DOCUMENTS[5:], IDS[5:], 8)
+    ids, scores = merged.search("topic 4 dogs", 8)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+    assert not set(ids) & set(IDS[:5])
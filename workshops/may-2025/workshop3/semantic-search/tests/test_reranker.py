@@ -0,0 +1,351 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from semantic_search.bm25 import BM25Index, tokenize
+from semantic_search.cli import load_profile
+from semantic_search.corpus_stats import CorpusStats
+from semantic_search.keywords import KeywordMatcher
+from semantic_search.lexical_index import InvertedIndex
+from semantic_search.reranker import ReRanker, RerankPipeline, parse_stages
+from semantic_search.results import ResultSet
+from semantic_search.search import SemanticSearch
+
+FIXTURE_QUERY = "vector database for semantic search"
+FIXTURE_DOCUMENTS = [
+    "A vector database stores embeddings and answers nearest neighbour queries.",
+    "Semantic search finds documents by meaning rather than exact keywords.",
+    "Lexical search ranks documents with BM25, a classic scoring function.",
+    "The database was migrated to a new server last week.",
+    "Vector search and semantic search both rely on embeddings of the query.",
+    "Cooking pasta requires boiling water and a pinch of salt.",
+    "Search engines combine lexical and vector signals for better ranking.",
+    "A semantic layer sits on top of the database for analytics.",
+]
+
+
+def _reference_bm25_rerank(query, results, k1=1.5, b=0.75):
+    """Substring-counting BM25 re-ranking that the vectorized version must reproduce on the fixture."""
+    documents = results['documents'][0]
+    original_scores = [1 - dist for dist in results['distances'][0]]
+    query_terms = query.lower().split()
+    doc_lengths = [len(doc.split()) for doc in documents]
+    avg_doc_length = sum(doc_lengths) / len(doc_lengths)
+    term_doc_counts = {term: sum(1 for doc in documents if term in doc.lower()) for term in query_terms}
+
+    bm25_scores = []
+    for i, doc in enumerate(documents):
+        score = 0
+        for term in query_terms:
+            if term_doc_counts[term] == 0:
+                continue
+            tf = doc.lower().count(term)
+            idf = np.log((len(documents) - term_doc_counts[term] + 0.5) / (term_doc_counts[term] + 0.5) + 1)
+            score += idf * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_lengths[i] / avg_doc_length))
+        bm25_scores.append(score)
+
+    if max(bm25_scores) > 0:
+        bm25_scores = [score / max(bm25_scores) for score in bm25_scores]
+    combined = [0.5 * bm25 + 0.5 * semantic for bm25, semantic in zip(bm25_scores, original_scores)]
+    order = sorted(range(len(combined)), key=lambda i: combined[i], reverse=True)
+    return order, [1 - combined[i] for i in order]
+
+
+def _results(documents, seed=0):
+    rng = random.Random(seed)
+    return {
+        'documents': [list(documents)],
+        'metadatas': [[{"chunk_id": i} for i in range(len(documents))]],
+        'distances': [[rng.uniform(0.2, 0.8) for _ in documents]],
+    }
+
+
+def test_bm25_rerank_matches_reference_on_fixture():
+    results = _results(FIXTURE_DOCUMENTS)
+    expected_order, expected_distances = _reference_bm25_rerank(FIXTURE_QUERY, results)
+
+    reranked = ReRanker().bm25_rerank(FIXTURE_QUERY, results)
+
+    assert reranked['documents'][0] == [FIXTURE_DOCUMENTS[i] for i in expected_order]
+    assert reranked['metadatas'][0] == [{"chunk_id": i} for i in expected_order]
+    assert reranked['distances'][0] == pytest.approx(expected_distances)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bm25_rerank_matches_reference_on_random_candidates(seed):
+    # No word is a substring of another, so substring and token counts agree
+    words = ["vector", "graph", "query", "index", "model", "cache", "shard", "token", "blob", "lake"]
+    rng = random.Random(seed)
+    documents = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 30))) for _ in range(200)]
+    query = " ".join(rng.choice(words) for _ in range(4))
+    results = _results(documents, seed)
+
+    expected_order, expected_distances = _reference_bm25_rerank(query, results)
+    reranked = ReRanker().bm25_rerank(query, results)
+
+    assert reranked['distances'][0] == pytest.approx(expected_distances)
+    assert reranked['documents'][0] == [documents[i] for i in expected_order]
+
+
+def test_bm25_counts_tokens_not_substrings():
+    index = BM25Index(["searching the index", "search the index"])
+    scores = index.score("search")
+    assert scores[0] == 0
+    assert scores[1] > 0
+
+
+def test_bm25_index_is_reused_across_queries():
+    reranker = ReRanker()
+    results = _results(FIXTURE_DOCUMENTS)
+    reranker.bm25_rerank("vector", results)
+    index = reranker._bm25_cached_index
+    reranker.bm25_rerank("database", results)
+    assert reranker._bm25_cached_index is index
+
+
+def test_bm25_handles_queries_without_matches():
+    index = BM25Index(FIXTURE_DOCUMENTS)
+    assert not index.score("zebra").any()
+    assert tokenize("Vector-Search, BM25!") == ["vector", "search", "bm25"]
+
+
+def _reference_mmr_order(relevance, vectors, diversity_factor):
+    """Pure-Python MMR over explicit pairwise cosine similarities."""
+    def cosine(a, b):
+        na, nb = np.linalg.norm(a), np.linalg.norm(b)
+        return 0 if na == 0 or nb == 0 else float(np.dot(a, b) / (na * nb))
+
+    selected = [max(range(len(relevance)), key=lambda i: relevance[i])]
+    remaining = [i for i in range(len(relevance)) if i != selected[0]]
+    while remaining:
+        scores = [(1 - diversity_factor) * relevance[i]
+                  - diversity_factor * max(cosine(vectors[i], vectors[j]) for j in selected) for i in remaining]
+        best = remaining[scores.index(max(scores))]
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+@pytest.mark.parametrize("diversity_factor", [0.0, 0.3, 0.7])
+def test_diversity_rerank_matches_reference_with_embeddings(diversity_factor):
+    rng = np.random.default_rng(1)
+    embeddings = rng.normal(size=(60, 16))
+    results = _results([f"document {i}" for i in range(60)])
+    results['embeddings'] = [embeddings]
+    relevance = [1 - d for d in results['distances'][0]]
+
+    expected = _reference_mmr_order(relevance, embeddings, diversity_factor)
+    reranked = ReRanker().diversity_rerank(results, diversity_factor)
+
+    assert reranked['metadatas'][0] == [{"chunk_id": i} for i in expected]
+
+
+def test_diversity_rerank_falls_back_to_bag_of_words():
+    results = _results(FIXTURE_DOCUMENTS)
+    words = sorted({w for doc in FIXTURE_DOCUMENTS for w in doc.lower().split()})
+    vectors = np.array([[1.0 if w in doc.lower().split() else 0.0 for w in words] for doc in FIXTURE_DOCUMENTS])
+    relevance = [1 - d for d in results['distances'][0]]
+
+    expected = _reference_mmr_order(relevance, vectors, 0.5)
+    reranked = ReRanker().diversity_rerank(results, 0.5)
+
+    assert reranked['documents'][0] == [FIXTURE_DOCUMENTS[i] for i in expected]
+
+
+def test_diversity_rerank_demotes_near_duplicates():
+    embeddings = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]])
+    results = {
+        'documents': [["a", "a again", "b"]],
+        'metadatas': [[{}, {}, {}]],
+        'distances': [[0.1, 0.11, 0.3]],
+        'embeddings': [embeddings],
+    }
+    reranked = ReRanker().diversity_rerank(results, 0.5)
+    assert reranked['documents'][0] == ["a", "b", "a again"]
+
+
+def test_search_returns_embeddings_for_diversity_rerank(embedder, tmp_path):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder)
+    searcher.add_documents(FIXTURE_DOCUMENTS, ids=[f"doc_{i}" for i in range(len(FIXTURE_DOCUMENTS))],
+                           metadatas=[{"chunk_id": i} for i in range(len(FIXTURE_DOCUMENTS))])
+
+    results = searcher.search(FIXTURE_QUERY, n_results=5, include_embeddings=True)
+    assert np.asarray(results['embeddings'][0]).shape == (5, 8)
+
+    reranked = ReRanker().diversity_rerank(results, 0.5)
+    assert sorted(reranked['documents'][0]) == sorted(results['documents'][0])
+
+
+def test_recency_rerank_reads_iso_dates_and_skips_undated():
+    results = {
+        'documents': [["old", "undated", "new", "epoch"]],
+        'metadatas': [[{"date": "2020-01-01"}, {}, {"date": "2024-01-01T00:00:00Z"}, {"timestamp": 1640995200}]],
+        'distances': [[0.3, 0.3, 0.3, 0.3]],
+    }
+    reranked = ReRanker().recency_rerank(results, recency_weight=0.5)
+    assert reranked['documents'][0] == ["new", "epoch", "old", "undated"]
+    assert reranked['distances'][0] == pytest.approx([0.15, 0.4, 0.65, 0.65], abs=0.001)
+
+    undated = {'documents': [["a"]], 'metadatas': [[{}]], 'distances': [[0.1]]}
+    assert ReRanker().recency_rerank(undated) is undated
+
+
+def test_recency_rerank_normalizes_over_corpus_date_range(tmp_path):
+    stats = CorpusStats(str(tmp_path / "stats.json"))
+    stats.add(["a", "b"], [{"date": "2000-01-01"}, {"date": "2020-01-01"}])
+    results = {
+        'documents': [["older", "newer"]],
+        'metadatas': [[{"date": "2019-01-01"}, {"date": "2020-01-01"}]],
+        'distances': [[0.1, 0.2]],
+    }
+    # Over the candidates' own range the newer one would win (0.63 vs 0.66)
+    reranked = ReRanker().recency_rerank(results, recency_weight=0.3, stats=stats)
+    assert reranked['documents'][0] == ["older", "newer"]
+
+
+def test_bm25_rerank_with_corpus_statistics(tmp_path):
+    index = InvertedIndex(str(tmp_path / "lexical"))
+    corpus = FIXTURE_DOCUMENTS + [f"filler text number {i} about the database" for i in range(40)]
+    index.add([f"doc_{i}" for i in range(len(corpus))], corpus)
+    stats = CorpusStats(str(tmp_path / "stats.json"), index)
+    stats.add(corpus)
+    results = _results(FIXTURE_DOCUMENTS)
+
+    reranked = ReRanker().bm25_rerank(FIXTURE_QUERY, results, stats=stats)
+
+    # Reference: candidate term frequencies with corpus IDF and average length
+    terms = tokenize(FIXTURE_QUERY)
+    n = len(corpus)
+    avg_length = np.mean([len(tokenize(doc)) for doc in corpus])
+    scores = []
+    for doc in FIXTURE_DOCUMENTS:
+        tokens = tokenize(doc)
+        score = 0
+        for term in terms:
+            df = sum(term in tokenize(other) for other in corpus)
+            tf = tokens.count(term)
+            idf = np.log((n - df + 0.5) / (df + 0.5) + 1)
+            score += idf * tf * 2.5 / (tf + 1.5 * (0.25 + 0.75 * len(tokens) / avg_length))
+        scores.append(score)
+    combined = 0.5 * np.array(scores) / max(scores) + 0.5 * (1 - np.array(results['distances'][0]))
+    order = np.argsort(-combined, kind='stable')
+    assert reranked['documents'][0] == [FIXTURE_DOCUMENTS[i] for i in order]
+    assert reranked['distances'][0] == pytest.approx(1 - combined[order])
+    assert index.document_frequencies(["database", "zebra"]).tolist() == [43, 0]
+
+
+def test_personalized_rerank_weights_keyword_counts():
+    results = _results(FIXTURE_DOCUMENTS)
+    profile = {"Vector": 2.0, "database": 1.0, "pasta": -1.0}
+    scores = [sum(doc.lower().count(k.lower()) * w for k, w in profile.items()) for doc in FIXTURE_DOCUMENTS]
+    combined = [0.7 * (1 - d) + 0.3 * s / max(scores) for d, s in zip(results['distances'][0], scores)]
+
+    reranked = ReRanker().personalized_rerank(results, profile)
+
+    order = sorted(range(len(combined)), key=lambda i: combined[i], reverse=True)
+    assert reranked['documents'][0] == [FIXTURE_DOCUMENTS[i] for i in order]
+    assert reranked['distances'][0] == pytest.approx([1 - combined[i] for i in order])
+
+
+def test_corpus_stats_follow_the_collection(embedder, tmp_path):
+    def open_searcher():
+        return SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder)
+
+    searcher = open_searcher()
+    ids = [f"doc_{i}" for i in range(len(FIXTURE_DOCUMENTS))]
+    dates = [{"date": f"2024-01-{i + 1:02d}"} for i in range(len(FIXTURE_DOCUMENTS))]
+    searcher.add_documents(FIXTURE_DOCUMENTS, ids=ids, metadatas=dates)
+    # Adding stored IDs again is a no-op; upserting replaces them
+    searcher.add_documents(FIXTURE_DOCUMENTS[:2], ids=ids[:2], metadatas=dates[:2])
+    searcher.add_documents(["short", "replacement"], ids=ids[:2], metadatas=dates[:2], upsert=True)
+    searcher.delete_documents(ids[-1:])
+    searcher.persist()
+
+    stats = open_searcher().corpus_stats
+    documents = ["short", "replacement"] + FIXTURE_DOCUMENTS[2:-1]
+    assert stats.num_documents == len(documents)
+    assert stats.total_length == sum(len(tokenize(doc)) for doc in documents)
+    assert (stats.timestamp_min, stats.timestamp_max) == (1704067200, 1704067200 + 7 * 86400)
+    assert searcher.collection.get(ids=["doc_0"], include=["metadatas"])['metadatas'][0]['timestamp'] == 1704067200
+
+    # The date range only tightens on a rebuild
+    assert open_searcher().rebuild_corpus_stats() == len(documents)
+    rebuilt = open_searcher().corpus_stats
+    assert (rebuilt.num_documents, rebuilt.total_length) == (stats.num_documents, stats.total_length)
+    assert rebuilt.timestamp_max == 1704067200 + 6 * 86400
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_keyword_matcher_counts_like_str_count(seed):
+    # A small alphabet makes keywords overlap, nest and repeat
+    rng = random.Random(seed)
+    profile = {"".join(rng.choice("abAB ") for _ in range(rng.randint(1, 5))): rng.uniform(-1, 2) for _ in range(300)}
+    documents = ["".join(rng.choice("abAB c") for _ in range(rng.randint(0, 200))) for _ in range(50)]
+
+    scores = KeywordMatcher(profile).scores(documents)
+
+    expected = [sum(doc.lower().count(keyword.lower()) * weight for keyword, weight in profile.items())
+                for doc in documents]
+    assert scores == pytest.approx(expected)
+
+
+def test_keyword_matchers_are_cached_by_profile(tmp_path):
+    matcher = KeywordMatcher.for_profile({"vector": 1.0, "search": 0.5})
+    assert KeywordMatcher.for_profile({"search": 0.5, "vector": 1.0}) is matcher
+    assert KeywordMatcher.for_profile({"search": 0.6, "vector": 1.0}) is not matcher
+
+    path = tmp_path / "profile.json"
+    path.write_text('{"vector": 1.0}')
+    profile = load_profile(str(path))
+    assert load_profile(str(path)) is profile
+    path.write_text('{"vector": 2.0}')
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert load_profile(str(path)) == {"vector": 2.0}
+
+
+def _dated_results(num_documents=40, seed=0):
+    rng = np.random.default_rng(seed)
+    words = ["vector", "search", "index", "pasta", "water", "query", "model", "cache"]
+    documents = [" ".join(rng.choice(words, size=rng.integers(3, 20))) for _ in range(num_documents)]
+    return {
+        'ids': [[f"doc_{i}" for i in range(num_documents)]],
+        'documents': [documents],
+        'metadatas': [[{"chunk_id": i, "timestamp": float(rng.integers(0, 10 ** 6))} for i in range(num_documents)]],
+        'distances': [rng.uniform(0.2, 0.8, num_documents).tolist()],
+        'embeddings': [rng.normal(size=(num_documents, 16)).astype(np.float32)],
+    }
+
+
+def test_pipeline_matches_chained_reranks():
+    results = _dated_results()
+    profile = {"pasta": 1.0, "vector": 0.5}
+    reranker = ReRanker()
+    chained = reranker.diversity_rerank(
+        reranker.personalized_rerank(
+            reranker.recency_rerank(reranker.bm25_rerank("vector search", results), 0.4), profile), 0.3)
+
+    pipeline = RerankPipeline("bm25 -> recency -> personalized -> diversity", diversity_factor=0.3,
+                              recency_weight=0.4, user_profile=profile)
+    reranked = pipeline.rerank("vector search", results)
+
+    assert reranked['ids'][0] == chained['ids'][0]
+    assert reranked['distances'][0] == pytest.approx(chained['distances'][0])
+    assert [metadata["chunk_id"] for metadata in reranked['metadatas'][0]] == [
+        int(doc_id.split("_")[1]) for doc_id in reranked['ids'][0]]
+    assert np.array_equal(reranked['embeddings'][0], results['embeddings'][0][[
+        int(doc_id.split("_")[1]) for doc_id in reranked['ids'][0]]])
+
+
+def test_pipeline_stages_only_permute_shared_columns():
+    results = _dated_results()
+    result_set = ResultSet.from_results(results)
+
+    reranked = RerankPipeline(["bm25", "recency", "diversity"]).run("vector", result_set)
+
+    assert reranked.documents is result_set.documents and reranked.metadatas is result_set.metadatas
+    assert sorted(reranked.order.tolist()) == list(range(40))
+    assert parse_stages("bm25,recency") == ["bm25", "recency"]
+    with pytest.raises(ValueError):
+        parse_stages("bm25,bogus")
@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+
+from semantic_search.embedding import EmbeddingGenerator
+from semantic_search.filters import normalize_where
+from semantic_search import cli, search as search_module
+from semantic_search.search import SemanticSearch, SearchStats, reciprocal_rank_fusion, truncate_embeddings
+from semantic_search.stub_server import StubEmbeddingServer
+
+DOCUMENTS = [f"Document {i} talks about topic {i % 7}." for i in range(40)]
+
+
+def _searcher(embedder, tmp_path):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder)
+    searcher.add_documents(DOCUMENTS, ids=[f"doc_{i}" for i in range(len(DOCUMENTS))])
+    return searcher
+
+
+def test_search_many_matches_search_in_input_order(embedder, tmp_path):
+    searcher = _searcher(embedder, tmp_path)
+    queries = [f"topic {i % 7} question {i}" for i in range(25)]
+
+    stats = SearchStats()
+    results = list(searcher.search_many(iter(queries), n_results=3, batch_size=4, stats=stats))
+
+    assert len(results) == len(queries)
+    for query, result in zip(queries, results):
+        single = searcher.search(query, n_results=3)
+        assert result['ids'] == single['ids']
+        assert result['documents'] == single['documents']
+    assert stats.queries == 25
+    assert [size for size, _, _ in stats.batches] == [4, 4, 4, 4, 4, 4, 1]
+
+
+def test_search_many_sends_one_embedding_request_per_batch(embedder, embedding_server, tmp_path):
+    searcher = _searcher(embedder, tmp_path)
+    requests = embedding_server.request_count
+
+    results = list(searcher.search_many((f"query {i}" for i in range(30)), n_results=2, batch_size=10))
+
+    assert len(results) == 30
+    assert embedding_server.request_count - requests == 3
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == 1 / 61 + 1 / 62
+
+
+def test_hybrid_search_surfaces_keyword_matches(embedder, tmp_path):
+    searcher = _searcher(embedder, tmp_path)
+    searcher.add_documents(["A zebra crossing near the station."], ids=["zebra"])
+
+    assert searcher.lexical_search("zebra", n_results=3)['ids'][0] == ["zebra"]
+    results = searcher.hybrid_search("zebra", n_results=3)
+    assert "zebra" in results['ids'][0]
+    assert results['documents'][0][results['ids'][0].index("zebra")] == "A zebra crossing near the station."
+    assert all(0 <= distance <= 1 for distance in results['distances'][0])
+
+
+def test_lexical_index_follows_writes_and_persists(embedder, tmp_path):
+    searcher = _searcher(embedder, tmp_path)
+    searcher.delete_documents(["doc_3"])
+    searcher.persist()
+
+    reopened = SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder)
+    assert reopened.lexical_index.num_live_documents == len(DOCUMENTS) - 1
+    assert "doc_3" not in reopened.lexical_search("document 3", n_results=40)['ids'][0]
+
+    assert reopened.rebuild_lexical_index(batch_size=7) == len(DOCUMENTS) - 1
+    assert reopened.lexical_search("Document 10", n_results=1)['ids'][0] == ["doc_10"]
+
+
+def test_two_stage_search_rescores_short_vector_candidates(tmp_path):
+    with StubEmbeddingServer(dimensions=64) as server, \
+            EmbeddingGenerator(api_key="test", base_url=server.base_url, use_cache=False) as embedder:
+        ids = [f"doc_{i}" for i in range(len(DOCUMENTS))]
+        full = SemanticSearch(collection_name="full", persist_directory=str(tmp_path), embedder=embedder)
+        full.add_documents(DOCUMENTS, ids=ids)
+        searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder,
+                                  short_dimensions=16)
+        searcher.add_documents(DOCUMENTS, ids=ids)
+        assert searcher.two_stage and searcher.short_collection.count() == len(DOCUMENTS)
+
+        # Short vectors are the renormalized prefix of the full ones, as the API returns for `dimensions`
+        stored = searcher.short_collection.get(ids=["doc_1"], include=["embeddings"])['embeddings'][0]
+        np.testing.assert_allclose(stored, truncate_embeddings([embedder.get_embedding(DOCUMENTS[1])], 16)[0],
+                                   rtol=1e-5, atol=1e-6)
+
+        # With a shortlist covering the collection the result equals a full-vector search
+        expected = full.search("topic 3", n_results=5)
+        result = searcher.search("topic 3", n_results=5, include_embeddings=True)
+        assert result['ids'] == expected['ids']
+        np.testing.assert_allclose(result['distances'], expected['distances'], rtol=1e-4, atol=1e-5)
+        assert len(result['embeddings'][0][0]) == 64
+
+        searcher.delete_documents(["doc_0"])
+        assert searcher.short_collection.count() == len(DOCUMENTS) - 1
+
+        # A collection filled without short vectors searches in one stage until they are rebuilt
+        late = SemanticSearch(collection_name="full", persist_directory=str(tmp_path), embedder=embedder,
+                              short_dimensions=16)
+        assert not late.two_stage
+        assert late.rebuild_short_vectors(batch_size=7) == len(DOCUMENTS)
+        assert late.two_stage and late.search("topic 3", n_results=5)['ids'] == expected['ids']
+
+
+def test_search_modes_filter_by_metadata(embedder, tmp_path):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder,
+                              short_dimensions=4)
+    metadatas = [{"topic": i % 7, "published": f"2025-01-{i % 28 + 1:02d}"} for i in range(len(DOCUMENTS))]
+    searcher.add_documents(DOCUMENTS, ids=[f"doc_{i}" for i in range(len(DOCUMENTS))], metadatas=metadatas)
+    assert searcher.two_stage
+
+    where = {"topic": {"$in": [2, 3]}}
+    for results in (searcher.search("topic 3", n_results=5, where=where),
+                    searcher.lexical_search("topic", n_results=5, where=where),
+                    searcher.hybrid_search("topic 3", n_results=5, where=where),
+                    next(searcher.search_many(["topic 3"], n_results=5, where=where))):
+        assert len(results['ids'][0]) == 5
+        assert all(metadata["topic"] in (2, 3) for metadata in results['metadatas'][0])
+
+    # Several fields combine with $and; ISO dates bound numeric timestamps
+    assert normalize_where({"topic": 1, "modified": {"$lt": "1970-01-02"}}) == {
+        "$and": [{"topic": {"$eq": 1}}, {"modified": {"$lt": 86400.0}}]}
+    results = searcher.search("topic 3", n_results=5, where={"topic": 4, "published": {"$in": ["2025-01-05"]}})
+    assert sorted(results['ids'][0]) == ["doc_32", "doc_4"]
+
+
+
+def test_searcher_closes_only_the_embedder_it_created(embedder, embedding_server, tmp_path, monkeypatch):
+    with SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder) as searcher:
+        searcher.add_documents(DOCUMENTS[:3])
+    # A shared generator outlives the searcher
+    assert len(embedder.get_embedding("still open")) == 8
+
+    monkeypatch.setattr(search_module, "EmbeddingGenerator", lambda api_key=None: EmbeddingGenerator(
+        api_key="test", base_url=embedding_server.base_url, use_cache=False))
+    with SemanticSearch(collection_name="owned", persist_directory=str(tmp_path)) as searcher:
+        searcher.add_documents(DOCUMENTS[:3])
+    with pytest.raises(RuntimeError):
+        searcher.embedder.embed_documents(DOCUMENTS[3:6])
+
+
+@pytest.mark.parametrize("command", [cli.index_lexical, cli.index_stats, cli.index_short, cli.index_ann,
+                                     cli.show_info])
+def test_index_and_info_commands_close_their_searcher(command, embedding_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(search_module, "EmbeddingGenerator", lambda api_key=None: EmbeddingGenerator(
+        api_key="test", base_url=embedding_server.base_url, use_cache=False))
+    searchers = []
+
+    def open_searcher(collection_name):
+        searchers.append(SemanticSearch(collection_name=collection_name, persist_directory=str(tmp_path)))
+        return searchers[-1]
+
+    monkeypatch.setattr(cli, "SemanticSearch", open_searcher)
+    command("test")
+
+    assert len(searchers) == 1
+    with pytest.raises(RuntimeError):
+        searchers[0].embedder.embed_documents(DOCUMENTS[:3])
@@ -0,0 +1,73 @@
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from semantic_search.reranker import RerankPipeline
+from semantic_search.search import SemanticSearch
+from semantic_search.tracing import Histogram, SpanFileExporter, Tracer, tracer
+
+def test_spans_nest_and_record_errors():
+    spans = Tracer()
+    with spans.span('outer', query="q") as outer:
+        with spans.span('inner', results=3) as inner:
+            pass
+        with pytest.raises(ValueError):
+            with spans.span('failing') as failing:
+                raise ValueError("boom")
+
+    assert inner.parent_id == outer.span_id and inner.trace_id == outer.trace_id
+    assert outer.parent_id is None and outer.duration >= inner.duration
+    assert failing.to_otlp()['status'] == {'code': 2, 'message': "ValueError: boom"}
+    assert inner.to_otlp()['attributes'] == [{'key': 'results', 'value': {'intValue': '3'}}]
+    assert set(spans.stats()) == {'outer', 'inner', 'failing'}
+
+def test_histogram_percentiles_are_within_a_bucket():
+    histogram = Histogram()
+    for ms in range(1, 1001):
+        histogram.observe(ms / 1000)
+
+    summary = histogram.summary()
+    assert summary['count'] == 1000 and summary['max_ms'] == pytest.approx(1000)
+    assert 500 <= summary['p50_ms'] <= 500 * 1.19
+    assert 990 <= summary['p99_ms'] <= 1000
+    assert summary['mean_ms'] == pytest.approx(500.5)
+
+def test_exporter_writes_one_otlp_request_per_trace(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    spans = Tracer(SpanFileExporter(str(path), service_name="test"))
+    for _ in range(2):
+        with spans.span('root'):
+            # Work in another thread joins the trace through a copy of the context
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                pool.submit(contextvars.copy_context().run, _traced_work, spans).result()
+
+    requests = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(requests) == 2
+    resource_spans = requests[0]['resourceSpans'][0]
+    assert resource_spans['resource']['attributes'][0] == {'key': 'service.name', 'value': {'stringValue': 'test'}}
+    exported = {span['name']: span for span in resource_spans['scopeSpans'][0]['spans']}
+    assert exported['work']['parentSpanId'] == exported['root']['spanId']
+    assert exported['work']['traceId'] == exported['root']['traceId']
+    assert int(exported['root']['endTimeUnixNano']) >= int(exported['work']['endTimeUnixNano'])
+
+def _traced_work(spans):
+    with spans.span('work'):
+        pass
+
+def test_search_pipeline_is_traced(embedder, tmp_path):
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder)
+    searcher.add_documents([f"document number {i} about search" for i in range(20)])
+    tracer.reset()
+
+    results = searcher.search("search", n_results=5)
+    searcher.hybrid_search("search", n_results=5)
+    RerankPipeline("bm25,diversity").rerank("search", results)
+
+    stats = tracer.stats()
+    assert stats['search']['count'] == 2
+    assert stats['search.embed']['count'] == stats['search.vector_query']['count'] == 2
+    assert stats['search.lexical_query']['count'] == stats['search.fetch']['count'] == 1
+    assert stats['rerank']['count'] == stats['rerank.bm25']['count'] == stats['rerank.diversity']['count'] == 1
+    assert "search.vector_query" in tracer.report()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import io
+import random
+import re
+
+import pytest
+
+from semantic_search import utils
+from semantic_search.utils import chunk_text, iter_chunks
+
+def _reference_chunk_text(text, chunk_size, chunk_overlap):
+    """Window-scanning chunk_text that both boundary searches must reproduce."""
+    text = re.sub(r'\s+', ' ', text).strip()
+    if not text:
+        return []
+    chunks = []
+    start = 0
+    while True:
+        end = start + chunk_size
+        if end < len(text):
+            for punctuation in ['. ', '? ', '! ']:
+                last_punct = text.rfind(punctuation, start, end)
+                if last_punct != -1 and last_punct > start + chunk_size // 2:
+                    end = last_punct + 1
+                    break
+            if end == start + chunk_size:
+                while end > start and text[end] != ' ':
+                    end -= 1
+                if end == start:
+                    end = start + chunk_size
+        else:
+            end = len(text)
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            return chunks
+        start = end - chunk_overlap if end - chunk_overlap > start else end
+
+def _random_text(seed: int, length: int) -> str:
+    rng = random.Random(seed)
+    words = ["vector", "search", "embedding", "a", "of", "similarity", "x" * 40, "meaning"]
+    separators = [" ", " ", " ", "  ", "\n", "\n\n", ". ", "? ", "! ", ", ", "\t"]
+    parts = []
+    while sum(len(part) for part in parts) < length:
+        parts.append(rng.choice(words))
+        parts.append(rng.choice(separators))
+    return "".join(parts)
+
+SAMPLE_TEXTS = [
+    "",
+    "   \n\t ",
+    "Short text.",
+    "  Leading and trailing whitespace.  \n",
+    "x" * 1000,  # No boundaries at all
+    "word " * 300,  # No sentence ends
+    "One sentence here. Another one? And a third! " * 40,
+    "Ünïcödé text — with wide characters 🚀. Ещё одно предложение! " * 30,
+] + [_random_text(seed, 3000) for seed in range(10)]
+
+@pytest.mark.parametrize("text", SAMPLE_TEXTS)
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(200, 50), (100, 0), (57, 20)])
+@pytest.mark.parametrize("read_size", [1, 13, None])
+def test_iter_chunks_matches_chunk_text(text, chunk_size, chunk_overlap, read_size):
+    expected = chunk_text(text, chunk_size, chunk_overlap)
+    streamed = list(iter_chunks(io.StringIO(text), chunk_size, chunk_overlap, read_size))
+    assert streamed == expected
+
+@pytest.mark.parametrize("text", SAMPLE_TEXTS)
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(200, 50), (100, 0), (57, 20), (1000, 200)])
+@pytest.mark.parametrize("indexed", [False, True])
+def test_chunk_text_golden_output(monkeypatch, text, chunk_size, chunk_overlap, indexed):
+    monkeypatch.setattr(utils, "_use_boundary_index", lambda text, chunk_size: indexed)
+    assert chunk_text(text, chunk_size, chunk_overlap) == _reference_chunk_text(text, chunk_size, chunk_overlap)
+
+def test_boundary_index_only_for_long_unpunctuated_text_in_long_chunks():
+    prose = "One sentence here. Another one? And a third! " * 2000
+    unpunctuated = "word " * 20000
+
+    assert utils._use_boundary_index(unpunctuated, 2000)
+    assert not utils._use_boundary_index(prose, 2000)
+    # Default-sized chunks and short texts keep the window scan
+    assert not utils._use_boundary_index(unpunctuated, 200)
+    assert not utils._use_boundary_index(unpunctuated[:10000], 2000)
+    assert chunk_text(unpunctuated, 2000, 1500) == _reference_chunk_text(unpunctuated, 2000, 1500)
+
+def test_chunks_respect_size_and_overlap():
+    text = "One sentence here. Another one? And a third! " * 40
+    chunks = chunk_text(text, 200, 50)
+
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.endswith((".", "?", "!")) for chunk in chunks[:-1])
+    # Consecutive chunks overlap
+    assert chunks[1][:20] in chunks[0]
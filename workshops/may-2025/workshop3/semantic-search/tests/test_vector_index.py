@@ -0,0 +1,257 @@
+import os
+
+import chromadb
+import numpy as np
+import pytest
+
+from semantic_search.filters import normalize_where
+from semantic_search.search import SemanticSearch
+from semantic_search.vector_index import LocalClient, LocalCollection
+
+DIMENSIONS = 16
+
+
+def _data(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, DIMENSIONS)).astype(np.float32)
+    ids = [f"doc_{i}" for i in range(n)]
+    return ids, vectors, [f"Document {i}" for i in range(n)], [{"chunk_id": i} for i in range(n)]
+
+
+@pytest.mark.parametrize("metric", ["cosine", "l2", "ip"])
+def test_query_matches_chroma_exact_results(tmp_path, metric):
+    ids, vectors, documents, metadatas = _data(300)
+    queries = np.random.default_rng(1).normal(size=(5, DIMENSIONS)).astype(np.float32)
+
+    local = LocalClient(str(tmp_path / "local")).get_or_create_collection("test", metadata={"hnsw:space": metric})
+    chroma = chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_or_create_collection(
+        "test", metadata={"hnsw:space": metric})
+    for start in range(0, 300, 64):
+        local.add(ids=ids[start:start + 64], embeddings=vectors[start:start + 64],
+                  documents=documents[start:start + 64], metadatas=metadatas[start:start + 64])
+        chroma.add(ids=ids[start:start + 64], embeddings=vectors[start:start + 64].tolist(),
+                   documents=documents[start:start + 64], metadatas=metadatas[start:start + 64])
+
+    ours = local.query(query_embeddings=queries.tolist(), n_results=5)
+    theirs = chroma.query(query_embeddings=queries.tolist(), n_results=5)
+    assert ours['ids'] == theirs['ids']
+    np.testing.assert_allclose(ours['distances'], theirs['distances'], rtol=1e-4, atol=1e-4)
+    assert ours['documents'][0][0] == f"Document {ours['ids'][0][0][4:]}"
+    assert ours['metadatas'][0][0] == {"chunk_id": int(ours['ids'][0][0][4:])}
+
+
+def test_upsert_delete_and_reopen(tmp_path):
+    ids, vectors, documents, metadatas = _data(100)
+    collection = LocalCollection(str(tmp_path), "test")
+    collection.add(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+    collection.add(ids=["doc_0"], embeddings=[vectors[1]], documents=["ignored"])
+    collection.upsert(ids=["doc_2"], embeddings=[vectors[3]], documents=["replaced"], metadatas=[{"chunk_id": -1}])
+    collection.delete(ids=["doc_4", "missing"])
+
+    reopened = LocalCollection(str(tmp_path), "test")
+    assert reopened.count() == 99
+    assert reopened.get(ids=["doc_0", "doc_2", "doc_4"])['documents'] == ["Document 0", "replaced"]
+    result = reopened.query(query_embeddings=[vectors[4]], n_results=100, include=["documents", "distances"])
+    assert "doc_4" not in result['ids'][0] and len(result['ids'][0]) == 99
+    # doc_2 now holds doc_3's vector
+    assert set(reopened.query(query_embeddings=[vectors[3]], n_results=2)['ids'][0]) == {"doc_2", "doc_3"}
+
+
+def test_segments_merge_and_page(tmp_path):
+    ids, vectors, documents, metadatas = _data(200)
+    collection = LocalCollection(str(tmp_path), "test", block_rows=7)
+    for start in range(0, 200, 10):
+        collection.upsert(ids=ids[start:start + 10], embeddings=vectors[start:start + 10],
+                          documents=documents[start:start + 10], metadatas=metadatas[start:start + 10])
+    # Binary-counter merging keeps a logarithmic number of segments
+    assert len(collection.segments) <= 5
+
+    paged = []
+    for offset in range(0, 200, 30):
+        paged.extend(collection.get(limit=30, offset=offset)['ids'])
+    assert paged == ids
+
+    brute = np.linalg.norm(vectors - vectors[17], axis=1).argsort()[:5]
+    collection_l2 = LocalCollection(str(tmp_path / "l2"), "l2", metric="l2", block_rows=7)
+    collection_l2.add(ids=ids, embeddings=vectors)
+    assert collection_l2.query(query_embeddings=[vectors[17]], n_results=5)['ids'][0] == [ids[i] for i in brute]
+
+
+def test_quantized_storage_rescores_at_full_precision(tmp_path):
+    ids, vectors, documents, _ = _data(300)
+    queries = np.random.default_rng(1).normal(size=(5, DIMENSIONS)).astype(np.float32)
+    full = LocalCollection(str(tmp_path / "full"), "test", metric="l2")
+    collection = LocalCollection(str(tmp_path / "int8"), "test", metric="l2", dtype="int8", block_rows=64,
+                                 rescore_copy=True)
+    for start in range(0, 300, 100):
+        full.add(ids=ids[start:start + 100], embeddings=vectors[start:start + 100])
+        collection.add(ids=ids[start:start + 100], embeddings=vectors[start:start + 100],
+                       documents=documents[start:start + 100])
+
+    reopened = LocalCollection(str(tmp_path / "int8"), "test")
+    assert all(segment.vectors.dtype == np.int8 and segment.full_vectors is not None for segment in reopened.segments)
+    expected = full.query(query_embeddings=queries, n_results=10, include=["distances"])
+    result = reopened.query(query_embeddings=queries, n_results=10, include=["distances", "embeddings"])
+    assert result['ids'] == expected['ids']
+    np.testing.assert_allclose(result['distances'], expected['distances'], rtol=1e-5)
+    np.testing.assert_array_equal(result['embeddings'][0][0], vectors[int(result['ids'][0][0][4:])])
+
+
+def test_int8_storage_without_copy_scores_the_compact_vectors(tmp_path):
+    ids, vectors, _, _ = _data(300)
+    queries = np.random.default_rng(1).normal(size=(5, DIMENSIONS)).astype(np.float32)
+    full = LocalCollection(str(tmp_path / "full"), "test", metric="cosine")
+    collection = LocalCollection(str(tmp_path / "int8"), "test", metric="cosine", dtype="int8", block_rows=64)
+    for start in range(0, 300, 100):
+        full.add(ids=ids[start:start + 100], embeddings=vectors[start:start + 100])
+        collection.add(ids=ids[start:start + 100], embeddings=vectors[start:start + 100])
+
+    def stored_bytes(c):
+        return sum(os.path.getsize(os.path.join(segment.path, name)) for segment in c.segments
+                   for name in os.listdir(segment.path) if name in ('vectors.npy', 'scales.npy', 'full_vectors.npy'))
+    # One byte per dimension plus a scale per vector, and no float32 copy
+    assert stored_bytes(collection) < stored_bytes(full) / 2
+    assert all(segment.full_vectors is None for segment in LocalCollection(str(tmp_path / "int8"), "test").segments)
+
+    expected = full.query(query_embeddings=queries, n_results=10, include=["distances"])
+    result = collection.query(query_embeddings=queries, n_results=10, include=["distances"])
+    assert [ids[0] for ids in result['ids']] == [ids[0] for ids in expected['ids']]
+    np.testing.assert_allclose(np.sort(result['distances']), np.sort(expected['distances']), atol=0.02)
+
+    with pytest.raises(ValueError):
+        LocalCollection(str(tmp_path / "float16"), "test", dtype="float16")
+
+
+def test_semantic_search_on_local_backend(embedder, tmp_path):
+    documents = [f"Document {i} talks about topic {i % 7}." for i in range(40)]
+    searcher = SemanticSearch(collection_name="test", persist_directory=str(tmp_path), embedder=embedder,
+                              backend="local")
+    searcher.add_documents(documents, ids=[f"doc_{i}" for i in range(40)])
+    assert searcher.get_collection_count() == 40
+
+    single = searcher.search("topic 3", n_results=3, include_embeddings=True)
+    assert len(single['ids'][0]) == 3 and len(single['embeddings'][0][0]) == 8
+    batched = list(searcher.search_many(["topic 3", "topic 4"], n_results=3))
+    assert batched[0]['ids'] == single['ids']
+    assert searcher.hybrid_search("topic 3", n_results=3)['ids'][0]
+
+
+def _clustered(n, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, DIMENSIONS)).astype(np.float32)
+    return (centers[rng.integers(0, 20, n)] + 0.3 * rng.normal(size=(n, DIMENSIONS))).astype(np.float32)
+
+
+def test_ann_index_recall_and_incremental_adds(tmp_path):
+    vectors = _clustered(3000)
+    ids = [f"doc_{i}" for i in range(3000)]
+    queries = _clustered(20, seed=1)
+    collection = LocalCollection(str(tmp_path), "test", metric="cosine")
+    collection.add(ids=ids[:2000], embeddings=vectors[:2000])
+    settings = collection.build_ann_index(nlist=16, subspaces=8)
+    assert settings == {'version': 1, 'nlist': 16, 'subspaces': 8}
+
+    # Later batches are encoded with the trained quantizers, including through merges
+    for start in range(2000, 3000, 250):
+        collection.add(ids=ids[start:start + 250], embeddings=vectors[start:start + 250])
+    assert all(segment.encoded for segment in collection.segments)
+
+    exact = collection.query(query_embeddings=queries, n_results=10, include=["distances"], exact=True)
+    recalls = {}
+    for nprobe in (1, 16):
+        approximate = collection.query(query_embeddings=queries, n_results=10, include=["distances"], nprobe=nprobe)
+        recalls[nprobe] = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approximate['ids'], exact['ids'])])
+    assert recalls[1] <= recalls[16]
+    assert recalls[16] >= 0.95
+    # Shortlisted rows are rescored exactly, so reported distances are true distances
+    approximate = collection.query(query_embeddings=queries[:1], n_results=3, include=["distances"], nprobe=16)
+    np.testing.assert_allclose(approximate['distances'][0], exact['distances'][0][:3], rtol=1e-5, atol=1e-6)
+
+
+def test_ann_index_reopen_delete_and_retrain(tmp_path):
+    vectors = _clustered(1000)
+    ids = [f"doc_{i}" for i in range(1000)]
+    collection = LocalCollection(str(tmp_path), "test", metric="l2")
+    collection.add(ids=ids, embeddings=vectors)
+    collection.build_ann_index(nlist=8, subspaces=4)
+    collection.delete(ids=["doc_5"])
+    collection.upsert(ids=["doc_6"], embeddings=[vectors[7]])
+
+    reopened = LocalCollection(str(tmp_path), "test")
+    assert reopened.ann['nlist'] == 8 and all(segment.encoded for segment in reopened.segments)
+    assert "doc_5" not in reopened.query(query_embeddings=[vectors[5]], n_results=5, nprobe=8)['ids'][0]
+    assert set(reopened.query(query_embeddings=[vectors[7]], n_results=2, nprobe=8)['ids'][0]) == {"doc_6", "doc_7"}
+
+    # Retraining replaces the quantizers and every segment's codes
+    assert reopened.build_ann_index(nlist=4, subspaces=4)['version'] == 2
+    assert sorted(name for name in os.listdir(str(tmp_path)) if name.startswith("ivfpq_")) == ["ivfpq_000002"]
+    assert reopened.query(query_embeddings=[vectors[9]], n_results=1, nprobe=4)['ids'][0] == ["doc_9"]
+
+
+WHERE_CLAUSES = [
+    {"topic": 3},
+    {"topic": 3, "kind": "page"},  # Few enough rows to be gathered rather than scanned
+    {"topic": {"$in": [1, 2]}, "kind": {"$ne": "note"}},
+    {"$or": [{"kind": "draft"}, {"score": {"$gte": 0.9}}]},
+    {"$and": [{"modified": {"$gte": "2025-03-01"}}, {"modified": {"$lt": "2025-03-08T12:00:00Z"}}]},
+    {"kind": {"$nin": ["note", "draft"]}},
+]
+
+
+def _metadatas(n):
+    start = 1740787200  # 2025-03-01T00:00:00Z
+    return [{"topic": i % 7, "kind": ["note", "draft", "page"][i % 3], "score": (i % 10) / 10,
+             "modified": start - 86400 * 5 + 3600 * 7 * i} if i % 11 else {"topic": i % 7} for i in range(n)]
+
+
+@pytest.mark.parametrize("where", WHERE_CLAUSES)
+def test_where_filters_match_chroma(tmp_path, where):
+    ids, vectors, documents, _ = _data(300)
+    metadatas = _metadatas(300)
+    queries = np.random.default_rng(1).normal(size=(3, DIMENSIONS)).astype(np.float32)
+    local = LocalCollection(str(tmp_path / "local"), "test", metric="l2", block_rows=64)
+    chroma = chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_or_create_collection(
+        "test", metadata={"hnsw:space": "l2"})
+    for start in range(0, 300, 100):
+        local.add(ids=ids[start:start + 100], embeddings=vectors[start:start + 100],
+                  documents=documents[start:start + 100], metadatas=metadatas[start:start + 100])
+        chroma.add(ids=ids[start:start + 100], embeddings=vectors[start:start + 100].tolist(),
+                   documents=documents[start:start + 100], metadatas=metadatas[start:start + 100])
+    local.delete(ids=["doc_21"])
+    chroma.delete(ids=["doc_21"])
+
+    normalized = normalize_where(where)
+    assert sorted(local.get(where=where)['ids']) == sorted(chroma.get(where=normalized)['ids'])
+    expected = chroma.query(query_embeddings=queries.tolist(), n_results=10, where=normalized, include=["distances"])
+    result = local.query(query_embeddings=queries, n_results=10, where=where, include=["distances"])
+    assert result['ids'] == expected['ids']
+    np.testing.assert_allclose(result['distances'], expected['distances'], rtol=1e-4, atol=1e-4)
+
+
+def test_filtered_ann_search_and_segments_without_filter_index(tmp_path):
+    vectors = _clustered(3000)
+    ids = [f"doc_{i}" for i in range(3000)]
+    metadatas = [{"group": i % 50, "even": i % 2 == 0} for i in range(3000)]
+    queries = _clustered(10, seed=1)
+    collection = LocalCollection(str(tmp_path), "test", metric="cosine")
+    collection.add(ids=ids, embeddings=vectors, metadatas=metadatas)
+    collection.build_ann_index(nlist=16, subspaces=8)
+
+    # A selective filter is searched exactly over its rows; a broad one through the masked IVF-PQ shortlist
+    for where in ({"group": 7}, {"even": True}):
+        exact = collection.query(query_embeddings=queries, n_results=10, where=where, include=["metadatas"],
+                                 exact=True)
+        approximate = collection.query(query_embeddings=queries, n_results=10, where=where,
+                                       include=["metadatas"], nprobe=16)
+        assert all(metadata[field] == value for metadata in sum(approximate['metadatas'], [])
+                   for field, value in where.items())
+        recall = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approximate['ids'], exact['ids'])])
+        assert recall >= (1.0 if "group" in where else 0.9)
+
+    # Segments written before metadata was indexed build the index from their records on first use
+    for segment in collection.segments:
+        os.remove(os.path.join(segment.path, "filters.json"))
+    reopened = LocalCollection(str(tmp_path), "test")
+    assert sorted(reopened.get(where={"group": {"$in": [3, 4]}, "even": True})['ids']) == sorted(
+        ids[i] for i in range(3000) if i % 50 == 4)
+    assert all(os.path.exists(os.path.join(segment.path, "filters.json")) for segment in reopened.segments)